@@ -0,0 +1,59 @@
+"""Benchmark matrix: write / read time of all registered codecs.
+
+For every registered codec and for value sizes from 100 B to 100 MB
+measures the time of writing a value into a FileDirDict (codec + disk)
+and reading it back, as well as the size of the stored file.
+Values are dicts with a half-compressible bytes payload
+and a short list of numbers, which all built-in codecs support.
+
+Run it as: python benchmarks/bench_codecs.py [max_size_in_bytes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from persidict import FileDirDict, SafeStrTuple, get_registered_file_types
+
+VALUE_SIZES = [100, 10_000, 1_000_000, 100_000_000]
+
+
+def make_value(size:int) -> dict:
+    half = size // 2
+    payload = (b"persidict" * (half // 9 + 1))[:half] + os.urandom(size - half)
+    return dict(payload=payload, numbers=[1, 2.5, 3])
+
+
+def best_time(func, n_repeats:int) -> float:
+    result = float("inf")
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func()
+        result = min(result, time.perf_counter() - start)
+    return result
+
+
+if __name__ == "__main__":
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else max(VALUE_SIZES)
+    print(f"{'file_type':>12} {'value size':>12} {'write, ms':>11}"
+        + f" {'read, ms':>11} {'stored size':>12}")
+    with tempfile.TemporaryDirectory() as base_dir:
+        for file_type in get_registered_file_types():
+            d = FileDirDict(base_dir=base_dir, file_type=file_type)
+            for size in VALUE_SIZES:
+                if size > max_size:
+                    continue
+                value = make_value(size)
+                n_repeats = 3 if size >= 1_000_000 else 50
+                key = SafeStrTuple("value")
+                try:
+                    write = best_time(
+                        lambda: d.__setitem__(key, value), n_repeats)
+                    read = best_time(lambda: d[key], n_repeats)
+                except Exception as e:
+                    print(f"{file_type:>12} {size:>12} failed: {e!r}")
+                    continue
+                stored = os.path.getsize(d._build_full_path(key))
+                print(f"{file_type:>12} {size:>12} {write*1000:>11.3f}"
+                    + f" {read*1000:>11.3f} {stored:>12}")
+            d.clear()
@@ -0,0 +1,50 @@
+"""Microbenchmark: per-key overhead of signing / unsigning deep keys.
+
+Compares the cost of sign_safe_str_tuple() + unsign_safe_str_tuple()
+with cold memoization caches (every string is hashed, as before
+the caches were introduced) against warm caches, for keys
+of 5 to 8 components drawn from a limited pool of prefixes.
+
+Run it as: python benchmarks/bench_key_signing.py
+"""
+import random
+import time
+
+from persidict.safe_str_tuple import SafeStrTuple
+from persidict.safe_str_tuple_signing import (
+    sign_safe_str_tuple, unsign_safe_str_tuple
+    , clear_signing_caches, get_signing_cache_info)
+
+N_KEYS = 20_000
+N_PREFIXES = 2_000
+DIGEST_LEN = 8
+
+
+def make_keys(n_components:int) -> list[SafeStrTuple]:
+    rnd = random.Random(42)
+    prefixes = [tuple(f"dir_{rnd.randint(0, 50)}_{i}"
+        for i in range(n_components - 1)) for _ in range(N_PREFIXES)]
+    return [SafeStrTuple(*rnd.choice(prefixes), f"leaf_{i}")
+        for i in range(N_KEYS)]
+
+
+def run(keys:list[SafeStrTuple], cold:bool) -> float:
+    start = time.perf_counter()
+    for k in keys:
+        if cold:
+            clear_signing_caches()
+        signed = sign_safe_str_tuple(k, DIGEST_LEN)
+        unsign_safe_str_tuple(signed, DIGEST_LEN)
+    return (time.perf_counter() - start) / len(keys)
+
+
+if __name__ == "__main__":
+    print(f"{'components':>10} {'cold, us/key':>14} {'warm, us/key':>14}")
+    for n_components in range(5, 9):
+        keys = make_keys(n_components)
+        cold = run(keys, cold=True)
+        clear_signing_caches()
+        run(keys, cold=False)
+        warm = run(keys, cold=False)
+        print(f"{n_components:>10} {cold*1e6:>14.2f} {warm*1e6:>14.2f}")
+    print(get_signing_cache_info())
@@ -0,0 +1,85 @@
+"""Benchmark: S3Dict transfer throughput versus multipart part size.
+
+Writes a large bytes value into an S3Dict and reads it back, for several
+values of multipart_chunksize (multipart_threshold is set to the same
+value), with file transfers (upload_file / download_file) and with
+in-memory transfers (parallel byte-range GETs). Reports throughput in MB/s.
+
+By default, the benchmark runs against a local S3 stand-in
+(moto's ThreadedMotoServer, requires moto[server]). To measure a real
+endpoint, set AWS_ENDPOINT_URL (or leave it unset together with
+PERSIDICT_BENCH_REAL_S3=1 to use AWS) and PERSIDICT_BENCH_BUCKET.
+
+Run it as: python benchmarks/bench_s3_transfers.py [value_size_in_mb]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+PART_SIZES_MB = [5, 8, 16, 32, 64]
+MAX_CONCURRENCY = 10
+N_REPEATS = 3
+
+
+def best_time(func, n_repeats:int) -> float:
+    result = float("inf")
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func()
+        result = min(result, time.perf_counter() - start)
+    return result
+
+
+def start_local_s3():
+    from moto.server import ThreadedMotoServer
+    logging.getLogger("werkzeug").setLevel(logging.ERROR) # no request logs
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ["AWS_ENDPOINT_URL"] = f"http://{host}:{port}"
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    return server
+
+
+if __name__ == "__main__":
+    value_size = int(float(sys.argv[1]) * 2**20) if len(sys.argv) > 1 else (
+        256 * 2**20)
+    server = None
+    if ("AWS_ENDPOINT_URL" not in os.environ
+            and not os.environ.get("PERSIDICT_BENCH_REAL_S3")):
+        server = start_local_s3()
+    bucket_name = os.environ.get("PERSIDICT_BENCH_BUCKET", "persidict-bench")
+
+    from persidict import S3Dict
+
+    value = os.urandom(value_size)
+    size_mb = value_size / 2**20
+    print(f"value size: {size_mb:.1f} MB, max concurrency: {MAX_CONCURRENCY}")
+    print(f"{'transfers':>10} {'part, MB':>9} {'write, MB/s':>12}"
+        + f" {'read, MB/s':>11}")
+    try:
+        with tempfile.TemporaryDirectory() as base_dir:
+            for in_memory in [False, True]:
+                for part_mb in PART_SIZES_MB:
+                    part_size = part_mb * 2**20
+                    d = S3Dict(bucket_name=bucket_name, base_dir=base_dir
+                        , root_prefix="bench_s3_transfers"
+                        , in_memory_transfers=in_memory
+                        , multipart_threshold=part_size
+                        , multipart_chunksize=part_size
+                        , max_transfer_concurrency=MAX_CONCURRENCY
+                        , max_pool_connections=MAX_CONCURRENCY)
+                    write = best_time(
+                        lambda: d.__setitem__("value", value), N_REPEATS)
+                    read = best_time(lambda: d["value"], N_REPEATS)
+                    print(f"{'memory' if in_memory else 'file':>10}"
+                        + f" {part_mb:>9} {size_mb/write:>12.1f}"
+                        + f" {size_mb/read:>11.1f}")
+                    d.clear()
+    finally:
+        if server is not None:
+            server.stop()
@@ -21,9 +21,26 @@ as a pickle or a json S3 object.
 The package also offers two helper functions: get_safe_chars(),
 which returns a set of URL/filename-safe characters permitted in keys,
 and replace_unsafe_chars(), which replaces forbidden characters in a string.
+
+ValueCodec: base class for codecs, which define how values are stored
+in files / S3 objects. Codecs are registered with register_codec()
+under a file_type name, which persistent dictionaries resolve
+their file_type parameter against.
+
+CachedPersiDict (inherited from PersiDict): an in-memory LRU cache
+of values of another PersiDict (e.g. S3Dict), with write-through.
+
+AsyncPersiDict: asyncio interface for persistent dictionaries;
+ExecutorAsyncPersiDict runs any PersiDict in a thread pool,
+AsyncS3Dict works with S3 natively (requires aiobotocore).
 """
 from .safe_chars import get_safe_chars, replace_unsafe_chars
 from .safe_str_tuple import SafeStrTuple
-from .persi_dict import PersiDict
+from .value_codecs import ValueCodec, register_codec, get_codec
+from .value_codecs import get_registered_file_types
+from .persi_dict import PersiDict, BulkOperationError
 from .file_dir_dict import FileDirDict
-from .s3_dict import S3Dict
\ No newline at end of file
+from .s3_dict import S3Dict
+from .cached_persi_dict import CachedPersiDict
+from .async_persi_dict import AsyncPersiDict, ExecutorAsyncPersiDict
+from .async_persi_dict import AsyncS3Dict
@@ -0,0 +1,409 @@
+"""AsyncPersiDict: asyncio counterparts of persistent dictionaries.
+
+AsyncPersiDict: an abstract base class that defines a coroutine-based
+interface of persistent dictionaries: await d.get(key),
+await d.set(key, value), async for k, v in d.items(),
+await d.gather_many(keys), etc.
+
+ExecutorAsyncPersiDict (inherited from AsyncPersiDict): wraps any
+synchronous PersiDict (e.g. FileDirDict) and runs its blocking
+operations in a thread pool, so they do not block the event loop.
+
+AsyncS3Dict (inherited from AsyncPersiDict): a natively asynchronous
+dictionary that stores key-value pairs as S3 objects using aiobotocore.
+Objects are named and serialized exactly as in S3Dict,
+so both classes can work with the same bucket simultaneously.
+
+All the classes limit the number of concurrently running operations
+with max_concurrency, which allows a single process to keep
+hundreds of requests in flight without overwhelming the backend.
+"""
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Iterable
+
+from .safe_str_tuple import SafeStrTuple
+from .safe_str_tuple_signing import unsign_safe_str_tuple
+from .persi_dict import PersiDict, PersiDictKey, BulkOperationError
+from .s3_dict import (_is_missing_object_error, _key_to_objectname
+    , _objectname_to_key)
+from .value_codecs import TextCodec, get_codec
+
+ASYNC_PERSIDICT_DEFAULT_MAX_CONCURRENCY = 64
+
+
+class AsyncPersiDict(ABC):
+    """Coroutine-based interface of persistent dictionaries.
+
+    Subclasses must implement get_item(), set(), delete(), contains()
+    and keys(). Everything else is implemented on top of them.
+
+    max_concurrency limits the number of operations that run
+    concurrently (e.g. inside gather_many()).
+    """
+
+    max_concurrency:int
+    immutable_items:bool
+
+    def __init__(self
+                 , max_concurrency:int = ASYNC_PERSIDICT_DEFAULT_MAX_CONCURRENCY
+                 , immutable_items:bool = False):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+        self.max_concurrency = int(max_concurrency)
+        self.immutable_items = bool(immutable_items)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @abstractmethod
+    async def get_item(self, key:PersiDictKey) -> Any:
+        """Return the value for key, raise KeyError if it's missing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key:PersiDictKey, value:Any) -> None:
+        """Set the value for key."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, key:PersiDictKey) -> None:
+        """Delete key, raise KeyError if it's missing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def contains(self, key:PersiDictKey) -> bool:
+        """True if the dictionary has the specified key, else False."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def keys(self):
+        """Return an async iterator over the keys of the dictionary."""
+        raise NotImplementedError
+
+    async def get(self, key:PersiDictKey, default:Any = None) -> Any:
+        """Return the value for key if key is in the dictionary, else default."""
+        try:
+            return await self.get_item(key)
+        except KeyError:
+            return default
+
+    async def values(self):
+        """Return an async iterator over the values of the dictionary."""
+        async for _, value in self.items():
+            yield value
+
+    async def items(self):
+        """Return an async iterator over (key, value) pairs.
+
+        Values of up to max_concurrency keys are fetched concurrently,
+        pairs are yielded in the order of keys.
+        """
+        batch = []
+        async for key in self.keys():
+            batch.append(key)
+            if len(batch) >= self.max_concurrency:
+                for pair in await self._get_batch(batch):
+                    yield pair
+                batch = []
+        if len(batch):
+            for pair in await self._get_batch(batch):
+                yield pair
+
+    async def _get_batch(self, keys:list[SafeStrTuple]) -> list[tuple]:
+        """Fetch values for a batch of keys, skipping keys deleted meanwhile."""
+        values = await asyncio.gather(
+            *(self.get_item(k) for k in keys), return_exceptions=True)
+        result = []
+        for key, value in zip(keys, values):
+            if isinstance(value, KeyError):
+                continue
+            if isinstance(value, BaseException):
+                raise value
+            result.append((key, value))
+        return result
+
+    async def len(self) -> int:
+        """Return the number of items in the dictionary."""
+        result = 0
+        async for _ in self.keys():
+            result += 1
+        return result
+
+    async def gather_many(self, keys:Iterable[PersiDictKey]) -> list:
+        """Get values for multiple keys concurrently.
+
+        Returns a list of values in the order of keys. If some keys
+        are missing or can't be read, BulkOperationError is raised
+        after all the keys are processed.
+        """
+        keys = [SafeStrTuple(k) for k in keys]
+        values = await asyncio.gather(
+            *(self.get_item(k) for k in keys), return_exceptions=True)
+        results = dict()
+        errors = dict()
+        for key, value in zip(keys, values):
+            if isinstance(value, Exception):
+                errors[key] = value
+            else:
+                results[key] = value
+        if len(errors):
+            raise BulkOperationError(
+                f"gather_many failed for {len(errors)}"
+                + f" out of {len(keys)} keys", results, errors)
+        return [results[k] for k in keys]
+
+    async def close(self) -> None:
+        """Release resources (connections, threads) used by the dictionary."""
+        pass
+
+    async def __aenter__(self) -> AsyncPersiDict:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
+
+
+class ExecutorAsyncPersiDict(AsyncPersiDict):
+    """Async wrapper that runs a synchronous PersiDict in a thread pool.
+
+    Works with any PersiDict; the natural choice for FileDirDict,
+    whose operations are blocking filesystem calls.
+    """
+
+    persi_dict:PersiDict
+
+    def __init__(self
+                 , persi_dict:PersiDict
+                 , max_concurrency:int = ASYNC_PERSIDICT_DEFAULT_MAX_CONCURRENCY):
+        if not isinstance(persi_dict, PersiDict):
+            raise TypeError("persi_dict must be an instance of PersiDict")
+        super().__init__(max_concurrency = max_concurrency
+            , immutable_items = persi_dict.immutable_items)
+        self.persi_dict = persi_dict
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    async def _run(self, func, *args) -> Any:
+        """Run a blocking function in the thread pool."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get_item(self, key:PersiDictKey) -> Any:
+        """Return the value for key, raise KeyError if it's missing."""
+        return await self._run(self.persi_dict.__getitem__, SafeStrTuple(key))
+
+    async def set(self, key:PersiDictKey, value:Any) -> None:
+        """Set the value for key."""
+        await self._run(
+            self.persi_dict.__setitem__, SafeStrTuple(key), value)
+
+    async def delete(self, key:PersiDictKey) -> None:
+        """Delete key, raise KeyError if it's missing."""
+        await self._run(self.persi_dict.__delitem__, SafeStrTuple(key))
+
+    async def contains(self, key:PersiDictKey) -> bool:
+        """True if the dictionary has the specified key, else False."""
+        return await self._run(
+            self.persi_dict.__contains__, SafeStrTuple(key))
+
+    async def keys(self):
+        """Return an async iterator over the keys of the dictionary.
+
+        The blocking listing runs in the thread pool,
+        keys are transferred to the event loop in batches.
+        """
+        iterator = iter(self.persi_dict.keys())
+
+        def next_batch() -> list:
+            batch = []
+            for key in iterator:
+                batch.append(key)
+                if len(batch) >= 1000:
+                    break
+            return batch
+
+        while True:
+            batch = await self._run(next_batch)
+            if not len(batch):
+                return
+            for key in batch:
+                yield key
+
+    async def len(self) -> int:
+        """Return the number of items in the dictionary."""
+        return await self._run(self.persi_dict.__len__)
+
+    async def close(self) -> None:
+        """Shut down the thread pool."""
+        self._executor.shutdown(wait=False)
+
+
+class AsyncS3Dict(AsyncPersiDict):
+    """A natively asynchronous dictionary that stores values as S3 objects.
+
+    Requires aiobotocore. Parameters bucket_name, region, root_prefix,
+    file_type, immutable_items and base_class_for_values have
+    the same meaning as in S3Dict. endpoint_url allows to use
+    S3-compatible storage (e.g. a local S3 stand-in for testing).
+
+    Up to max_concurrency requests are in flight at any time,
+    the HTTP connection pool is sized accordingly.
+    The client is created on first use; call close()
+    (or use "async with") to release connections.
+    """
+
+    bucket_name:str
+    region:Optional[str]
+    root_prefix:str
+    file_type:str
+    endpoint_url:Optional[str]
+
+    def __init__(self, bucket_name:str = "my_bucket"
+                 , region:Optional[str] = None
+                 , root_prefix:str = ""
+                 , file_type:str = "pkl"
+                 , immutable_items:bool = False
+                 , base_class_for_values:Optional[type] = None
+                 , max_concurrency:int = ASYNC_PERSIDICT_DEFAULT_MAX_CONCURRENCY
+                 , endpoint_url:Optional[str] = None):
+        super().__init__(max_concurrency = max_concurrency
+            , immutable_items = immutable_items)
+        self.bucket_name = bucket_name
+        self.region = region
+        self.root_prefix = root_prefix
+        if len(self.root_prefix) and self.root_prefix[-1] != "/":
+            self.root_prefix += "/"
+        self.file_type = file_type
+        self.digest_len = 0 # S3Dict does not sign objectnames
+        self.base_class_for_values = base_class_for_values
+        self.endpoint_url = endpoint_url
+
+        codec = get_codec(file_type)
+        if codec is None:
+            if (base_class_for_values is None or
+                    not issubclass(base_class_for_values, str)):
+                raise ValueError("For non-string values file_type"
+                    + " must be a name of a registered codec"
+                    + " (e.g. 'pkl' or 'json').")
+            codec = TextCodec()
+        self._codec = codec
+
+        self._client = None
+        self._client_context = None
+        self._client_lock = asyncio.Lock()
+        self._bucket_checked = False
+
+    def _build_full_objectname(self, key:PersiDictKey) -> str:
+        """Convert PersiDictKey into an S3 objectname (same as in S3Dict)."""
+        return _key_to_objectname(
+            self.root_prefix, self.file_type, self.digest_len, key)
+
+    def _objectname_to_key(self, obj_name:str) -> SafeStrTuple:
+        """Convert an S3 objectname into a (signed) SafeStrTuple key."""
+        return _objectname_to_key(self.root_prefix, self.file_type, obj_name)
+
+    async def _get_client(self):
+        """Create an aiobotocore S3 client on first use."""
+        if self._client is not None:
+            return self._client
+        async with self._client_lock:
+            if self._client is None:
+                from aiobotocore.config import AioConfig
+                from aiobotocore.session import get_session
+                self._client_context = get_session().create_client("s3"
+                    , region_name = self.region
+                    , endpoint_url = self.endpoint_url
+                    , config = AioConfig(
+                        max_pool_connections = self.max_concurrency))
+                client = await self._client_context.__aenter__()
+                if not self._bucket_checked:
+                    try:
+                        await client.head_bucket(Bucket=self.bucket_name)
+                    except Exception:
+                        await client.create_bucket(Bucket=self.bucket_name)
+                    self._bucket_checked = True
+                self._client = client
+        return self._client
+
+    async def get_item(self, key:PersiDictKey) -> Any:
+        """Return the value for key, raise KeyError if it's missing."""
+        from botocore.exceptions import ClientError
+        obj_name = self._build_full_objectname(key)
+        client = await self._get_client()
+        async with self._semaphore:
+            try:
+                response = await client.get_object(
+                    Bucket=self.bucket_name, Key=obj_name)
+            except ClientError as e:
+                if _is_missing_object_error(e):
+                    raise KeyError(f"Object {obj_name} does not exist")
+                raise
+            async with response["Body"] as stream:
+                data = await stream.read()
+        return self._codec.loads(data)
+
+    async def set(self, key:PersiDictKey, value:Any) -> None:
+        """Set the value for key."""
+        if isinstance(value, PersiDict):
+            raise TypeError(
+                f"You are not allowed to store a PersiDict "
+                + f"inside another PersiDict.")
+        if self.base_class_for_values is not None:
+            if not isinstance(value, self.base_class_for_values):
+                raise TypeError(
+                    f"Value must be of type {self.base_class_for_values},"
+                    + f"but it is {type(value)} instead." )
+        if self.immutable_items and await self.contains(key):
+            raise KeyError("Can't modify an immutable item")
+        obj_name = self._build_full_objectname(key)
+        data = self._codec.dumps(value)
+        client = await self._get_client()
+        async with self._semaphore:
+            await client.put_object(
+                Bucket=self.bucket_name, Key=obj_name, Body=data)
+
+    async def delete(self, key:PersiDictKey) -> None:
+        """Delete key, raise KeyError if it's missing."""
+        if self.immutable_items:
+            raise KeyError("Can't delete an immutable item")
+        if not await self.contains(key):
+            raise KeyError(f"Key {key} does not exist")
+        obj_name = self._build_full_objectname(key)
+        client = await self._get_client()
+        async with self._semaphore:
+            await client.delete_object(Bucket=self.bucket_name, Key=obj_name)
+
+    async def contains(self, key:PersiDictKey) -> bool:
+        """True if the dictionary has the specified key, else False."""
+        from botocore.exceptions import ClientError
+        obj_name = self._build_full_objectname(key)
+        client = await self._get_client()
+        async with self._semaphore:
+            try:
+                await client.head_object(Bucket=self.bucket_name, Key=obj_name)
+                return True
+            except ClientError as e:
+                if _is_missing_object_error(e):
+                    return False
+                raise
+
+    async def keys(self):
+        """Return an async iterator over the keys of the dictionary."""
+        suffix = "." + self.file_type
+        client = await self._get_client()
+        paginator = client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(
+                Bucket=self.bucket_name, Prefix=self.root_prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(suffix):
+                    yield unsign_safe_str_tuple(
+                        self._objectname_to_key(obj["Key"]), self.digest_len)
+
+    async def close(self) -> None:
+        """Close the S3 client and its connections."""
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+        self._client = None
+        self._client_context = None
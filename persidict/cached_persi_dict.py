@@ -0,0 +1,405 @@
+"""CachedPersiDict: an in-memory LRU read-through cache for any PersiDict.
+
+CachedPersiDict (inherited from PersiDict) wraps another persistent
+dictionary (the backing dictionary, e.g. S3Dict) and keeps recently
+used deserialized values in memory. Reads of cached keys
+make no requests to the backing storage.
+
+Writes go through to the backing dictionary and update the cache,
+deletions invalidate cached values. For dictionaries with immutable items
+cached values never expire; for mutable ones, ttl limits how long
+a cached value is trusted (changes made by other processes
+become visible after ttl seconds).
+
+The cache is bounded both by the number of values and by
+their (estimated) total size in bytes. Subdicts created by get_subdict()
+share the cache (and its statistics) with their parent.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Optional
+
+import parameterizable
+
+from .safe_str_tuple import SafeStrTuple
+from .persi_dict import PersiDict, PersiDictKey
+from .streams import NotifyingWriter
+
+CACHED_PERSIDICT_DEFAULT_MAX_ITEMS = 10_000
+CACHED_PERSIDICT_DEFAULT_MAX_BYTES = 256 * 2**20
+
+_NOT_CACHED = object()
+
+
+def _estimate_size(value:Any, depth:int = 3) -> int:
+    """Estimate the amount of memory (in bytes) used by a value."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return int(getattr(usage, "sum", lambda: usage)())
+        except Exception:
+            pass
+    size = sys.getsizeof(value)
+    if depth > 0:
+        if isinstance(value, dict):
+            size += sum(_estimate_size(k, depth - 1)
+                + _estimate_size(v, depth - 1) for k, v in value.items())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += sum(_estimate_size(v, depth - 1) for v in value)
+    return size
+
+
+class _LRUValueCache:
+    """A thread-safe LRU mapping with limits on item count and total size.
+
+    Values read from the backing storage are cached with start_read() /
+    finish_read(): if the key is modified (put, discarded) while the read
+    is in progress, the possibly stale value is not cached.
+    """
+
+    def __init__(self, max_items:int, max_bytes:Optional[int]):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (value, size, expiration time)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reads = dict() # key -> [number of reads in progress, generation]
+        self.lock = threading.Lock()
+
+    def get(self, key:SafeStrTuple) -> Any:
+        """Return a cached value, or _NOT_CACHED."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is not None:
+                if entry[2] < time.monotonic():
+                    self._remove(key)
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return _NOT_CACHED
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key:SafeStrTuple, value:Any, ttl:Optional[float]) -> None:
+        """Cache a new value, evicting least recently used values if needed."""
+        size = _estimate_size(value)
+        with self.lock:
+            self._invalidate_reads(key)
+            self._put(key, value, size, ttl)
+
+    def start_read(self, key:SafeStrTuple) -> int:
+        """Register a read of the backing storage, return its generation."""
+        with self.lock:
+            read = self.reads.setdefault(key, [0, 0])
+            read[0] += 1
+            return read[1]
+
+    def finish_read(self, key:SafeStrTuple, generation:int
+                    , value:Any, ttl:Optional[float]) -> None:
+        """Cache a value that was read (unless it's _NOT_CACHED or stale)."""
+        size = None if value is _NOT_CACHED else _estimate_size(value)
+        with self.lock:
+            read = self.reads[key]
+            read[0] -= 1
+            if not read[0]:
+                del self.reads[key]
+            if size is not None and read[1] == generation:
+                self._put(key, value, size, ttl)
+
+    def discard(self, key:SafeStrTuple) -> None:
+        """Remove a value from the cache (no-op if it's absent)."""
+        with self.lock:
+            self._invalidate_reads(key)
+            self._remove(key)
+
+    def discard_prefix(self, prefix:SafeStrTuple) -> None:
+        """Remove all values whose keys start with prefix."""
+        n = len(prefix)
+        with self.lock:
+            for key in self.reads:
+                if key.str_chain[:n] == prefix.str_chain:
+                    self._invalidate_reads(key)
+            keys = [k for k in self.entries
+                if k.str_chain[:n] == prefix.str_chain]
+            for key in keys:
+                self._remove(key)
+
+    def _invalidate_reads(self, key:SafeStrTuple) -> None:
+        """Make reads of key that are in progress not cache their values."""
+        read = self.reads.get(key)
+        if read is not None:
+            read[1] += 1
+
+    def _put(self, key:SafeStrTuple, value:Any, size:int
+             , ttl:Optional[float]) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            self._remove(key)
+            return
+        expiration = None if ttl is None else time.monotonic() + ttl
+        self._remove(key)
+        self.entries[key] = (value, size, expiration)
+        self.total_bytes += size
+        while len(self.entries) > self.max_items or (
+                self.max_bytes is not None
+                and self.total_bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key:SafeStrTuple) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+
+class CachedPersiDict(PersiDict):
+    """A PersiDict that caches values of another PersiDict in memory.
+
+    Values are returned from the cache as is (no copies are made),
+    so they should not be modified in place.
+    """
+
+    backing:PersiDict
+    max_items:int
+    max_bytes:Optional[int]
+    ttl:Optional[float]
+
+    def __init__(self
+                 , backing:PersiDict
+                 , max_items:int = CACHED_PERSIDICT_DEFAULT_MAX_ITEMS
+                 , max_bytes:Optional[int] = CACHED_PERSIDICT_DEFAULT_MAX_BYTES
+                 , ttl:Optional[float] = None):
+        """A constructor defines the backing dictionary and cache limits.
+
+        max_items and max_bytes limit the number of cached values and
+        their estimated total size (None means no size limit).
+        ttl is the number of seconds a cached value of a mutable
+        dictionary stays valid; None means until it is evicted.
+        Values of dictionaries with immutable items never expire.
+        """
+        if not isinstance(backing, PersiDict):
+            raise TypeError("backing must be an instance of PersiDict")
+        if max_items < 1:
+            raise ValueError("max_items must be a positive integer")
+        super().__init__(immutable_items = backing.immutable_items
+            , digest_len = backing.digest_len
+            , base_class_for_values = backing.base_class_for_values)
+        self.backing = backing
+        self.max_items = int(max_items)
+        self.max_bytes = None if max_bytes is None else int(max_bytes)
+        self.ttl = ttl
+        self._cache = _LRUValueCache(self.max_items, self.max_bytes)
+        self._key_prefix = SafeStrTuple._from_trusted_chain(())
+
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return (f"{type(self).__name__}(backing={self.backing!r}"
+            + f", max_items={self.max_items}, max_bytes={self.max_bytes}"
+            + f", ttl={self.ttl})")
+
+
+    def get_params(self):
+        """Return configuration parameters of the dictionary."""
+        return dict(backing = self.backing
+            , max_items = self.max_items
+            , max_bytes = self.max_bytes
+            , ttl = self.ttl)
+
+
+    def cache_info(self) -> dict[str, Any]:
+        """Return statistics of the cache (shared with subdicts).
+
+        This method is absent in the original dict API.
+        """
+        cache = self._cache
+        with cache.lock:
+            requests = cache.hits + cache.misses
+            return dict(hits = cache.hits
+                , misses = cache.misses
+                , hit_ratio = cache.hits / requests if requests else 0.0
+                , evictions = cache.evictions
+                , currsize = len(cache.entries)
+                , currbytes = cache.total_bytes
+                , maxsize = cache.max_items
+                , maxbytes = cache.max_bytes)
+
+
+    def clear_cache(self) -> None:
+        """Drop all cached values of this dictionary.
+
+        This method is absent in the original dict API.
+        """
+        self._cache.discard_prefix(self._key_prefix)
+
+
+    def _cache_key(self, key:SafeStrTuple) -> SafeStrTuple:
+        """Convert a key into a key in the (shared) cache."""
+        return self._key_prefix + key
+
+
+    def _value_ttl(self) -> Optional[float]:
+        """Return the number of seconds a cached value stays valid."""
+        return None if self.immutable_items else self.ttl
+
+
+    def __contains__(self, key:PersiDictKey) -> bool:
+        """True if the dictionary has the specified key, else False."""
+        key = SafeStrTuple(key)
+        if self._cache.get(self._cache_key(key)) is not _NOT_CACHED:
+            return True
+        return key in self.backing
+
+
+    def __getitem__(self, key:PersiDictKey) -> Any:
+        """X.__getitem__(y) is an equivalent to X[y]."""
+        key = SafeStrTuple(key)
+        cache_key = self._cache_key(key)
+        value = self._cache.get(cache_key)
+        if value is _NOT_CACHED:
+            generation = self._cache.start_read(cache_key)
+            try:
+                value = self.backing[key]
+            finally:
+                self._cache.finish_read(
+                    cache_key, generation, value, self._value_ttl())
+        return value
+
+
+    def __setitem__(self, key:PersiDictKey, value:Any):
+        """Set self[key] to value (in the backing dictionary and the cache)."""
+        key = SafeStrTuple(key)
+        cache_key = self._cache_key(key)
+        self._cache.discard(cache_key)
+        self.backing[key] = value
+        self._cache.put(cache_key, value, self._value_ttl())
+
+
+    def __delitem__(self, key:PersiDictKey):
+        """Delete self[key]."""
+        key = SafeStrTuple(key)
+        cache_key = self._cache_key(key)
+        self._cache.discard(cache_key)
+        try:
+            del self.backing[key]
+        finally: # drop values cached by reads made during the deletion
+            self._cache.discard(cache_key)
+
+
+    def open_read(self, key:PersiDictKey) -> BinaryIO:
+        """Open a binary stream over the stored representation of a value.
+
+        The stream reads from the backing dictionary, bypassing the cache.
+
+        This method is absent in the original dict API.
+        """
+        return self.backing.open_read(SafeStrTuple(key))
+
+
+    def open_write(self, key:PersiDictKey) -> BinaryIO:
+        """Open a binary stream that stores a value when it is closed.
+
+        The stream writes into the backing dictionary; the cached value
+        of the key is dropped once the new value is published.
+
+        This method is absent in the original dict API.
+        """
+        key = SafeStrTuple(key)
+        cache_key = self._cache_key(key)
+        return NotifyingWriter(self.backing.open_write(key)
+            , lambda: self._cache.discard(cache_key))
+
+
+    def get_range(self, key:PersiDictKey, start:int, length:int) -> bytes:
+        """Read length bytes of the stored representation of a value.
+
+        Bytes are read from the backing dictionary, bypassing the cache.
+
+        This method is absent in the original dict API.
+        """
+        return self.backing.get_range(SafeStrTuple(key), start, length)
+
+
+    def __len__(self) -> int:
+        """Return len(self)."""
+        return len(self.backing)
+
+
+    def _generic_iter(self, iter_type: str):
+        """Underlying implementation for .items()/.keys()/.values() iterators.
+
+        Iteration goes over the backing dictionary and does not populate
+        the cache, so a full scan does not evict frequently used values.
+        """
+        assert iter_type in {"keys", "values", "items"}
+        return self.backing._generic_iter(iter_type)
+
+
+    def clear(self) -> None:
+        """Remove all items from the dictionary."""
+        self.backing.clear()
+        self.clear_cache()
+
+
+    def delete_prefix(self, prefix_key:PersiDictKey) -> None:
+        """Delete all items whose keys start with prefix_key.
+
+        This method is absent in the original dict API.
+        """
+        prefix_key = SafeStrTuple(prefix_key)
+        self.backing.delete_prefix(prefix_key)
+        self._cache.discard_prefix(self._cache_key(prefix_key))
+
+
+    def get_subdict(self, prefix_key:PersiDictKey) -> CachedPersiDict:
+        """Get a subdictionary containing items with the same prefix key.
+
+        The subdictionary shares the cache with its parent.
+
+        This method is absent in the original dict API.
+        """
+        prefix_key = SafeStrTuple(prefix_key)
+        new_dict = CachedPersiDict(self.backing.get_subdict(prefix_key)
+            , max_items = self.max_items
+            , max_bytes = self.max_bytes
+            , ttl = self.ttl)
+        new_dict._cache = self._cache
+        new_dict._key_prefix = self._cache_key(prefix_key)
+        return new_dict
+
+
+    def list_prefixes(self, depth:int = 1) -> list[SafeStrTuple]:
+        """Get a list of distinct key prefixes of length depth.
+
+        This method is absent in the original dict API.
+        """
+        return self.backing.list_prefixes(depth)
+
+
+    def timestamp(self, key:PersiDictKey) -> float:
+        """Get last modification time (in seconds, Unix epoch time).
+
+        This method is absent in the original dict API.
+        """
+        return self.backing.timestamp(key)
+
+
+    def keys_with_timestamps(self):
+        """Iterate over (key, timestamp) pairs.
+
+        This method is absent in the original dict API.
+        """
+        return self.backing.keys_with_timestamps()
+
+
+parameterizable.register_parameterizable_class(CachedPersiDict)
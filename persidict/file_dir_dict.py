@@ -9,29 +9,51 @@ as a binary, or as a json object, or as a plain text
 """
 from __future__ import annotations
 
+import errno
 import os
 import random
 import time
-from typing import Any, Optional
+import uuid
+from typing import Any, BinaryIO, Callable, Optional
 
-import joblib
-import jsonpickle
-import jsonpickle.ext.numpy as jsonpickle_numpy
-import jsonpickle.ext.pandas as jsonpickle_pandas
 import parameterizable
 
 from .safe_chars import replace_unsafe_chars
+from .key_manifest import KeyManifestMixin
+from .prefetching import prefetch_values
 from .safe_str_tuple import SafeStrTuple
 from .safe_str_tuple_signing import sign_safe_str_tuple, unsign_safe_str_tuple
 from .persi_dict import PersiDict, PersiDictKey
+from .streams import AtomicFileWriter
+from .value_codecs import TextCodec, check_byte_range, get_codec
 
+FILEDIRDICT_DEFAULT_BASE_DIR = "__file_dir_dict__"
+FILEDIRDICT_TMP_SUFFIX = ".__tmp__"
+FILEDIRDICT_MAX_KNOWN_DIRS = 10_000
+FILEDIRDICT_MANIFEST_NAME = ".__manifest__.sqlite"
 
-jsonpickle_numpy.register_handlers()
-jsonpickle_pandas.register_handlers()
+# file types that had codecs before the codec registry existed;
+# all other file types used to mean plain text (see _load_value)
+_ORIGINAL_CODEC_FILE_TYPES = {"pkl", "json"}
 
-FILEDIRDICT_DEFAULT_BASE_DIR = "__file_dir_dict__"
+_TRANSIENT_ERRNOS = {getattr(errno, name) for name in
+    ("EAGAIN", "EBUSY", "ESTALE", "ETIMEDOUT") if hasattr(errno, name)}
 
-class FileDirDict(PersiDict):
+def _is_transient_os_error(e:OSError) -> bool:
+    """Check if an error while reading a file is worth retrying.
+
+    Sharing violations on Windows (a file is being replaced by
+    another process) and stale / busy handles on network filesystems
+    are transient. Missing files, permission problems on POSIX
+    systems and corrupted content are not.
+    """
+    if isinstance(e, FileNotFoundError):
+        return False
+    if isinstance(e, PermissionError):
+        return os.name == "nt"
+    return e.errno in _TRANSIENT_ERRNOS
+
+class FileDirDict(KeyManifestMixin, PersiDict):
     """ A persistent Dict that stores key-value pairs in local files.
 
     A new file is created for each key-value pair.
@@ -42,17 +64,23 @@ class FileDirDict(PersiDict):
 
     FileDirDict can store objects in binary files or in human-readable
     text files (either in jason format or as a plain text).
+    The file format is defined by a codec registered for file_type.
     """
 
     base_dir:str
     file_type:str
+    use_manifest:bool
+
+    bulk_max_workers:int = 8
+    prefetch_max_items:int = 4
 
     def __init__(self
                  , base_dir: str = FILEDIRDICT_DEFAULT_BASE_DIR
                  , file_type: str = "pkl"
                  , immutable_items:bool = False
                  , digest_len:int = 8
-                 , base_class_for_values: Optional[type] = None):
+                 , base_class_for_values: Optional[type] = None
+                 , use_manifest:bool = False):
         """A constructor defines location of the store and file format to use.
 
         base_dir is a directory that will contain all the files in
@@ -64,11 +92,24 @@ class FileDirDict(PersiDict):
         no type checking will be performed and all types will be allowed.
 
         file_type is extension, which will be used for all files in the dictionary.
-        If file_type has one of two values: "pkl" or "json", it defines
-        which file format will be used by FileDirDict to store values.
+        If file_type is a name of a registered codec (e.g. "pkl" or "json",
+        see value_codecs.py), the codec defines which file format
+        will be used by FileDirDict to store values.
         For all other values of file_type, the file format will always be plain
-        text. "pkl" and "json" allow to store arbitrary Python objects,
+        text. Registered codecs allow to store arbitrary Python objects,
         while all other file_type-s only work with str objects.
+        Older versions stored all file types except "pkl" and "json"
+        as plain text; text files of such stores with a file_type that is
+        now a built-in codec (e.g. "pickle" or "msgpack") are rejected
+        with ValueError when read.
+
+        use_manifest=True makes the dictionary maintain a persistent index
+        of its keys (see key_manifest.py) in base_dir, which answers
+        len(), "in" and keys() without scanning the directory tree.
+        A new manifest is populated from the stored files on first use.
+        The manifest is updated by all modifications made through
+        FileDirDict; after out-of-band changes of the files,
+        call rebuild_manifest().
         """
 
         super().__init__(immutable_items = immutable_items
@@ -78,27 +119,34 @@ class FileDirDict(PersiDict):
         assert file_type == replace_unsafe_chars(file_type, "")
         self.file_type = file_type
 
-        if (base_class_for_values is None or
-                not issubclass(base_class_for_values,str)):
-            assert file_type in {"json", "pkl"}, ("For non-string values"
-                + " file_type must be either 'pkl' or 'json'.")
+        codec = get_codec(file_type)
+        if codec is None:
+            if (base_class_for_values is None or
+                    not issubclass(base_class_for_values,str)):
+                raise ValueError("For non-string values file_type"
+                    + " must be a name of a registered codec"
+                    + " (e.g. 'pkl' or 'json').")
+            codec = TextCodec()
+        self._codec = codec
+        self._may_hold_text_files = (
+            not isinstance(codec, TextCodec)
+            and file_type not in _ORIGINAL_CODEC_FILE_TYPES
+            and base_class_for_values is not None
+            and issubclass(base_class_for_values, str))
 
         base_dir = str(base_dir)
 
         if os.path.isfile(base_dir):
             raise ValueError(f"{base_dir} is a file, not a directory.")
 
-        try: # extra protection to better handle concurrent access
-            if not os.path.isdir(base_dir):
-                os.mkdir(base_dir)
-        except:
-            time.sleep(random.random()/random.randint(1, 3))
-            if not os.path.isdir(base_dir):
-                os.mkdir(base_dir)
+        os.makedirs(base_dir, exist_ok=True)
         assert os.path.isdir(base_dir)
 
         self.base_dir_param = base_dir
         self.base_dir = os.path.abspath(base_dir)
+        self._known_dirs = {self.base_dir}
+
+        self._init_manifest(use_manifest)
 
     def __repr__(self):
         """Return repr(self)."""
@@ -115,24 +163,118 @@ class FileDirDict(PersiDict):
         params = super().get_params()
         additional_params = dict(
             base_dir=self.base_dir_param
-            , file_type=self.file_type)
+            , file_type=self.file_type
+            , use_manifest=self.use_manifest)
         params.update(additional_params)
         return params
 
 
+    def _manifest_file_name(self) -> str:
+        """Return the name of the manifest's database file."""
+        return os.path.join(self.base_dir, FILEDIRDICT_MANIFEST_NAME)
+
+
+    def _stored_key_chains(self):
+        """Iterate over signed key chains of files that are actually stored."""
+        for key_chain, _ in self._scan_files():
+            yield key_chain
+
+
     def __len__(self) -> int:
         """ Get number of key-value pairs in the dictionary."""
 
+        manifest = self._get_manifest()
+        if manifest is not None:
+            return manifest.count(self._manifest_prefix)
+
         num_files = 0
-        suffix = "." + self.file_type
-        for subdir_info in os.walk(self.base_dir):
-            files = subdir_info[2]
-            files = [f_name for f_name in files
-                     if f_name.endswith(suffix)]
-            num_files += len(files)
+        for _ in self._scan_files():
+            num_files += 1
         return num_files
 
 
+    def _scan_files(self
+                    , dir_path:Optional[str] = None
+                    , prefix:tuple[str, ...] = ()):
+        """Enumerate all value files in the dictionary with os.scandir.
+
+        By default, the whole base_dir is scanned; dir_path and prefix
+        allow to scan only a subdirectory with a given (signed) key prefix.
+
+        Yields (key_chain, dir_entry) pairs, where key_chain is a tuple of
+        (signed) strings that forms the key of a file, and dir_entry
+        is the os.DirEntry of the file. The key prefix is carried down
+        while descending into subdirectories, so paths are never re-parsed.
+        dir_entry.stat() provides mtime and size of the file, without
+        the need to rebuild its path.
+
+        Directories are traversed depth-first with an explicit stack,
+        so only one directory handle is open at any time.
+        Directories that disappear during the scan are silently skipped.
+        """
+        suffix = "." + self.file_type
+        ext_len = len(suffix)
+        if dir_path is None:
+            dir_path = self.base_dir
+        dirs_to_scan = [(dir_path, prefix)]
+        while dirs_to_scan:
+            dir_path, prefix = dirs_to_scan.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                dirs_to_scan.append(
+                                    (entry.path, (*prefix, name)))
+                        elif name.endswith(suffix):
+                            yield (*prefix, name[:-ext_len]), entry
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+
+    def list_prefixes(self, depth:int = 1) -> list[SafeStrTuple]:
+        """Get a list of distinct key prefixes of length depth.
+
+        Only directories up to the given depth are listed
+        (starting with a single os.scandir of base_dir), deeper
+        directories are only checked for containing at least one value.
+
+        This method is absent in the original dict API.
+        """
+        if depth < 1:
+            raise ValueError("depth must be a positive integer")
+        suffix = "." + self.file_type
+        ext_len = len(suffix)
+        signed_prefixes = []
+        dirs_to_scan = [(self.base_dir, ())]
+        while dirs_to_scan:
+            dir_path, prefix = dirs_to_scan.pop()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        if entry.is_dir():
+                            if entry.is_symlink():
+                                continue
+                            if len(prefix) + 1 < depth:
+                                dirs_to_scan.append(
+                                    (entry.path, (*prefix, name)))
+                            elif any(True for _ in self._scan_files(
+                                    entry.path, (*prefix, name))):
+                                signed_prefixes.append((*prefix, name))
+                        elif name.endswith(suffix):
+                            signed_prefixes.append(
+                                (*prefix, name[:-ext_len]))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+        all_prefixes = {unsign_safe_str_tuple(
+            SafeStrTuple._from_trusted_chain(p), self.digest_len)
+            for p in signed_prefixes}
+        return list(all_prefixes)
+
+
     def clear(self) -> None:
         """ Remove all elements from the dictionary."""
 
@@ -149,6 +291,13 @@ class FileDirDict(PersiDict):
                     len(os.listdir(subdir_name)) == 0 ):
                 os.rmdir(subdir_name)
 
+        self._known_dirs.clear()
+        self._known_dirs.add(self.base_dir)
+
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest.discard_prefix(self._manifest_prefix)
+
     def _build_full_path(self
                          , key:SafeStrTuple
                          , create_subdirs:bool=False
@@ -158,25 +307,33 @@ class FileDirDict(PersiDict):
         key = sign_safe_str_tuple(key, self.digest_len)
         key = [self.base_dir] + list(key.str_chain)
         dir_names = key[:-1] if is_file_path else key
+        dir_path = os.path.join(*dir_names)
 
         if create_subdirs:
-            current_dir = dir_names[0]
-            for dir_name in dir_names[1:]:
-                new_dir = os.path.join(current_dir, dir_name)
-                try: # extra protection to better handle concurrent access
-                    if not os.path.isdir(new_dir):
-                        os.mkdir(new_dir)
-                except:
-                    time.sleep(random.random()/random.randint(1, 3))
-                    if not os.path.isdir(new_dir):
-                        os.mkdir(new_dir)
-                current_dir = new_dir
+            self._make_dirs(dir_path)
 
         if is_file_path:
             file_name = key[-1] + "." + self.file_type
-            return os.path.join(*dir_names, file_name)
+            return os.path.join(dir_path, file_name)
         else:
-            return os.path.join(*dir_names)
+            return dir_path
+
+
+    def _make_dirs(self, dir_path:str) -> None:
+        """Make sure a directory exists, creating it (and parents) if needed.
+
+        Directories that are already known to exist are remembered
+        in a bounded per-instance cache, so repeated writes under
+        the same prefix do not cost any extra syscalls.
+        The cache is emptied when it grows above
+        FILEDIRDICT_MAX_KNOWN_DIRS entries and by clear().
+        """
+        if dir_path in self._known_dirs:
+            return
+        os.makedirs(dir_path, exist_ok=True)
+        if len(self._known_dirs) >= FILEDIRDICT_MAX_KNOWN_DIRS:
+            self._known_dirs.clear()
+        self._known_dirs.add(dir_path)
 
 
     def get_subdict(self, key:PersiDictKey) -> FileDirDict:
@@ -189,80 +346,138 @@ class FileDirDict(PersiDict):
         key = SafeStrTuple(key)
         full_dir_path = self._build_full_path(
             key, create_subdirs = True, is_file_path = False)
-        return FileDirDict(
+        new_dict = FileDirDict(
             base_dir= full_dir_path
             , file_type=self.file_type
             , immutable_items= self.immutable_items
             , digest_len=self.digest_len
-            , base_class_for_values=self.base_class_for_values)
+            , base_class_for_values=self.base_class_for_values
+            , use_manifest=self.use_manifest)
+        # subdicts share the manifest of their parent
+        self._share_manifest(new_dict, key)
+        return new_dict
 
     def _read_from_file_impl(self, file_name:str) -> Any:
         """Read a value from a file. """
 
-        if self.file_type == "pkl":
-            with open(file_name, 'rb') as f:
-                result = joblib.load(f)
-        elif self.file_type == "json":
-            with open(file_name, 'r') as f:
-                result = jsonpickle.loads(f.read())
-        else:
-            with open(file_name, 'r') as f:
-                result = f.read()
-        return result
+        return self._load_value(
+            lambda: self._codec.load_from_file(file_name), file_name)
+
+    def _load_value(self, load:Callable[[], Any], source:str) -> Any:
+        """Deserialize a value with load(), reject plain text of old stores.
+
+        Older versions stored str values as plain text for all file types
+        except "pkl" and "json". If such a store is opened with a file_type
+        that is now a codec, its files can't be decoded (or decode into
+        something that is not a str): this raises a clear ValueError.
+        """
+        if not self._may_hold_text_files:
+            return load()
+        try:
+            value = load()
+        except (OSError, ImportError):
+            raise
+        except Exception as e:
+            raise self._text_file_error(source) from e
+        if not isinstance(value, self.base_class_for_values):
+            raise self._text_file_error(source)
+        return value
+
+    def _text_file_error(self, source:str) -> ValueError:
+        """Build the error for a file that looks like old plain text."""
+        return ValueError(f"Can't read {source} as file_type"
+            + f" {self.file_type!r} ({self._codec!r}). It may be a plain"
+            + " text file written by an older version, which stored"
+            + " file types other than 'pkl' and 'json' as text.")
 
     def _read_from_file(self,file_name:str) -> Any:
-        """Read a value from a file. """
+        """Read a value from a file.
 
-        if not (self.file_type in {"pkl", "json"} or issubclass(
-            self.base_class_for_values, str)):
-            raise ValueError("When base_class_for_values is not str,"
-                + " file_type must be pkl or json.")
+        Files are published atomically by _save_to_file(),
+        so a reader never observes partially written data.
+        A missing file results in FileNotFoundError right away;
+        only transient OS errors (see _is_transient_os_error) are retried.
+        Corrupted content never results in KeyError.
+        """
 
-        n_retries = 8
-        # extra protections to better handle concurrent writes
-        for i in range(n_retries):
+        n_retries = 3
+        for i in range(n_retries + 1):
             try:
                 return self._read_from_file_impl(file_name)
-            except:
-                time.sleep(random.random()/random.randint(1, 10))
-
-        return self._read_from_file_impl(file_name)
+            except OSError as e:
+                if i == n_retries or not _is_transient_os_error(e):
+                    raise
+                time.sleep(random.random()/random.randint(10, 100))
+            except KeyError as e:
+                # some deserializers (e.g. pickle) raise KeyError
+                # on corrupted data, it must not look like a missing key
+                raise ValueError(f"Can't read a value from {file_name}") from e
 
     def _save_to_file_impl(self, file_name:str, value:Any) -> None:
         """Save a value to a file. """
 
-        if self.file_type == "pkl":
-            with open(file_name, 'wb') as f:
-                joblib.dump(value, f, compress='lz4')
-        elif self.file_type == "json":
-            with open(file_name, 'w') as f:
-                f.write(jsonpickle.dumps(value, indent=4))
-        else:
-            with open(file_name, 'w') as f:
-                f.write(value)
+        with open(file_name, 'wb') as f:
+            self._codec.dump(value, f)
 
     def _save_to_file(self, file_name:str, value:Any) -> None:
-        """Save a value to a file. """
+        """Save a value to a file.
+
+        The value is first written into a uniquely named temporary file
+        in the destination directory, which is then published
+        with os.replace(). The rename is atomic, so concurrent readers
+        see either the old or the new content of the file, never a mix.
+        """
+        self._write_file_atomically(file_name
+            , lambda tmp_file_name: self._save_to_file_impl(
+                tmp_file_name, value))
 
-        if not (self.file_type in {"pkl", "json"} or issubclass(
-            self.base_class_for_values, str)):
-            raise ValueError("When base_class_for_values is not str,"
-                + " file_type must be pkl or json.")
+    def _write_file_atomically(self, file_name:str, write_func) -> None:
+        """Create a file with write_func(tmp_file_name), publish it atomically.
 
-        n_retries = 3
-        # extra protections to better handle concurrent writes
+        write_func must create a file with a given name; it is written
+        into a temporary file, which is then renamed to file_name.
+        """
+
+        dir_name = os.path.dirname(file_name)
+        tmp_file_name = os.path.join(
+            dir_name, "." + uuid.uuid4().hex + FILEDIRDICT_TMP_SUFFIX)
+        try:
+            try:
+                write_func(tmp_file_name)
+            except FileNotFoundError:
+                # the directory was removed by another process/instance
+                # after it was added to the cache of known directories
+                self._known_dirs.discard(dir_name)
+                self._make_dirs(dir_name)
+                write_func(tmp_file_name)
+            self._replace_file(tmp_file_name, file_name)
+        except:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+            raise
+
+    @staticmethod
+    def _replace_file(src:str, dst:str) -> None:
+        """Atomically move src to dst, overwriting dst if it exists.
+
+        On Windows os.replace() fails with PermissionError while dst
+        is open by another process, so the call is retried a few times.
+        """
+        n_retries = 8
         for i in range(n_retries):
-            try: # extra protections to better handle concurrent writes
-                self._save_to_file_impl(file_name, value)
+            try:
+                os.replace(src, dst)
                 return
-            except:
-                time.sleep(random.random()/random.randint(1, 5))
-
-        self._save_to_file_impl(file_name, value)
+            except PermissionError:
+                time.sleep(random.random()/random.randint(10, 100))
+        os.replace(src, dst)
 
     def __contains__(self, key:PersiDictKey) -> bool:
         """True if the dictionary has the specified key, else False. """
         key = SafeStrTuple(key)
+        manifest = self._get_manifest()
+        if manifest is not None:
+            return self._manifest_name(key) in manifest
         filename = self._build_full_path(key)
         return os.path.isfile(filename)
 
@@ -270,9 +485,10 @@ class FileDirDict(PersiDict):
         """ Implementation for x[y] syntax. """
         key = SafeStrTuple(key)
         filename = self._build_full_path(key)
-        if not os.path.isfile(filename):
+        try:
+            result = self._read_from_file(filename)
+        except FileNotFoundError:
             raise KeyError(f"File {filename} does not exist")
-        result = self._read_from_file(filename)
         if self.base_class_for_values is not None:
             if not isinstance(result, self.base_class_for_values):
                 raise TypeError(
@@ -299,56 +515,191 @@ class FileDirDict(PersiDict):
         if self.immutable_items and os.path.exists(filename):
             raise KeyError("Can't modify an immutable item")
         self._save_to_file(filename, value)
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest.add(self._manifest_name(key))
+
+    def open_read(self, key:PersiDictKey) -> BinaryIO:
+        """Open the file that stores a value for reading (in binary mode).
+
+        Values are published with atomic renames, so the stream
+        keeps reading the version that was current when it was opened.
+
+        This method is absent in the original dict API.
+        """
+        key = SafeStrTuple(key)
+        filename = self._build_full_path(key)
+        try:
+            return open(filename, "rb")
+        except FileNotFoundError:
+            raise KeyError(f"File {filename} does not exist")
+
+    def get_range(self, key:PersiDictKey, start:int, length:int) -> bytes:
+        """Read length bytes of the file of a value, starting at start.
+
+        See PersiDict.get_range().
+
+        This method is absent in the original dict API.
+        """
+        check_byte_range(self._codec, self.file_type, start, length)
+        with self.open_read(key) as f:
+            f.seek(start)
+            return f.read(length)
+
+    def open_write(self, key:PersiDictKey) -> AtomicFileWriter:
+        """Open a stream that writes the file of a value.
+
+        Data goes into a temporary file in the destination directory,
+        which is renamed to the file of the value when the stream
+        is closed (see PersiDict.open_write()).
+
+        This method is absent in the original dict API.
+        """
+        key = SafeStrTuple(key)
+        filename = self._build_full_path(key, create_subdirs=True)
+        if self.immutable_items and os.path.exists(filename):
+            raise KeyError("Can't modify an immutable item")
+        tmp_file_name = os.path.join(os.path.dirname(filename)
+            , "." + uuid.uuid4().hex + FILEDIRDICT_TMP_SUFFIX)
+
+        def publish(file_name:str) -> None:
+            if self.immutable_items and os.path.exists(filename):
+                raise KeyError("Can't modify an immutable item")
+            self._replace_file(file_name, filename)
+            manifest = self._get_manifest()
+            if manifest is not None:
+                manifest.add(self._manifest_name(key))
+
+        return AtomicFileWriter(tmp_file_name, publish)
 
     def __delitem__(self, key:PersiDictKey) -> None:
         """Delete self[key]."""
         key = SafeStrTuple(key)
         assert not self.immutable_items, "Can't delete immutable items"
         filename = self._build_full_path(key)
-        if not os.path.isfile(filename):
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest.discard(self._manifest_name(key))
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
             raise KeyError(f"File {filename} does not exist")
-        os.remove(filename)
 
     def _generic_iter(self, iter_type: str):
         """Underlying implementation for .items()/.keys()/.values() iterators"""
         assert iter_type in {"keys", "values", "items"}
-        walk_results = os.walk(self.base_dir)
-        ext_len = len(self.file_type) + 1
-
-        def splitter(dir_path: str):
-            """Transform a dirname into a PersiDictKey key"""
-            result = []
-            if dir_path == ".":
-                return result
+
+        manifest = self._get_manifest()
+
+        def step():
+            if manifest is not None:
+                for key in self._manifest_keys():
+                    yield unsign_safe_str_tuple(key, self.digest_len)
+                return
+            for key_chain, _ in self._scan_files():
+                result_key = SafeStrTuple._from_trusted_chain(key_chain)
+                yield unsign_safe_str_tuple(result_key, self.digest_len)
+
+        def keys_with_sizes():
+            if manifest is not None:
+                for key in self._manifest_keys():
+                    yield key, None
+                return
+            for key_chain, entry in self._scan_files():
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = None
+                yield SafeStrTuple._from_trusted_chain(key_chain), size
+
+        if iter_type == "keys":
+            return step()
+
+        def step_with_values():
+            for key, value in prefetch_values(keys_with_sizes()
+                    , self.__getitem__
+                    , max_items = self.prefetch_max_items
+                    , max_bytes = self.prefetch_max_bytes):
+                if iter_type == "values":
+                    yield value
+                else:
+                    yield unsign_safe_str_tuple(key, self.digest_len), value
+
+        return step_with_values()
+
+
+    def _approximate_random_keys(self, max_n:int, rng:random.Random):
+        """Select random keys by random descent into subdirectories.
+
+        Each draw starts at base_dir and picks either a value file
+        or a subdirectory, with subdirectories weighted by the number
+        of their entries, until a file is reached. Directory listings
+        are cached within a call, so only directories on the visited paths
+        (and their immediate children) are scanned. Keys in sparse
+        subtrees are somewhat more likely to be selected. If not enough
+        distinct keys are found, falls back to exact sampling.
+        """
+        suffix = "." + self.file_type
+        ext_len = len(suffix)
+        listings = dict()
+
+        def list_dir(dir_path:str) -> tuple[list[str], list[str]]:
+            if dir_path not in listings:
+                files, subdirs = [], []
+                try:
+                    with os.scandir(dir_path) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                if not entry.is_symlink():
+                                    subdirs.append(entry.name)
+                            elif entry.name.endswith(suffix):
+                                files.append(entry.name[:-ext_len])
+                except (FileNotFoundError, NotADirectoryError):
+                    pass
+                listings[dir_path] = files, subdirs
+            return listings[dir_path]
+
+        selected = dict()
+        for _ in range(4 * max_n + 16):
+            if len(selected) >= max_n:
+                break
+            dir_path, prefix = self.base_dir, ()
             while True:
-                head, tail = os.path.split(dir_path)
-                result = [tail] + result
-                dir_path = head
-                if len(head) == 0:
+                files, subdirs = list_dir(dir_path)
+                weights = [1] * len(files) + [
+                    sum(map(len, list_dir(os.path.join(dir_path, d))))
+                    for d in subdirs]
+                if not sum(weights):
+                    break
+                choice = rng.choices(range(len(weights)), weights)[0]
+                if choice < len(files):
+                    key = SafeStrTuple._from_trusted_chain(
+                        (*prefix, files[choice]))
+                    selected[unsign_safe_str_tuple(key, self.digest_len)] = None
                     break
-            return tuple(result)
+                name = subdirs[choice - len(files)]
+                dir_path, prefix = os.path.join(dir_path, name), (*prefix, name)
 
-        def step():
-            suffix = "." + self.file_type
-            for dir_name, _, files in walk_results:
-                for f in files:
-                    if f.endswith(suffix):
-                        prefix_key = os.path.relpath(
-                            dir_name, start=self.base_dir)
-
-                        result_key = (*splitter(prefix_key), f[:-ext_len])
-                        result_key = SafeStrTuple(result_key)
-
-                        if iter_type == "keys":
-                            yield unsign_safe_str_tuple(
-                                result_key, self.digest_len)
-                        elif iter_type == "values":
-                            yield self[result_key]
-                        else:
-                            yield (unsign_safe_str_tuple(
-                                result_key, self.digest_len), self[result_key])
-
-        return step()
+        if len(selected) < max_n:
+            return super()._approximate_random_keys(max_n, rng)
+        return list(selected)
+
+
+    def keys_with_timestamps(self):
+        """Iterate over (key, timestamp) pairs.
+
+        Timestamps come from the directory scan (DirEntry.stat()),
+        without extra per-key system calls.
+
+        This method is absent in the original dict API.
+        """
+        for key_chain, entry in self._scan_files():
+            try:
+                timestamp = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            yield (unsign_safe_str_tuple(SafeStrTuple._from_trusted_chain(
+                key_chain), self.digest_len), timestamp)
 
 
     def timestamp(self, key:PersiDictKey) -> float:
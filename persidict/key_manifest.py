@@ -0,0 +1,249 @@
+"""KeyManifest: a persistent on-disk index of keys stored in a dictionary.
+
+A manifest is an SQLite database with one row per stored value.
+Rows are addressed by names: signed key chains joined with "/"
+(e.g. "folder_abc12345/value_fed98765"). A dictionary and all its
+subdicts share one manifest, a subdict works with names
+that start with its key prefix.
+
+The total number of rows is maintained by triggers,
+so the length of a root dictionary is available in O(1).
+Prefix queries (len() of a subdict, iteration over keys)
+use the primary key index.
+
+The manifest is safe to use from multiple threads and processes:
+each thread gets its own connection, the database uses WAL journaling.
+
+KeyManifestMixin holds the manifest logic shared by dictionaries
+(FileDirDict, S3Dict). A newly created manifest is populated
+from the stored keys before its first use, so opening an existing
+store with use_manifest=True does not report it as empty.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Iterable, Iterator, Optional
+
+from .safe_str_tuple import SafeStrTuple
+from .safe_str_tuple_signing import sign_safe_str_tuple
+
+KEY_MANIFEST_BATCH_SIZE = 1000
+KEY_MANIFEST_TIMEOUT = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest_keys (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS manifest_stats (total INTEGER NOT NULL);
+INSERT INTO manifest_stats (total)
+    SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM manifest_stats);
+CREATE TRIGGER IF NOT EXISTS manifest_keys_insert AFTER INSERT ON manifest_keys
+    BEGIN UPDATE manifest_stats SET total = total + 1; END;
+CREATE TRIGGER IF NOT EXISTS manifest_keys_delete AFTER DELETE ON manifest_keys
+    BEGIN UPDATE manifest_stats SET total = total - 1; END;
+CREATE TABLE IF NOT EXISTS manifest_built (built INTEGER NOT NULL);
+"""
+
+
+def _prefix_upper_bound(prefix:str) -> str:
+    """Return the smallest string that is greater than all names with prefix."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class KeyManifest:
+    """A persistent set of names, stored in an SQLite database file."""
+
+    file_name:str
+
+    def __init__(self, file_name:str):
+        self.file_name = os.path.abspath(file_name)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return f"{type(self).__name__}(file_name={self.file_name!r})"
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return a connection that belongs to the current thread and process."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.file_name, timeout=KEY_MANIFEST_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _range_condition(self, prefix:str) -> tuple[str, tuple]:
+        """Build an SQL condition that selects names starting with prefix."""
+        if not len(prefix):
+            return "1", ()
+        return "name >= ? AND name < ?", (prefix, _prefix_upper_bound(prefix))
+
+    def add(self, name:str) -> None:
+        """Add a name to the manifest (no-op if it's already there)."""
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO manifest_keys (name) VALUES (?)", (name,))
+
+    def discard(self, name:str) -> None:
+        """Remove a name from the manifest (no-op if it's absent)."""
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM manifest_keys WHERE name = ?", (name,))
+
+    def __contains__(self, name:str) -> bool:
+        """True if the manifest has the name, else False."""
+        cursor = self._connection().execute(
+            "SELECT 1 FROM manifest_keys WHERE name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def count(self, prefix:str = "") -> int:
+        """Return the number of names that start with prefix."""
+        if not len(prefix):
+            cursor = self._connection().execute(
+                "SELECT total FROM manifest_stats")
+        else:
+            condition, params = self._range_condition(prefix)
+            cursor = self._connection().execute(
+                f"SELECT COUNT(*) FROM manifest_keys WHERE {condition}", params)
+        return cursor.fetchone()[0]
+
+    def names(self, prefix:str = "") -> Iterator[str]:
+        """Iterate over names that start with prefix, in sorted order.
+
+        Names are fetched in batches (keyset pagination), so
+        the manifest can be modified while the iteration is in progress.
+        """
+        condition, params = self._range_condition(prefix)
+        last_name = None
+        while True:
+            if last_name is None:
+                query, query_params = condition, params
+            else:
+                query, query_params = condition + " AND name > ?", (
+                    *params, last_name)
+            batch = self._connection().execute(
+                f"SELECT name FROM manifest_keys WHERE {query}"
+                + f" ORDER BY name LIMIT {KEY_MANIFEST_BATCH_SIZE}"
+                , query_params).fetchall()
+            for (name,) in batch:
+                yield name
+            if len(batch) < KEY_MANIFEST_BATCH_SIZE:
+                return
+            last_name = batch[-1][0]
+
+    def discard_prefix(self, prefix:str = "") -> None:
+        """Remove all names that start with prefix."""
+        condition, params = self._range_condition(prefix)
+        with self._connection() as connection:
+            connection.execute(
+                f"DELETE FROM manifest_keys WHERE {condition}", params)
+
+    @property
+    def is_built(self) -> bool:
+        """True if the manifest was ever populated with all stored names."""
+        cursor = self._connection().execute("SELECT 1 FROM manifest_built")
+        return cursor.fetchone() is not None
+
+    def replace_prefix(self, prefix:str, names:Iterable[str]) -> None:
+        """Replace all names that start with prefix, in one transaction.
+
+        Replacing all names (prefix="") marks the manifest as built.
+        """
+        condition, params = self._range_condition(prefix)
+        with self._connection() as connection:
+            connection.execute(
+                f"DELETE FROM manifest_keys WHERE {condition}", params)
+            connection.executemany(
+                "INSERT OR IGNORE INTO manifest_keys (name) VALUES (?)"
+                , ((name,) for name in names))
+            if not len(prefix):
+                connection.execute("INSERT INTO manifest_built (built)"
+                    + " SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM manifest_built)")
+
+
+class KeyManifestMixin:
+    """Key manifest support for dictionaries that store values by key chains.
+
+    A subclass calls _init_manifest() in its constructor and implements
+    _manifest_file_name() and _stored_key_chains(). A dictionary and
+    its subdicts share one manifest; names of a subdict's keys start
+    with its _manifest_prefix.
+    """
+
+    use_manifest:bool
+    digest_len:int
+
+    def _init_manifest(self, use_manifest:bool) -> None:
+        """Set up (but not open yet) the manifest of a root dictionary."""
+        self.use_manifest = bool(use_manifest)
+        self._manifest:Optional[KeyManifest] = None
+        self._manifest_prefix = ""
+
+    def _manifest_file_name(self) -> str:
+        """Return the name of the manifest's database file."""
+        raise NotImplementedError
+
+    def _stored_key_chains(self) -> Iterator[tuple[str, ...]]:
+        """Iterate over signed key chains of values that are actually stored."""
+        raise NotImplementedError
+
+    def _get_manifest(self) -> Optional[KeyManifest]:
+        """Return the key manifest (opened on first use), or None.
+
+        A manifest that was never built (e.g. a new manifest
+        of a store that already has values) is populated first.
+        """
+        if not self.use_manifest:
+            return None
+        if self._manifest is None:
+            manifest = KeyManifest(self._manifest_file_name())
+            if not manifest.is_built:
+                manifest.replace_prefix(self._manifest_prefix
+                    , map(self._manifest_chain_name, self._stored_key_chains()))
+            self._manifest = manifest
+        return self._manifest
+
+    def _manifest_chain_name(self, key_chain:Iterable[str]) -> str:
+        """Convert a signed key chain into a name of a manifest entry."""
+        return self._manifest_prefix + "/".join(key_chain)
+
+    def _manifest_name(self, key:SafeStrTuple) -> str:
+        """Convert a key into a name of a manifest entry."""
+        key = sign_safe_str_tuple(key, self.digest_len)
+        return self._manifest_chain_name(key.str_chain)
+
+    def _manifest_keys(self) -> Iterator[SafeStrTuple]:
+        """Iterate over signed keys that the manifest has for this dict."""
+        prefix_len = len(self._manifest_prefix)
+        for name in self._get_manifest().names(self._manifest_prefix):
+            yield SafeStrTuple._from_trusted_chain(
+                tuple(name[prefix_len:].split("/")))
+
+    def _share_manifest(self, subdict:KeyManifestMixin
+                        , key:SafeStrTuple) -> None:
+        """Make a subdict (with the given key prefix) use this manifest."""
+        if not self.use_manifest:
+            return
+        subdict._manifest = self._get_manifest()
+        subdict._manifest_prefix = self._manifest_prefix
+        if len(key):
+            subdict._manifest_prefix = self._manifest_name(key) + "/"
+
+    def rebuild_manifest(self) -> None:
+        """Make the key manifest match values that are actually stored.
+
+        Needed after values were added or deleted bypassing the manifest
+        (e.g. by other tools, other writers, or a dictionary without one).
+
+        This method is absent in the original dict API.
+        """
+        manifest = self._get_manifest()
+        if manifest is None:
+            raise ValueError("rebuild_manifest() requires use_manifest=True")
+        manifest.replace_prefix(self._manifest_prefix
+            , map(self._manifest_chain_name, self._stored_key_chains()))
@@ -0,0 +1,195 @@
+"""Size-bounded local disk caches with LRU eviction.
+
+LocalCacheEvictor keeps the total size of value files in a directory
+(e.g. the local cache of S3Dict) under a limit. Files are evicted in the
+order of their last access: readers "touch" cached files (update their
+modification time with os.utime), and eviction removes the files
+that were touched least recently.
+
+Eviction runs on a background thread, so it never blocks readers.
+Several processes can share one cache directory: an advisory lock
+on a lock file (fcntl.flock, or msvcrt.locking on Windows) makes sure
+only one of them evicts at a time; the operating system releases it
+if its holder dies, so there are no stale locks to take over.
+Files are published atomically
+by FileDirDict, so a reader either gets a complete file or
+no file at all (and then downloads the value again).
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Optional
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+LOCAL_CACHE_LOW_WATERMARK = 0.9
+LOCAL_CACHE_CHECK_FRACTION = 0.05
+LOCAL_CACHE_LOCK_NAME = ".__eviction__.lock"
+
+
+def _try_lock_file(fd:int) -> None:
+    """Lock an open file without waiting, raise OSError if it's locked."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def _unlock_file(fd:int) -> None:
+    """Release a lock taken with _try_lock_file() and close the file."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+def scan_cache_files(dir_path:str, suffix:str) -> list[tuple[float, int, str]]:
+    """Return (mtime, size, path) for all files in dir_path with suffix."""
+    result = []
+    for subdir_path, _, files in os.walk(dir_path):
+        for file_name in files:
+            if not file_name.endswith(suffix):
+                continue
+            path = os.path.join(subdir_path, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            result.append((stat.st_mtime, stat.st_size, path))
+    return result
+
+
+class LocalCacheEvictor:
+    """Keeps the total size of cached files in dir_path under max_bytes.
+
+    When the cache exceeds max_bytes, the least recently used files
+    are removed until it shrinks to LOCAL_CACHE_LOW_WATERMARK * max_bytes.
+    Small companion files (file name + one of companion_suffixes)
+    are removed together with the files they describe.
+    """
+
+    dir_path:str
+    max_bytes:int
+    suffix:str
+
+    def __init__(self
+                 , dir_path:str
+                 , max_bytes:int
+                 , suffix:str
+                 , companion_suffixes:tuple[str, ...] = ()):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be non-negative")
+        self.dir_path = os.path.abspath(dir_path)
+        self.max_bytes = int(max_bytes)
+        self.suffix = suffix
+        self.companion_suffixes = tuple(companion_suffixes)
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._bytes_since_check:Optional[int] = None # None: never checked
+        self._lock = threading.Lock()
+        self._thread:Optional[threading.Thread] = None
+
+    def touch(self, file_name:str) -> None:
+        """Mark a cached file as recently used."""
+        try:
+            os.utime(file_name)
+        except OSError:
+            pass
+
+    def record_write(self, file_name:str) -> None:
+        """Account for a file added to the cache, start eviction if needed."""
+        try:
+            size = os.path.getsize(file_name)
+        except OSError:
+            return
+        with self._lock:
+            if self._bytes_since_check is not None:
+                self._bytes_since_check += size
+                if self._bytes_since_check < (
+                        self.max_bytes * LOCAL_CACHE_CHECK_FRACTION):
+                    return
+            self._bytes_since_check = 0
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self.evict, name="persidict-cache-eviction", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout:Optional[float] = None) -> None:
+        """Wait for a background eviction (if any) to finish."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _acquire_directory_lock(self) -> Optional[int]:
+        """Take the inter-process eviction lock, return its descriptor or None.
+
+        The lock file is never removed (removing it could break a lock
+        that another process has just taken), only locked and unlocked.
+        """
+        lock_path = os.path.join(self.dir_path, LOCAL_CACHE_LOCK_NAME)
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR)
+        except OSError:
+            return None
+        try:
+            _try_lock_file(fd)
+        except OSError: # another process (or thread) is evicting
+            os.close(fd)
+            return None
+        return fd
+
+    def evict(self) -> int:
+        """Remove least recently used files if the cache is over the limit.
+
+        Returns the number of bytes removed. Does nothing if another
+        process (or thread) is evicting files from the same directory.
+        """
+        lock_fd = self._acquire_directory_lock()
+        if lock_fd is None:
+            return 0
+        try:
+            files = scan_cache_files(self.dir_path, self.suffix)
+            total_bytes = sum(size for _, size, _ in files)
+            if total_bytes <= self.max_bytes:
+                return 0
+            target = self.max_bytes * LOCAL_CACHE_LOW_WATERMARK
+            removed_bytes, removed_files = 0, 0
+            for _, size, path in sorted(files):
+                if total_bytes - removed_bytes <= target:
+                    break
+                for companion_suffix in self.companion_suffixes:
+                    try:
+                        os.remove(path + companion_suffix)
+                    except OSError:
+                        pass
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed_bytes += size
+                removed_files += 1
+            with self._lock:
+                self.evictions += removed_files
+                self.evicted_bytes += removed_bytes
+            return removed_bytes
+        finally:
+            _unlock_file(lock_fd)
+
+    def info(self) -> dict[str, Any]:
+        """Return the current size of the cache and eviction statistics."""
+        files = scan_cache_files(self.dir_path, self.suffix)
+        with self._lock:
+            return dict(files = len(files)
+                , currbytes = sum(size for _, size, _ in files)
+                , maxbytes = self.max_bytes
+                , evictions = self.evictions
+                , evicted_bytes = self.evicted_bytes)
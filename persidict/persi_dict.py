@@ -21,12 +21,18 @@ even after the Python process that created the dictionary has terminated.
 from __future__ import annotations
 
 from abc import abstractmethod
+import heapq
+import math
 import random
+from itertools import islice
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from parameterizable import ParameterizableClass
 from copy import deepcopy
-from typing import Any, Sequence, Optional
-from collections.abc import MutableMapping
+from typing import Any, BinaryIO, Sequence, Optional, Callable, Iterable
+from collections.abc import MutableMapping, Mapping
 
+from .prefetching import PREFETCH_DEFAULT_MAX_BYTES, prefetch_values
 from .safe_str_tuple import SafeStrTuple
 
 PersiDictKey = SafeStrTuple | Sequence[str] | str
@@ -39,6 +45,50 @@ If a string (or a sequence of strings) is passed to a PersiDict as a key,
 it will be automatically converted into SafeStrTuple.
 """
 
+_NOT_FOUND = object()
+
+
+def _reservoir_sample(items:Iterable, n:int, rng:random.Random) -> list:
+    """Select n random items from an iterable in one pass (Algorithm L).
+
+    Only n items are kept in memory; the number of random draws
+    is O(n log(N/n)) rather than O(N). Items are returned in random order.
+    """
+    iterator = iter(items)
+    reservoir = list(islice(iterator, n))
+    if len(reservoir) == n:
+        w = math.exp(math.log(1.0 - rng.random()) / n)
+        while w < 1.0:
+            skip = math.floor(math.log(1.0 - rng.random()) / math.log1p(-w))
+            next_item = next(islice(iterator, skip, None), _NOT_FOUND)
+            if next_item is _NOT_FOUND:
+                break
+            reservoir[rng.randrange(n)] = next_item
+            w *= math.exp(math.log(1.0 - rng.random()) / n)
+    rng.shuffle(reservoir)
+    return reservoir
+
+
+class BulkOperationError(Exception):
+    """Some keys failed in a bulk operation (e.g. PersiDict.get_many()).
+
+    Bulk operations do not stop at the first failure: all keys are
+    processed, then this exception is raised if any of them failed.
+
+    Attributes
+    ----------
+    results : dict
+              Results for the keys that succeeded.
+    errors : dict
+             Exceptions for the keys that failed.
+    """
+
+    def __init__(self, message:str, results:dict, errors:dict):
+        super().__init__(message)
+        self.results = results
+        self.errors = errors
+
+
 class PersiDict(MutableMapping, ParameterizableClass):
     """Dict-like durable store that accepts sequences of strings as keys.
 
@@ -83,6 +133,15 @@ class PersiDict(MutableMapping, ParameterizableClass):
     immutable_items:bool
     base_class_for_values:Optional[type]
 
+    bulk_max_workers:int = 1
+    """ Default number of threads used by bulk operations (1 = sequential)."""
+
+    prefetch_max_items:int = 1
+    """ How many values values()/items() fetch ahead (1 = no read-ahead)."""
+
+    prefetch_max_bytes:int = PREFETCH_DEFAULT_MAX_BYTES
+    """ Cap on the total size of values fetched ahead by values()/items()."""
+
     def __init__(self
                  , immutable_items:bool = False
                  , digest_len:int = 8
@@ -187,13 +246,25 @@ class PersiDict(MutableMapping, ParameterizableClass):
         """
         # TODO: check edge cases to ensure the same semantics as standard dicts
         key = SafeStrTuple(key)
-        if key in self:
+        try:
             return self[key]
-        else:
+        except KeyError:
             self[key] = default
             return default
 
 
+    def get(self, key:PersiDictKey, default:Any=None) -> Any:
+        """Return the value for key if key is in the dictionary, else default.
+
+        A single __getitem__ call is made (no separate existence check),
+        so only one request is sent to the storage backend.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
     def __eq__(self, other) -> bool:
         """Return self==other. """
         try:
@@ -225,6 +296,58 @@ class PersiDict(MutableMapping, ParameterizableClass):
                 pass
 
 
+    def delete_prefix(self, prefix_key:PersiDictKey) -> None:
+        """Delete all items whose keys start with prefix_key.
+
+        This method is absent in the original dict API.
+        """
+        if self.immutable_items:
+            raise KeyError("Can't delete an immutable key-value pair")
+
+        self.get_subdict(prefix_key).clear()
+
+
+    def open_read(self, key:PersiDictKey) -> BinaryIO:
+        """Open a binary stream over the stored representation of a value.
+
+        The stream yields the bytes of the file / object that stores
+        the value (in the format of the dictionary's file_type),
+        without loading them all into memory.
+        Raises KeyError if the key does not exist.
+
+        This method is absent in the original dict API.
+        """
+        raise NotImplementedError
+
+
+    def open_write(self, key:PersiDictKey) -> BinaryIO:
+        """Open a binary stream that stores a value when it is closed.
+
+        Bytes written into the stream become the stored representation
+        of the value, so they must be in the format of the dictionary's
+        file_type. The value is published atomically on close();
+        if the with-block that uses the stream raises an exception,
+        or the stream is discarded, the value is not stored.
+
+        This method is absent in the original dict API.
+        """
+        raise NotImplementedError
+
+
+    def get_range(self, key:PersiDictKey, start:int, length:int) -> bytes:
+        """Read length bytes of the stored representation of a value.
+
+        Reading starts at byte offset start; fewer bytes are returned
+        if the stored value ends earlier. Only works for file types
+        whose codecs store data uncompressed (byte_addressable codecs,
+        e.g. "npy", "pickle", "json" or plain text);
+        for other file types ValueError is raised.
+
+        This method is absent in the original dict API.
+        """
+        raise NotImplementedError
+
+
     def delete_if_exists(self, key:PersiDictKey) -> bool:
         """ Delete an item without raising an exception if it doesn't exist.
 
@@ -248,6 +371,138 @@ class PersiDict(MutableMapping, ParameterizableClass):
             return False
 
 
+    def _map_many(self
+                  , func:Callable
+                  , items:list
+                  , max_workers:Optional[int] = None
+                  ) -> list[tuple[bool, Any]]:
+        """Apply func to every item, possibly in parallel threads.
+
+        Returns a list of (succeeded, result_or_exception) pairs
+        in the same order as items. Exceptions are captured,
+        so one failed item does not stop processing of the others.
+        """
+        if max_workers is None:
+            max_workers = self.bulk_max_workers
+
+        def safe_call(item):
+            try:
+                return True, func(item)
+            except Exception as e:
+                return False, e
+
+        if max_workers <= 1 or len(items) <= 1:
+            return [safe_call(item) for item in items]
+        with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(items))) as executor:
+            return list(executor.map(safe_call, items))
+
+
+    def _run_many(self
+                  , func:Callable
+                  , items:list
+                  , keys:list[SafeStrTuple]
+                  , operation_name:str
+                  , max_workers:Optional[int] = None) -> dict:
+        """Run a bulk operation and collect per-key results and errors.
+
+        Returns a dictionary of results for all keys,
+        or raises BulkOperationError if any of the keys failed.
+        """
+        outcomes = self._map_many(func, items, max_workers)
+        results = dict()
+        errors = dict()
+        for key, (succeeded, outcome) in zip(keys, outcomes):
+            if succeeded:
+                results[key] = outcome
+            else:
+                errors[key] = outcome
+        if len(errors):
+            raise BulkOperationError(
+                f"{operation_name} failed for {len(errors)}"
+                + f" out of {len(keys)} keys", results, errors)
+        return results
+
+
+    def get_many(self
+                 , keys:Iterable[PersiDictKey]
+                 , as_list:bool = False
+                 , max_workers:Optional[int] = None) -> dict | list:
+        """Get values for multiple keys.
+
+        Returns a dictionary {key: value}, or a list of values
+        in the order of keys if as_list is True. If some keys are missing
+        or can't be read, BulkOperationError is raised after all the keys
+        are processed; its errors attribute maps failed keys to exceptions.
+
+        max_workers defines how many keys are processed concurrently;
+        None means bulk_max_workers of the dictionary.
+
+        Every distinct key is fetched once, even if it is repeated in keys.
+
+        This method is absent in the original dict API.
+        """
+        keys = [SafeStrTuple(k) for k in keys]
+        distinct_keys = list(dict.fromkeys(keys))
+        results = self._run_many(self.__getitem__
+            , distinct_keys, distinct_keys, "get_many", max_workers)
+        if as_list:
+            return [results[k] for k in keys]
+        return results
+
+
+    def set_many(self
+                 , items:Mapping | Iterable[tuple[PersiDictKey, Any]]
+                 , max_workers:Optional[int] = None) -> None:
+        """Set values for multiple keys.
+
+        items is a mapping or an iterable of (key, value) pairs.
+        If some values can't be stored, BulkOperationError is raised
+        after all the items are processed.
+
+        This method is absent in the original dict API.
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        items = [(SafeStrTuple(k), v) for k, v in items]
+        self._run_many(lambda item: self.__setitem__(*item)
+            , items, [k for k, _ in items], "set_many", max_workers)
+
+
+    def delete_many(self
+                    , keys:Iterable[PersiDictKey]
+                    , max_workers:Optional[int] = None) -> None:
+        """Delete multiple keys.
+
+        If some keys can't be deleted (e.g. they are missing),
+        BulkOperationError is raised after all the keys are processed.
+
+        This method is absent in the original dict API.
+        """
+        keys = [SafeStrTuple(k) for k in keys]
+        self._run_many(
+            self.__delitem__, keys, keys, "delete_many", max_workers)
+
+
+    def contains_many(self
+                      , keys:Iterable[PersiDictKey]
+                      , as_list:bool = False
+                      , max_workers:Optional[int] = None) -> dict | list:
+        """Check presence of multiple keys.
+
+        Returns a dictionary {key: bool}, or a list of bools
+        in the order of keys if as_list is True.
+
+        This method is absent in the original dict API.
+        """
+        keys = [SafeStrTuple(k) for k in keys]
+        results = self._run_many(
+            self.__contains__, keys, keys, "contains_many", max_workers)
+        if as_list:
+            return [results[k] for k in keys]
+        return results
+
+
     def get_subdict(self, prefix_key:PersiDictKey) -> PersiDict:
         """Get a sub-dictionary containing items with the same prefix key.
 
@@ -257,26 +512,68 @@ class PersiDict(MutableMapping, ParameterizableClass):
         """
         raise NotImplementedError
 
+    def list_prefixes(self, depth:int = 1) -> list[SafeStrTuple]:
+        """Get a list of distinct key prefixes of length depth.
+
+        A prefix of a key is its first depth strings
+        (or the whole key, if the key is shorter).
+        The order of prefixes in the list is not defined.
+
+        The base implementation scans all the keys, subclasses
+        override it with backend-specific hierarchical listings.
+
+        This method is absent in the original dict API.
+        """
+        if depth < 1:
+            raise ValueError("depth must be a positive integer")
+        all_prefixes = {SafeStrTuple._from_trusted_chain(k.str_chain[:depth])
+            for k in self.keys()}
+        return list(all_prefixes)
+
+
     def subdicts(self) -> dict[str, PersiDict]:
         """Get a dictionary of sub-dictionaries.
 
         This method is absent in the original dict API.
         """
-        all_keys = {k[0] for k in self.keys()}
+        all_keys = {k[0] for k in self.list_prefixes(depth=1)}
         result_subdicts = {k: self.get_subdict(k) for k in all_keys}
         return result_subdicts
 
 
-    def random_keys(self, max_n:int):
+    def random_keys(self
+                    , max_n:int
+                    , seed:Optional[int] = None
+                    , approximate:bool = False):
         """Return a list of random keys from the dictionary.
 
+        Keys are selected with one-pass reservoir sampling over keys(),
+        so at most max_n keys are kept in memory. seed makes
+        the selection reproducible; without seed, the module-level
+        generator of the random module is used (so random.seed()
+        makes the selection reproducible as well).
+
+        approximate=True allows a backend to use a faster strategy
+        that does not enumerate all keys (see _approximate_random_keys()),
+        at the cost of selecting keys with not exactly equal probabilities.
+
         This method is absent in the original Python dict API.
         """
-        all_keys = list(self.keys())
-        if max_n > len(all_keys):
-            max_n = len(all_keys)
-        result = random.sample(all_keys, max_n)
-        return result
+        rng = random if seed is None else random.Random(seed)
+        if max_n <= 0:
+            return []
+        if approximate:
+            return self._approximate_random_keys(max_n, rng)
+        return _reservoir_sample(self.keys(), max_n, rng)
+
+
+    def _approximate_random_keys(self, max_n:int, rng:random.Random):
+        """Return up to max_n distinct keys, selected approximately uniformly.
+
+        Subclasses override it with backend-specific fast paths,
+        the default implementation is exact reservoir sampling.
+        """
+        return _reservoir_sample(self.keys(), max_n, rng)
 
 
     @abstractmethod
@@ -288,6 +585,36 @@ class PersiDict(MutableMapping, ParameterizableClass):
         raise NotImplementedError
 
 
+    def keys_with_timestamps(self):
+        """Iterate over (key, timestamp) pairs.
+
+        The default implementation calls timestamp() for each key,
+        subclasses take timestamps directly from their listings.
+
+        This method is absent in the original Python dict API.
+        """
+        for key in self.keys():
+            try:
+                yield key, self.timestamp(key)
+            except (KeyError, FileNotFoundError):
+                continue
+
+
+    def items_with_timestamps(self):
+        """Iterate over (key, value, timestamp) triples.
+
+        Values are fetched ahead as in items().
+
+        This method is absent in the original Python dict API.
+        """
+        pairs = ((pair, None) for pair in self.keys_with_timestamps())
+        for (key, timestamp), value in prefetch_values(pairs
+                , lambda pair: self[pair[0]]
+                , max_items = self.prefetch_max_items
+                , max_bytes = self.prefetch_max_bytes):
+            yield key, value, timestamp
+
+
     def oldest_keys(self, max_n=None):
         """Return max_n the oldest keys in the dictionary.
 
@@ -295,13 +622,12 @@ class PersiDict(MutableMapping, ParameterizableClass):
 
         This method is absent in the original Python dict API.
         """
-        all_keys = list(self.keys())
-        # all_keys.sort(key=lambda k: self.timestamp(k))
-        all_keys.sort(key=self.timestamp)
-        if max_n is None or max_n > len(all_keys):
-            max_n = len(all_keys)
-        result = all_keys[:max_n]
-        return result
+        if max_n is None:
+            pairs = sorted(self.keys_with_timestamps(), key=itemgetter(1))
+        else:
+            pairs = heapq.nsmallest(
+                max_n, self.keys_with_timestamps(), key=itemgetter(1))
+        return [key for key, _ in pairs]
 
 
     def newest_keys(self, max_n=None):
@@ -311,13 +637,13 @@ class PersiDict(MutableMapping, ParameterizableClass):
 
         This method is absent in the original Python dict API.
         """
-        all_keys = list(self.keys())
-        # all_keys.sort(key=lambda k: self.timestamp(k), reverse=True)
-        all_keys.sort(key=self.timestamp, reverse=True)
-        if max_n is None or max_n > len(all_keys):
-            max_n = len(all_keys)
-        result = all_keys[:max_n]
-        return result
+        if max_n is None:
+            pairs = sorted(self.keys_with_timestamps()
+                , key=itemgetter(1), reverse=True)
+        else:
+            pairs = heapq.nlargest(
+                max_n, self.keys_with_timestamps(), key=itemgetter(1))
+        return [key for key, _ in pairs]
 
     def oldest_values(self, max_n=None):
         """Return max_n the oldest values in the dictionary.
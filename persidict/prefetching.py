@@ -0,0 +1,78 @@
+"""Read-ahead prefetching of values for iteration over persistent dictionaries.
+
+prefetch_values() takes a stream of keys (with sizes of their values,
+as reported by a directory scan or an S3 listing) and fetches values
+for the next few keys on a thread pool, while the consumer is still
+processing the current one. Values are yielded in the order of keys.
+
+The read-ahead window is bounded both by the number of items
+and by the total size of values that have been requested
+but not yet consumed.
+"""
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+PREFETCH_DEFAULT_MAX_BYTES = 64 * 2**20
+
+
+def prefetch_values(keys_with_sizes:Iterable[tuple[Any, Optional[int]]]
+                    , fetch:Callable[[Any], Any]
+                    , max_items:int
+                    , max_bytes:int = PREFETCH_DEFAULT_MAX_BYTES
+                    ) -> Iterator[tuple[Any, Any]]:
+    """Yield (key, fetch(key)) pairs, fetching up to max_items ahead.
+
+    keys_with_sizes yields (key, size) pairs, size can be None if unknown.
+    A new fetch is not started while the values in flight already take
+    max_bytes (one value is always allowed, however large it is).
+
+    Keys that disappear between listing and fetching (fetch raises
+    KeyError) are skipped, other errors are propagated to the consumer.
+    max_items <= 1 disables prefetching, values are fetched
+    one by one in the consumer's thread.
+
+    Closing the generator early cancels fetches that have not started
+    and releases the worker threads.
+    """
+    if max_items <= 1:
+        for key, _ in keys_with_sizes:
+            try:
+                value = fetch(key)
+            except KeyError:
+                continue
+            yield key, value
+        return
+
+    source = iter(keys_with_sizes)
+    executor = ThreadPoolExecutor(max_workers=max_items)
+    in_flight = deque()
+    bytes_in_flight = 0
+    source_exhausted = False
+    try:
+        while True:
+            while (not source_exhausted and len(in_flight) < max_items
+                    and (not in_flight or bytes_in_flight < max_bytes)):
+                try:
+                    key, size = next(source)
+                except StopIteration:
+                    source_exhausted = True
+                    break
+                size = size or 0
+                in_flight.append((key, size, executor.submit(fetch, key)))
+                bytes_in_flight += size
+            if not in_flight:
+                return
+            key, size, future = in_flight.popleft()
+            bytes_in_flight -= size
+            try:
+                value = future.result()
+            except KeyError:
+                continue
+            yield key, value
+    finally:
+        for _, _, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,19 +1,142 @@
 from __future__ import annotations
 
+import base64
+import bisect
+import hashlib
 import os
-from typing import Any, Optional
+import random
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, BinaryIO, Optional
 
 import boto3
 import parameterizable
-
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from .key_manifest import KeyManifestMixin
+from .local_cache_eviction import LocalCacheEvictor, scan_cache_files
+from .prefetching import prefetch_values
+from .streams import S3MultipartWriter
+from .write_behind import WriteBehindQueue, WRITE_BEHIND_DEFAULT_MAX_PENDING
 from .safe_str_tuple import SafeStrTuple
 from .safe_str_tuple_signing import sign_safe_str_tuple, unsign_safe_str_tuple
-from .persi_dict import PersiDict
-from .file_dir_dict import FileDirDict, PersiDictKey
+from .persi_dict import PersiDict, BulkOperationError
+from .file_dir_dict import FileDirDict, PersiDictKey, FILEDIRDICT_TMP_SUFFIX
+from .value_codecs import check_byte_range
 
 S3DICT_DEFAULT_BASE_DIR = "__s3_dict__"
+S3DICT_DEFAULT_SPOOL_THRESHOLD = 16 * 2**20
+S3DICT_DELETE_BATCH_SIZE = 1000
+S3DICT_DEFAULT_MAX_POOL_CONNECTIONS = 10
+S3DICT_MANIFEST_NAME = ".__s3_manifest__{}.sqlite" # formatted with a digest
+S3DICT_ETAG_SUFFIX = ".etag"
+S3DICT_DEFAULT_MULTIPART_THRESHOLD = 8 * 2**20
+S3DICT_DEFAULT_MULTIPART_CHUNKSIZE = 8 * 2**20
+S3DICT_DEFAULT_MAX_TRANSFER_CONCURRENCY = 10
+S3DICT_RANGED_GET_RETRIES = 3
+S3DICT_STAGING_DIR_NAME = ".__write_behind__"
+S3DICT_STAGED_SUFFIX = ".__staged__"
+
+_S3_CLIENTS: dict[tuple, Any] = dict()
+_S3_CLIENTS_LOCK = threading.Lock()
+
+# environment variables that change which endpoint / credentials
+# a newly created client would use
+_S3_CLIENT_ENV_VARS = ("AWS_ENDPOINT_URL", "AWS_ENDPOINT_URL_S3"
+    , "AWS_PROFILE", "AWS_DEFAULT_PROFILE"
+    , "AWS_ACCESS_KEY_ID", "AWS_SESSION_TOKEN")
+
+
+def get_s3_client(region:Optional[str] = None
+                  , max_pool_connections:int = S3DICT_DEFAULT_MAX_POOL_CONNECTIONS):
+    """Return a process-wide boto3 S3 client for region and pool size.
+
+    boto3 clients are thread-safe and expensive to create, so all S3Dict
+    objects with the same configuration share one client
+    (and its pool of HTTP connections). The configuration includes
+    the endpoint, profile and credentials set in environment variables:
+    after they change, a new client is created. Changes that are not
+    visible in the environment (e.g. edited credential files) require
+    clear_s3_client_pool(). Clients are not fork-safe:
+    a forked child process starts with an empty pool.
+    """
+    pool_key = (region, int(max_pool_connections)
+        , *(os.environ.get(name) for name in _S3_CLIENT_ENV_VARS))
+    client = _S3_CLIENTS.get(pool_key)
+    if client is not None:
+        return client
+    with _S3_CLIENTS_LOCK:
+        client = _S3_CLIENTS.get(pool_key)
+        if client is None:
+            # boto3 sessions are not thread-safe, create a dedicated one
+            client = boto3.session.Session().client('s3'
+                , region_name = region
+                , config = Config(max_pool_connections = max_pool_connections))
+            _S3_CLIENTS[pool_key] = client
+    return client
+
+
+def clear_s3_client_pool() -> None:
+    """Forget all pooled S3 clients (e.g. after credentials change)."""
+    with _S3_CLIENTS_LOCK:
+        _S3_CLIENTS.clear()
+
+
+def _reset_s3_client_pool_after_fork() -> None:
+    """Drop the parent's clients (and a possibly held lock) in a child."""
+    global _S3_CLIENTS, _S3_CLIENTS_LOCK
+    _S3_CLIENTS = dict()
+    _S3_CLIENTS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_s3_client_pool_after_fork)
+
+
+def _is_missing_object_error(e:ClientError) -> bool:
+    """Check if a botocore error means that an S3 object does not exist."""
+    return e.response.get("Error", {}).get("Code") in {"404", "NoSuchKey"}
+
+def _is_changed_object_error(e:ClientError) -> bool:
+    """Check if a conditional request failed because an object changed."""
+    return e.response.get("Error", {}).get("Code") in {
+        "412", "PreconditionFailed"}
+
+def _object_size(response:dict) -> int:
+    """Get the full size of an object from a (possibly ranged) GET response."""
+    content_range = response.get("ContentRange")
+    if content_range:
+        return int(content_range.rsplit("/", 1)[1])
+    return response["ContentLength"]
+
+def _is_not_modified_error(e:ClientError) -> bool:
+    """Check if a botocore error is a 304 response to a conditional GET."""
+    return e.response.get("Error", {}).get("Code") in {"304", "NotModified"}
 
-class S3Dict(PersiDict):
+_NOT_PENDING = object()
+
+
+def _key_to_objectname(root_prefix:str, file_type:str, digest_len:int
+                       , key:PersiDictKey) -> str:
+    """Convert a key into an S3 objectname (shared with AsyncS3Dict)."""
+    key = sign_safe_str_tuple(SafeStrTuple(key), digest_len)
+    return root_prefix + "/".join(key) + "." + file_type
+
+
+def _objectname_to_key(root_prefix:str, file_type:str
+                       , obj_name:str) -> SafeStrTuple:
+    """Convert an S3 objectname into a (signed) SafeStrTuple key."""
+    assert obj_name.startswith(root_prefix)
+    ext_len = len(file_type) + 1
+    return SafeStrTuple(obj_name[len(root_prefix):-ext_len].split(sep="/"))
+
+
+class S3Dict(KeyManifestMixin, PersiDict):
     """ A persistent dictionary that stores key-value pairs as S3 objects.
 
     A new object is created for each key-value pair.
@@ -33,6 +156,20 @@ class S3Dict(PersiDict):
     root_prefix: str
     file_type: str
     base_dir: str
+    in_memory_transfers: bool
+    spool_threshold: int
+    max_pool_connections: int
+    use_manifest: bool
+    local_cache_max_bytes: Optional[int]
+    validate_local_cache: bool
+    write_behind: bool
+    write_behind_max_pending: int
+    multipart_threshold: int
+    multipart_chunksize: int
+    max_transfer_concurrency: int
+
+    bulk_max_workers:int = 10
+    prefetch_max_items:int = 16
 
     def __init__(self, bucket_name:str = "my_bucket"
                  , region:str = None
@@ -42,12 +179,25 @@ class S3Dict(PersiDict):
                  , immutable_items:bool = False
                  , digest_len:int = 8
                  , base_class_for_values:Optional[type] = None
+                 , in_memory_transfers:bool = False
+                 , spool_threshold:int = S3DICT_DEFAULT_SPOOL_THRESHOLD
+                 , max_pool_connections:int = S3DICT_DEFAULT_MAX_POOL_CONNECTIONS
+                 , use_manifest:bool = False
+                 , local_cache_max_bytes:Optional[int] = None
+                 , validate_local_cache:bool = False
+                 , write_behind:bool = False
+                 , write_behind_max_pending:int = WRITE_BEHIND_DEFAULT_MAX_PENDING
+                 , multipart_threshold:int = S3DICT_DEFAULT_MULTIPART_THRESHOLD
+                 , multipart_chunksize:int = S3DICT_DEFAULT_MULTIPART_CHUNKSIZE
+                 , max_transfer_concurrency:int = (
+                    S3DICT_DEFAULT_MAX_TRANSFER_CONCURRENCY)
                  ,*args ,**kwargs):
         """A constructor defines location of the store and object format to use.
 
         bucket_name and region define an S3 location of the storage
         that will contain all the objects in the S3_Dict.
-        If the bucket does not exist, it will be created.
+        If the bucket does not exist, it will be created
+        (the bucket is checked lazily, on first access).
 
         root_prefix is a common S3 prefix for all objectnames in a dictionary.
 
@@ -59,15 +209,68 @@ class S3Dict(PersiDict):
         no type checking will be performed and all types will be allowed.
 
         file_type is extension, which will be used for all files in the dictionary.
-        If file_type has one of two values: "lz4" or "json", it defines
-        which file format will be used by FileDirDict to store values.
+        If file_type is a name of a registered codec (e.g. "pkl" or "json",
+        see value_codecs.py), the codec defines which file format
+        will be used by S3Dict to store values.
         For all other values of file_type, the file format will always be plain
-        text. "lz4" or "json" allow to store arbitrary Python objects,
+        text. Registered codecs allow to store arbitrary Python objects,
         while all other file_type-s only work with str objects.
+
+        in_memory_transfers=True makes a mutable S3Dict serialize values into
+        in-memory buffers and transfer them with put_object / get_object,
+        instead of using temporary files in base_dir. Values larger than
+        spool_threshold bytes are spooled to a temporary file on disk.
+        Immutable dictionaries and codecs that memory-map files (e.g. "npy")
+        keep using local files, since the files serve as a local cache.
+
+        max_pool_connections is the size of the HTTP connection pool
+        of the S3 client. The pool of clients is process-wide: a client
+        is shared by all S3Dict objects (including subdicts) of a process
+        with the same region, max_pool_connections, endpoint
+        and credentials (see get_s3_client()).
+
+        use_manifest=True makes the dictionary maintain a local persistent
+        index of its keys (see key_manifest.py) in base_dir (one per bucket
+        and root_prefix), which answers len(), "in" and keys()
+        without listing or querying the bucket.
+        A new manifest is populated from the bucket listing on first use.
+        The manifest only tracks modifications made through this
+        machine's S3Dict objects; after changes made by other writers,
+        call rebuild_manifest().
+
+        validate_local_cache=True makes a mutable S3Dict keep downloaded
+        and uploaded values in base_dir, together with their ETags.
+        A cached value is revalidated with a conditional GET
+        (If-None-Match), and downloaded again only if the object
+        has changed. It takes precedence over in_memory_transfers.
+
+        local_cache_max_bytes limits the total size of values that
+        an S3Dict keeps in base_dir (with immutable_items=True or
+        validate_local_cache=True). When the limit is exceeded,
+        least recently used files are evicted on a background thread
+        (see local_cache_eviction.py). None means no limit.
+
+        write_behind=True makes __setitem__ return as soon as a value
+        is serialized into a staging file in base_dir; the files are
+        uploaded by background threads (see write_behind.py).
+        At most write_behind_max_pending keys can wait for upload,
+        further writes block until some uploads finish. Reads of keys
+        with pending writes return the pending values. Call flush()
+        (or use the dictionary as a context manager) to make sure
+        all values are stored; upload errors are raised by flush().
+
+        multipart_threshold, multipart_chunksize and max_transfer_concurrency
+        configure all transfers of the dictionary: objects larger than
+        multipart_threshold bytes are uploaded and downloaded in parts
+        of multipart_chunksize bytes, up to max_transfer_concurrency
+        parts at a time. With in_memory_transfers=True, large objects
+        are downloaded with parallel byte-range GETs of the same size.
         """
 
         super().__init__(immutable_items = immutable_items, digest_len = 0)
         self.file_type = file_type
+        self.in_memory_transfers = bool(in_memory_transfers)
+        self.spool_threshold = int(spool_threshold)
 
         self.local_cache = FileDirDict(
             base_dir= base_dir
@@ -77,15 +280,39 @@ class S3Dict(PersiDict):
             , digest_len = digest_len)
 
         self.region = region
-        if region is None:
-            self.s3_client = boto3.client('s3')
-        else:
-            self.s3_client = boto3.client('s3', region_name=region)
-
-        try:
-            self.bucket = self.s3_client.create_bucket(Bucket=bucket_name)
-        except:
-            pass
+        self.max_pool_connections = int(max_pool_connections)
+        self._bucket_checked = False
+
+        self._init_manifest(use_manifest)
+
+        self.validate_local_cache = bool(validate_local_cache)
+        self.local_cache_max_bytes = local_cache_max_bytes
+        self._evictor = None
+        if local_cache_max_bytes is not None:
+            self._evictor = LocalCacheEvictor(self.local_cache.base_dir
+                , local_cache_max_bytes, "." + self.file_type
+                , companion_suffixes = (S3DICT_ETAG_SUFFIX,))
+
+        if min(multipart_threshold, multipart_chunksize
+                , max_transfer_concurrency) < 1:
+            raise ValueError("multipart_threshold, multipart_chunksize and "
+                + "max_transfer_concurrency must be positive integers")
+        self.multipart_threshold = int(multipart_threshold)
+        self.multipart_chunksize = int(multipart_chunksize)
+        self.max_transfer_concurrency = int(max_transfer_concurrency)
+        self._transfer_config = TransferConfig(
+            multipart_threshold = self.multipart_threshold
+            , multipart_chunksize = self.multipart_chunksize
+            , max_concurrency = self.max_transfer_concurrency
+            , use_threads = self.max_transfer_concurrency > 1)
+
+        self.write_behind = bool(write_behind)
+        self.write_behind_max_pending = int(write_behind_max_pending)
+        self._write_queue = None
+        if self.write_behind:
+            self._write_queue = WriteBehindQueue(
+                max_pending = self.write_behind_max_pending
+                , max_workers = self.max_pool_connections)
 
         self.bucket_name = bucket_name
 
@@ -113,20 +340,384 @@ class S3Dict(PersiDict):
         params["region"] = self.region
         params["bucket_name"] = self.bucket_name
         params["root_prefix"] = self.root_prefix
+        params["in_memory_transfers"] = self.in_memory_transfers
+        params["spool_threshold"] = self.spool_threshold
+        params["max_pool_connections"] = self.max_pool_connections
+        params["use_manifest"] = self.use_manifest
+        params["local_cache_max_bytes"] = self.local_cache_max_bytes
+        params["validate_local_cache"] = self.validate_local_cache
+        params["write_behind"] = self.write_behind
+        params["write_behind_max_pending"] = self.write_behind_max_pending
+        params["multipart_threshold"] = self.multipart_threshold
+        params["multipart_chunksize"] = self.multipart_chunksize
+        params["max_transfer_concurrency"] = self.max_transfer_concurrency
         return params
 
 
+    def flush(self) -> None:
+        """Wait until all buffered writes are uploaded to S3.
+
+        With write_behind=True, raises BulkOperationError if some
+        of the values written since the previous flush() failed to upload.
+        The queue of pending writes is shared with subdicts.
+
+        This method is absent in the original dict API.
+        """
+        if self._write_queue is not None:
+            self._write_queue.flush()
+
+
+    def _wait_for_pending(self, key:Optional[SafeStrTuple] = None) -> None:
+        """Wait for buffered writes (of one key, or all) to be uploaded."""
+        if self._write_queue is None:
+            return
+        if key is None:
+            self._write_queue.wait()
+        else:
+            self._write_queue.wait(self._build_full_objectname(key))
+
+
+    def _read_pending_value(self, key:SafeStrTuple) -> Any:
+        """Return a value that waits to be uploaded, or _NOT_PENDING."""
+        if self._write_queue is None:
+            return _NOT_PENDING
+        return self._use_staged_file(self._build_full_objectname(key)
+            , self.local_cache._read_from_file)
+
+
+    def _use_staged_file(self, obj_name:str, use_file) -> Any:
+        """Return use_file(staging file of a pending value), or _NOT_PENDING."""
+        staged_file = self._write_queue.pending_file(obj_name)
+        while staged_file is not None:
+            try:
+                return use_file(staged_file)
+            except FileNotFoundError:
+                # replaced by a newer version, or moved by an upload
+                # that is finishing: then wait instead of spinning
+                newer_file = self._write_queue.pending_file(obj_name)
+                if newer_file == staged_file:
+                    self._write_queue.wait(obj_name)
+                    newer_file = self._write_queue.pending_file(obj_name)
+                staged_file = newer_file
+        return _NOT_PENDING
+
+
+    def _stage_value(self, key:SafeStrTuple, value:Any) -> None:
+        """Serialize a value into a staging file and queue its upload."""
+        staged_file = os.path.join(self.local_cache.base_dir
+            , S3DICT_STAGING_DIR_NAME
+            , "." + uuid.uuid4().hex + S3DICT_STAGED_SUFFIX)
+        self.local_cache._save_to_file(staged_file, value)
+        self._write_queue.submit(self._build_full_objectname(key), key
+            , staged_file, lambda file_name: self._upload_staged_file(
+                key, file_name))
+
+
+    def _upload_staged_file(self, key:SafeStrTuple, staged_file:str) -> None:
+        """Upload a staging file, then move it to the local cache or remove."""
+        self._ensure_bucket()
+        obj_name = self._build_full_objectname(key)
+        keep_local_copy = self.immutable_items or self._uses_validated_cache()
+        file_name = self.local_cache._build_full_path(key, create_subdirs=True)
+        if self._uses_validated_cache():
+            self._discard_local_copy(file_name)
+            etag = self._upload_with_etag(staged_file, obj_name)
+        else:
+            self.s3_client.upload_file(staged_file, self.bucket_name
+                , obj_name, Config=self._transfer_config)
+        if keep_local_copy:
+            os.replace(staged_file, file_name)
+            if self._uses_validated_cache() and etag is not None:
+                self._write_etag(file_name, etag)
+            if self._evictor is not None:
+                self._evictor.record_write(file_name)
+        else:
+            os.remove(staged_file)
+        self._add_to_manifest(key)
+
+
+    def __enter__(self) -> S3Dict:
+        """Enter a context that flushes buffered writes at exit."""
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Flush buffered writes (upload errors are not raised on error exit)."""
+        if exc_type is None:
+            self.flush()
+        else:
+            self._wait_for_pending()
+
+
+    def local_cache_info(self) -> dict[str, Any]:
+        """Return the size of the local cache and eviction statistics.
+
+        This method is absent in the original dict API.
+        """
+        if self._evictor is not None:
+            return self._evictor.info()
+        files = scan_cache_files(
+            self.local_cache.base_dir, "." + self.file_type)
+        return dict(files = len(files)
+            , currbytes = sum(size for _, size, _ in files)
+            , maxbytes = None, evictions = 0, evicted_bytes = 0)
+
+
+    def _manifest_file_name(self) -> str:
+        """Return the name of the manifest's database file.
+
+        Dictionaries that share base_dir but store objects in different
+        buckets (or under different root prefixes) get separate manifests.
+        """
+        location = self.bucket_name + "/" + self.root_prefix
+        digest = base64.b32encode(
+            hashlib.md5(location.encode()).digest()).decode()
+        return os.path.join(self.local_cache.base_dir
+            , S3DICT_MANIFEST_NAME.format("_" + digest[:16].lower()))
+
+
+    def _stored_key_chains(self):
+        """Iterate over signed key chains of objects that are actually stored."""
+        for obj in self._list_objects():
+            yield self._objectname_to_key(obj["Key"]).str_chain
+
+
+    @property
+    def s3_client(self) -> Any:
+        """The pooled S3 client of the current process (see get_s3_client)."""
+        return get_s3_client(self.region, self.max_pool_connections)
+
+
+    def _ensure_bucket(self) -> None:
+        """Create the bucket if it does not exist, only on first call."""
+        if self._bucket_checked:
+            return
+        try:
+            self.s3_client.head_bucket(Bucket=self.bucket_name)
+        except ClientError:
+            try:
+                self.s3_client.create_bucket(Bucket=self.bucket_name)
+            except ClientError:
+                pass
+        self._bucket_checked = True
+
+
+    def _uses_memory_transfers(self) -> bool:
+        """True if values are transferred via in-memory buffers."""
+        return (self.in_memory_transfers and not self.immutable_items
+            and not self.validate_local_cache
+            and not self.local_cache._codec.maps_files)
+
+
+    def _uses_validated_cache(self) -> bool:
+        """True if local copies of mutable values are validated with ETags."""
+        return self.validate_local_cache and not self.immutable_items
+
+
+    def _read_etag(self, file_name:str) -> Optional[str]:
+        """Return the ETag of a locally cached value, or None.
+
+        The ETag file also records the inode and the size of the value file
+        it describes, so a stale ETag file (left by an interrupted
+        or concurrent update) is never paired with a wrong value file.
+        """
+        try:
+            with open(file_name + S3DICT_ETAG_SUFFIX) as f:
+                etag, inode, size = f.read().split("\n")
+            stat = os.stat(file_name)
+        except (OSError, ValueError):
+            return None
+        if (stat.st_ino, stat.st_size) != (int(inode), int(size)):
+            return None
+        return etag
+
+
+    def _write_etag(self, file_name:str, etag:str) -> None:
+        """Save the ETag of a locally cached value next to it."""
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return
+        content = f"{etag}\n{stat.st_ino}\n{stat.st_size}"
+
+        def write_etag(tmp_file_name:str) -> None:
+            with open(tmp_file_name, "w") as f:
+                f.write(content)
+
+        self.local_cache._write_file_atomically(
+            file_name + S3DICT_ETAG_SUFFIX, write_etag)
+
+
+    def _discard_local_copy(self, file_name:str) -> None:
+        """Remove a locally cached value (the ETag file goes first)."""
+        for name in (file_name + S3DICT_ETAG_SUFFIX, file_name):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+    def _get_validated_value(self, key:SafeStrTuple, file_name:str) -> Any:
+        """Read a value, reusing the local copy if its ETag is current."""
+        self._ensure_bucket()
+        obj_name = self._build_full_objectname(key)
+        etag = self._read_etag(file_name)
+        request = dict(Bucket=self.bucket_name, Key=obj_name)
+        if etag is not None:
+            request["IfNoneMatch"] = etag
+        try:
+            response = self.s3_client.get_object(**request)
+        except ClientError as e:
+            if etag is not None and _is_not_modified_error(e):
+                try:
+                    result = self.local_cache._read_from_file(file_name)
+                    if self._evictor is not None:
+                        self._evictor.touch(file_name)
+                    return result
+                except FileNotFoundError: # evicted after the check
+                    response = self.s3_client.get_object(
+                        Bucket=self.bucket_name, Key=obj_name)
+            elif _is_missing_object_error(e):
+                self._discard_local_copy(file_name)
+                raise KeyError(f"Object {obj_name} does not exist")
+            else:
+                raise
+
+        def write_body(tmp_file_name:str) -> None:
+            with open(tmp_file_name, "wb") as f:
+                shutil.copyfileobj(response["Body"], f)
+
+        self._discard_local_copy(file_name)
+        self.local_cache._write_file_atomically(file_name, write_body)
+        self._write_etag(file_name, response["ETag"])
+        if self._evictor is not None:
+            self._evictor.record_write(file_name)
+        return self.local_cache._read_from_file(file_name)
+
+
+    def _get_object_value(self, obj_name:str) -> Any:
+        """Download an object with get_object and deserialize it in memory.
+
+        The first request always asks for the first multipart_chunksize
+        bytes. If the object is larger than multipart_threshold, the rest
+        of it is downloaded with parallel byte-range GETs (up to
+        max_transfer_concurrency at a time), otherwise with one more
+        byte-range GET. Range requests are conditional on the ETag
+        of the first response, so all parts come from the same version
+        of the object. If the object is replaced during the download,
+        the download starts over.
+        """
+        self._ensure_bucket()
+        codec = self.local_cache._codec
+        for attempt in range(S3DICT_RANGED_GET_RETRIES):
+            response = self._get_first_range(obj_name)
+            first_size = response["ContentLength"]
+            total_size = _object_size(response)
+            if total_size == first_size and first_size <= self.spool_threshold:
+                data = response["Body"].read()
+                return self.local_cache._load_value(
+                    lambda: codec.loads(data), obj_name)
+            with tempfile.SpooledTemporaryFile(
+                    max_size=self.spool_threshold) as buffer:
+                shutil.copyfileobj(response["Body"], buffer)
+                if total_size > first_size:
+                    try:
+                        self._download_ranges(obj_name, response["ETag"]
+                            , first_size, total_size, buffer
+                            , parallel = total_size > self.multipart_threshold)
+                    except ClientError as e:
+                        if (attempt + 1 < S3DICT_RANGED_GET_RETRIES
+                                and _is_changed_object_error(e)):
+                            continue
+                        if _is_missing_object_error(e):
+                            raise KeyError(f"Object {obj_name} does not exist")
+                        raise
+                buffer.seek(0)
+                return self.local_cache._load_value(
+                    lambda: codec.load(buffer), obj_name)
+
+
+    def _get_first_range(self, obj_name:str) -> dict:
+        """Request the first part of an object (the whole object if small)."""
+        try:
+            return self.s3_client.get_object(Bucket=self.bucket_name
+                , Key=obj_name, Range=f"bytes=0-{self.multipart_chunksize - 1}")
+        except ClientError as e:
+            if _is_missing_object_error(e):
+                raise KeyError(f"Object {obj_name} does not exist")
+            if e.response.get("Error", {}).get("Code") != "InvalidRange":
+                raise
+        try: # an empty object has no byte ranges
+            return self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=obj_name)
+        except ClientError as e:
+            if _is_missing_object_error(e):
+                raise KeyError(f"Object {obj_name} does not exist")
+            raise
+
+
+    def _download_ranges(self, obj_name:str, etag:str
+                         , start:int, end:int, buffer
+                         , parallel:bool = True) -> None:
+        """Download bytes [start, end) of an object into buffer.
+
+        With parallel=True, bytes are requested in parts of
+        multipart_chunksize; at most max_transfer_concurrency parts are
+        downloaded (and kept in memory) at a time, parts are written
+        to buffer in order. Otherwise all bytes are requested at once.
+        """
+        chunk = self.multipart_chunksize if parallel else end - start
+
+        def ranges():
+            for offset in range(start, end, chunk):
+                last = min(offset + chunk, end) - 1
+                yield (offset, last), last - offset + 1
+
+        def fetch(byte_range:tuple[int, int]) -> bytes:
+            return self.s3_client.get_object(Bucket=self.bucket_name
+                , Key=obj_name, IfMatch=etag
+                , Range=f"bytes={byte_range[0]}-{byte_range[1]}"
+                )["Body"].read()
+
+        for _, data in prefetch_values(ranges(), fetch
+                , max_items = self.max_transfer_concurrency
+                , max_bytes = self.max_transfer_concurrency * chunk):
+            buffer.write(data)
+
+
+    def _put_object_value(self, obj_name:str, value:Any) -> None:
+        """Serialize a value in memory and upload it with put_object."""
+        self._ensure_bucket()
+        codec = self.local_cache._codec
+        with tempfile.SpooledTemporaryFile(
+                max_size=self.spool_threshold) as buffer:
+            codec.dump(value, buffer)
+            size = buffer.tell()
+            buffer.seek(0)
+            if size >= self.multipart_threshold:
+                # large values are uploaded in parts from the spooled buffer
+                self.s3_client.upload_fileobj(buffer, self.bucket_name
+                    , obj_name, Config=self._transfer_config)
+            else:
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name, Key=obj_name, Body=buffer.read())
+
+
     def _build_full_objectname(self, key:PersiDictKey) -> str:
         """ Convert PersiDictKey into an S3 objectname. """
-        key = SafeStrTuple(key)
-        key = sign_safe_str_tuple(key, self.digest_len)
-        objectname = self.root_prefix +  "/".join(key)+ "." + self.file_type
-        return objectname
+        return _key_to_objectname(
+            self.root_prefix, self.file_type, self.digest_len, key)
 
 
     def __contains__(self, key:PersiDictKey) -> bool:
         """True if the dictionary has the specified key, else False. """
         key = SafeStrTuple(key)
+        if (self._write_queue is not None and self._write_queue.pending_file(
+                self._build_full_objectname(key)) is not None):
+            return True
+        manifest = self._get_manifest()
+        if manifest is not None:
+            return self._manifest_name(key) in manifest
         if self.immutable_items:
             file_name = self.local_cache._build_full_path(
                 key, create_subdirs=True)
@@ -134,6 +725,7 @@ class S3Dict(PersiDict):
                 return True
         try:
             obj_name = self._build_full_objectname(key)
+            self._ensure_bucket()
             self.s3_client.head_object(Bucket=self.bucket_name, Key=obj_name)
             return True
         except:
@@ -144,20 +736,51 @@ class S3Dict(PersiDict):
         """X.__getitem__(y) is an equivalent to X[y]. """
 
         key = SafeStrTuple(key)
+
+        pending_value = self._read_pending_value(key)
+        if pending_value is not _NOT_PENDING:
+            return pending_value
+
+        if self._uses_memory_transfers():
+            return self._get_object_value(self._build_full_objectname(key))
+
         file_name = self.local_cache._build_full_path(key, create_subdirs=True)
 
+        if self._uses_validated_cache():
+            return self._get_validated_value(key, file_name)
+
         if self.immutable_items:
             try:
                 result = self.local_cache._read_from_file(file_name)
+                if self._evictor is not None:
+                    self._evictor.touch(file_name)
                 return result
             except:
                 pass
 
         obj_name = self._build_full_objectname(key)
-        self.s3_client.download_file(self.bucket_name, obj_name, file_name)
+        # concurrent readers of the same key must not share a download path
+        tmp_file_name = os.path.join(os.path.dirname(file_name)
+            , "." + uuid.uuid4().hex + FILEDIRDICT_TMP_SUFFIX)
+        self._ensure_bucket()
+        try:
+            try:
+                self.s3_client.download_file(self.bucket_name, obj_name
+                    , tmp_file_name, Config=self._transfer_config)
+            except ClientError as e:
+                if _is_missing_object_error(e):
+                    raise KeyError(f"Object {obj_name} does not exist")
+                raise
+            if not (self.immutable_items
+                    or self.local_cache._codec.maps_files):
+                return self.local_cache._read_from_file(tmp_file_name)
+            self.local_cache._replace_file(tmp_file_name, file_name)
+        finally:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
         result = self.local_cache._read_from_file(file_name)
-        if not self.immutable_items:
-            os.remove(file_name)
+        if self._evictor is not None:
+            self._evictor.record_write(file_name)
 
         return result
 
@@ -177,14 +800,22 @@ class S3Dict(PersiDict):
                     + f"but it is {type(value)} instead." )
 
         key = SafeStrTuple(key)
+
+        if self._uses_memory_transfers() and self._write_queue is None:
+            self._put_object_value(self._build_full_objectname(key), value)
+            self._add_to_manifest(key)
+            return
+
         file_name = self.local_cache._build_full_path(key, create_subdirs=True)
         obj_name = self._build_full_objectname(key)
 
         if self.immutable_items:
             key_is_present = False
-            if os.path.exists(file_name):
+            if (os.path.exists(file_name) or (self._write_queue is not None
+                    and self._write_queue.pending_file(obj_name) is not None)):
                 key_is_present = True
             else:
+                self._ensure_bucket()
                 try:
                     self.s3_client.head_object(
                         Bucket=self.bucket_name, Key=obj_name)
@@ -195,10 +826,175 @@ class S3Dict(PersiDict):
             if key_is_present:
                 raise KeyError("Can't modify an immutable item")
 
+        if self._write_queue is not None:
+            self._stage_value(key, value)
+            return
+
+        if self._uses_validated_cache():
+            self._put_validated_value(file_name, obj_name, value)
+            self._add_to_manifest(key)
+            return
+
         self.local_cache._save_to_file(file_name, value)
-        self.s3_client.upload_file(file_name, self.bucket_name, obj_name)
+        self._ensure_bucket()
+        self.s3_client.upload_file(file_name, self.bucket_name, obj_name
+            , Config=self._transfer_config)
         if not self.immutable_items:
             os.remove(file_name)
+        elif self._evictor is not None:
+            self._evictor.record_write(file_name)
+        self._add_to_manifest(key)
+
+
+    def _put_validated_value(self, file_name:str, obj_name:str, value:Any):
+        """Upload a value and keep its local copy together with the ETag.
+
+        Small files are uploaded with put_object, which returns the ETag
+        of exactly this upload. Larger files go through upload_file
+        (multipart), the ETag is then taken from head_object and is only
+        trusted if the size of the object matches the local file.
+        """
+        self._discard_local_copy(file_name)
+        self.local_cache._save_to_file(file_name, value)
+        etag = self._upload_with_etag(file_name, obj_name)
+        if etag is not None:
+            self._write_etag(file_name, etag)
+        if self._evictor is not None:
+            self._evictor.record_write(file_name)
+
+
+    def _upload_with_etag(self, file_name:str, obj_name:str) -> Optional[str]:
+        """Upload a file, return the ETag of the new object (or None)."""
+        self._ensure_bucket()
+        size = os.path.getsize(file_name)
+        if size < self.multipart_threshold:
+            with open(file_name, "rb") as f:
+                return self.s3_client.put_object(
+                    Bucket=self.bucket_name, Key=obj_name, Body=f)["ETag"]
+        self.s3_client.upload_file(file_name, self.bucket_name, obj_name
+            , Config=self._transfer_config)
+        response = self.s3_client.head_object(
+            Bucket=self.bucket_name, Key=obj_name)
+        if response["ContentLength"] == size:
+            return response["ETag"]
+        return None
+
+
+    def open_read(self, key:PersiDictKey) -> BinaryIO:
+        """Open a stream over the stored representation of a value.
+
+        Returns the streaming body of a get_object response, so data is
+        downloaded while it is being read. Immutable values that are
+        already in the local cache (and values waiting for upload
+        in write-behind mode) are read from local files.
+
+        This method is absent in the original dict API.
+        """
+        key = SafeStrTuple(key)
+        obj_name = self._build_full_objectname(key)
+        if self._write_queue is not None:
+            stream = self._use_staged_file(
+                obj_name, lambda file_name: open(file_name, "rb"))
+            if stream is not _NOT_PENDING:
+                return stream
+        if self.immutable_items:
+            file_name = self.local_cache._build_full_path(key)
+            try:
+                stream = open(file_name, "rb")
+                if self._evictor is not None:
+                    self._evictor.touch(file_name)
+                return stream
+            except FileNotFoundError:
+                pass
+        self._ensure_bucket()
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=obj_name)
+        except ClientError as e:
+            if _is_missing_object_error(e):
+                raise KeyError(f"Object {obj_name} does not exist")
+            raise
+        return response["Body"]
+
+
+    def get_range(self, key:PersiDictKey, start:int, length:int) -> bytes:
+        """Read length bytes of a stored value with a Range GET request.
+
+        Values available as local files (see open_read()) are read
+        from the files. See PersiDict.get_range().
+
+        This method is absent in the original dict API.
+        """
+        check_byte_range(self.local_cache._codec, self.file_type
+            , start, length)
+        key = SafeStrTuple(key)
+        obj_name = self._build_full_objectname(key)
+        if length == 0:
+            if key not in self:
+                raise KeyError(f"Object {obj_name} does not exist")
+            return b""
+
+        def read_range(file_name:str) -> bytes:
+            with open(file_name, "rb") as f:
+                f.seek(start)
+                return f.read(length)
+
+        if self._write_queue is not None:
+            data = self._use_staged_file(obj_name, read_range)
+            if data is not _NOT_PENDING:
+                return data
+        if self.immutable_items:
+            try:
+                return read_range(self.local_cache._build_full_path(key))
+            except FileNotFoundError: # not in the local cache
+                pass
+        self._ensure_bucket()
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name
+                , Key=obj_name, Range=f"bytes={start}-{start + length - 1}")
+        except ClientError as e:
+            if _is_missing_object_error(e):
+                raise KeyError(f"Object {obj_name} does not exist")
+            if e.response.get("Error", {}).get("Code") == "InvalidRange":
+                return b"" # start is beyond the end of the object
+            raise
+        return response["Body"].read()
+
+
+    def open_write(self, key:PersiDictKey) -> S3MultipartWriter:
+        """Open a stream that uploads a value when it is closed.
+
+        Data is uploaded with a multipart upload in parts of
+        multipart_chunksize bytes (at least 5 MB), up to
+        max_transfer_concurrency parts at a time, so a value of any size
+        is stored without keeping it in memory or on a local disk
+        (see PersiDict.open_write()).
+
+        This method is absent in the original dict API.
+        """
+        key = SafeStrTuple(key)
+        if self.immutable_items and key in self:
+            raise KeyError("Can't modify an immutable item")
+        self._wait_for_pending(key)
+        file_name = self.local_cache._build_full_path(key)
+
+        def on_complete(response:dict) -> None:
+            self._discard_local_copy(file_name)
+            self._add_to_manifest(key)
+
+        self._ensure_bucket()
+        return S3MultipartWriter(self.s3_client, self.bucket_name
+            , self._build_full_objectname(key)
+            , part_size = self.multipart_chunksize
+            , max_concurrency = self.max_transfer_concurrency
+            , on_complete = on_complete)
+
+
+    def _add_to_manifest(self, key:SafeStrTuple) -> None:
+        """Register a stored key in the manifest, if it's enabled."""
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest.add(self._manifest_name(key))
 
 
     def __delitem__(self, key:PersiDictKey):
@@ -207,67 +1003,222 @@ class S3Dict(PersiDict):
         key = SafeStrTuple(key)
         if self.immutable_items:
             raise KeyError("Can't delete an immutable item")
+        self._wait_for_pending(key)
         obj_name = self._build_full_objectname(key)
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest.discard(self._manifest_name(key))
+        self._ensure_bucket()
         self.s3_client.delete_object(Bucket = self.bucket_name, Key = obj_name)
         file_name = self.local_cache._build_full_path(key)
-        if os.path.isfile(file_name):
-            os.remove(file_name)
+        self._discard_local_copy(file_name)
 
 
     def __len__(self) -> int:
         """Return len(self). """
 
+        self._wait_for_pending()
+        manifest = self._get_manifest()
+        if manifest is not None:
+            return manifest.count(self._manifest_prefix)
+
         num_files = 0
-        suffix = "." + self.file_type
+        for _ in self._list_objects():
+            num_files += 1
 
-        paginator = self.s3_client.get_paginator("list_objects")
-        page_iterator = paginator.paginate(
-            Bucket=self.bucket_name, Prefix = self.root_prefix)
+        return num_files
+
+
+    def _list_objects(self, s3_prefix:Optional[str] = None):
+        """Enumerate S3 objects that store values of the dictionary.
 
+        Yields object summaries (dicts with "Key", "LastModified",
+        "Size", etc.) from a paginated listing of s3_prefix
+        (root_prefix by default), skipping objects of other file types.
+        """
+        self._ensure_bucket()
+        self._wait_for_pending()
+        if s3_prefix is None:
+            s3_prefix = self.root_prefix
+        suffix = "." + self.file_type
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        page_iterator = paginator.paginate(
+            Bucket=self.bucket_name, Prefix = s3_prefix)
         for page in page_iterator:
-            if "Contents" in page:
-                for key in page["Contents"]:
-                    obj_name = key["Key"]
-                    if obj_name.endswith(suffix):
-                        num_files += 1
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(suffix):
+                    yield obj
 
-        return num_files
+
+    def _objectname_to_key(self, obj_name:str) -> SafeStrTuple:
+        """Convert an S3 objectname into a (signed) SafeStrTuple key."""
+        return _objectname_to_key(self.root_prefix, self.file_type, obj_name)
 
 
     def _generic_iter(self, iter_type: str):
         """Underlying implementation for .items()/.keys()/.values() iterators"""
         assert iter_type in {"keys", "values", "items"}
-        suffix = "." + self.file_type
-        ext_len = len(self.file_type) + 1
-        prefix_len = len(self.root_prefix)
 
-        def splitter(full_name: str) -> SafeStrTuple:
-            assert full_name.startswith(self.root_prefix)
-            result = full_name[prefix_len:-ext_len].split(sep="/")
-            return SafeStrTuple(result)
+        self._wait_for_pending()
+        manifest = self._get_manifest()
+
+        def keys_with_sizes():
+            if manifest is not None:
+                for key in self._manifest_keys():
+                    yield key, None
+                return
+            for obj in self._list_objects():
+                yield self._objectname_to_key(obj["Key"]), obj.get("Size")
 
         def step():
-            paginator = self.s3_client.get_paginator("list_objects")
-            page_iterator = paginator.paginate(
-                Bucket=self.bucket_name, Prefix = self.root_prefix)
+            for key, _ in keys_with_sizes():
+                yield unsign_safe_str_tuple(key, self.digest_len)
 
+        if iter_type == "keys":
+            return step()
+
+        def step_with_values():
+            for key, value in prefetch_values(keys_with_sizes()
+                    , self.__getitem__
+                    , max_items = self.prefetch_max_items
+                    , max_bytes = self.prefetch_max_bytes):
+                if iter_type == "values":
+                    yield value
+                else:
+                    yield unsign_safe_str_tuple(key, self.digest_len), value
+
+        return step_with_values()
+
+
+    def clear(self) -> None:
+        """Remove all items from the dictionary.
+
+        Objects are deleted with batched DeleteObjects requests,
+        see delete_prefix().
+        """
+        self.delete_prefix(())
+
+
+    def delete_prefix(self, prefix_key:PersiDictKey) -> None:
+        """Delete all items whose keys start with prefix_key.
+
+        The listing of objects is streamed into DeleteObjects requests
+        of up to S3DICT_DELETE_BATCH_SIZE keys each, several batches
+        run concurrently (up to bulk_max_workers). Matching files
+        in the local cache are removed as well. If some objects could not
+        be deleted, BulkOperationError is raised after all the batches
+        are processed.
+
+        This method is absent in the original dict API.
+        """
+        if self.immutable_items:
+            raise KeyError("Can't delete immutable items")
+
+        prefix_key = SafeStrTuple(prefix_key)
+        self._wait_for_pending()
+        s3_prefix = self.root_prefix
+        if len(prefix_key):
+            signed_prefix = sign_safe_str_tuple(prefix_key, self.digest_len)
+            s3_prefix += "/".join(signed_prefix) + "/"
+
+        errors = dict()
+
+        def delete_batch(obj_names:list[str]) -> None:
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name
+                    , Delete=dict(Quiet=True
+                        , Objects=[dict(Key=name) for name in obj_names]))
+                for error in response.get("Errors", []):
+                    errors[error["Key"]] = RuntimeError(
+                        f"{error.get('Code')}: {error.get('Message')}")
+            except Exception as e:
+                for name in obj_names:
+                    errors[name] = e
+
+        max_workers = max(1, self.bulk_max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            batch = []
+            for obj in self._list_objects(s3_prefix):
+                batch.append(obj["Key"])
+                if len(batch) == S3DICT_DELETE_BATCH_SIZE:
+                    pending.add(executor.submit(delete_batch, batch))
+                    batch = []
+                    if len(pending) >= max_workers:
+                        _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if len(batch):
+                pending.add(executor.submit(delete_batch, batch))
+            wait(pending)
+
+        local_dir = self.local_cache._build_full_path(
+            prefix_key, is_file_path=False)
+        if os.path.isdir(local_dir):
+            if len(prefix_key):
+                self.local_cache.get_subdict(prefix_key).clear()
+            else:
+                self.local_cache.clear()
+
+        manifest = self._get_manifest()
+        if manifest is not None:
+            manifest_prefix = self._manifest_prefix
+            if len(prefix_key):
+                manifest_prefix = self._manifest_name(prefix_key) + "/"
+            manifest.discard_prefix(manifest_prefix)
+            for name in errors:
+                manifest.add(self._manifest_chain_name(
+                    self._objectname_to_key(name).str_chain))
+
+        if len(errors):
+            errors = {self._objectname_to_key(name): e
+                for name, e in errors.items()}
+            raise BulkOperationError(
+                f"delete_prefix failed for {len(errors)} objects"
+                , dict(), errors)
+
+
+    def list_prefixes(self, depth:int = 1) -> list[SafeStrTuple]:
+        """Get a list of distinct key prefixes of length depth.
+
+        Uses list_objects_v2 with Delimiter="/", so only
+        CommonPrefixes (and objects) up to the given depth are listed,
+        instead of all objects in the dictionary. Prefixes that only
+        contain objects of other file types are reported as well.
+
+        This method is absent in the original dict API.
+        """
+        if depth < 1:
+            raise ValueError("depth must be a positive integer")
+        self._ensure_bucket()
+        self._wait_for_pending()
+        suffix = "." + self.file_type
+        ext_len = len(suffix)
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        signed_prefixes = []
+        prefixes_to_list = [(self.root_prefix, ())]
+        while prefixes_to_list:
+            s3_prefix, prefix = prefixes_to_list.pop()
+            page_iterator = paginator.paginate(
+                Bucket=self.bucket_name, Prefix=s3_prefix, Delimiter="/")
             for page in page_iterator:
-                if "Contents" in page:
-                    for key in page["Contents"]:
-                        obj_name = key["Key"]
-                        if not obj_name.endswith(suffix):
-                            continue
-                        obj_key = splitter(obj_name)
-                        if iter_type == "keys":
-                            yield unsign_safe_str_tuple(
-                                obj_key, self.digest_len)
-                        elif iter_type == "values":
-                            yield self[obj_key]
-                        else:
-                            yield (unsign_safe_str_tuple(
-                                obj_key, self.digest_len), self[obj_key])
+                for common_prefix in page.get("CommonPrefixes", []):
+                    full_name = common_prefix["Prefix"]
+                    name = full_name[len(s3_prefix):-1]
+                    if not len(name):
+                        continue
+                    if len(prefix) + 1 < depth:
+                        prefixes_to_list.append((full_name, (*prefix, name)))
+                    else:
+                        signed_prefixes.append((*prefix, name))
+                for obj in page.get("Contents", []):
+                    obj_name = obj["Key"]
+                    if obj_name.endswith(suffix):
+                        name = obj_name[len(s3_prefix):-ext_len]
+                        signed_prefixes.append((*prefix, name))
 
-        return step()
+        all_prefixes = {unsign_safe_str_tuple(
+            SafeStrTuple(p), self.digest_len) for p in signed_prefixes}
+        return list(all_prefixes)
 
 
     def get_subdict(self, key:PersiDictKey) -> S3Dict:
@@ -297,11 +1248,127 @@ class S3Dict(PersiDict):
             , file_type = self.file_type
             , immutable_items = self.immutable_items
             , digest_len = self.digest_len
-            , base_class_for_values = self.base_class_for_values)
+            , base_class_for_values = self.base_class_for_values
+            , in_memory_transfers = self.in_memory_transfers
+            , spool_threshold = self.spool_threshold
+            , max_pool_connections = self.max_pool_connections
+            , use_manifest = self.use_manifest
+            , local_cache_max_bytes = self.local_cache_max_bytes
+            , validate_local_cache = self.validate_local_cache
+            , write_behind = self.write_behind
+            , write_behind_max_pending = self.write_behind_max_pending
+            , multipart_threshold = self.multipart_threshold
+            , multipart_chunksize = self.multipart_chunksize
+            , max_transfer_concurrency = self.max_transfer_concurrency)
+        if self._write_queue is not None:
+            # subdicts share the queue of pending writes with their parent
+            new_dict._write_queue = self._write_queue
+        if self._evictor is not None:
+            # the limit applies to the whole local cache of the parent
+            new_dict._evictor = self._evictor
+        new_dict._bucket_checked = self._bucket_checked
+        # subdicts share the manifest of their parent
+        self._share_manifest(new_dict, key)
 
         return new_dict
 
 
+    def _approximate_random_keys(self, max_n:int, rng:random.Random):
+        """Select random keys with random StartAfter listing probes.
+
+        If the whole dictionary fits into the first page of the listing
+        (up to 1000 objects), keys are sampled exactly from it.
+        Otherwise, each probe generates a random objectname between
+        the first objectname and the end of the key space (which shrinks
+        every time a probe finds nothing after it), and takes the first
+        object after the probe (list_objects_v2 with StartAfter and
+        a small MaxKeys), so each key costs about one request. Keys that
+        follow large gaps in the key space are more likely to be selected.
+        If not enough distinct keys are found, falls back to exact sampling.
+        """
+        self._ensure_bucket()
+        suffix = "." + self.file_type
+        first_page = self.s3_client.list_objects_v2(
+            Bucket=self.bucket_name, Prefix=self.root_prefix)
+        names = [obj["Key"] for obj in first_page.get("Contents", [])
+            if obj["Key"].endswith(suffix)]
+        if not first_page.get("IsTruncated") or not names:
+            names = rng.sample(names, min(max_n, len(names)))
+        else:
+            # objectnames (without root_prefix) are treated as numbers
+            # in base len(alphabet)+1, where digit 0 marks end of string;
+            # the alphabet only contains characters seen in the first page,
+            # so probes do not waste requests on unused parts of the key space
+            prefix_len = len(self.root_prefix)
+            alphabet = "".join(sorted({c for name in names
+                for c in name[prefix_len:]}))
+            base = len(alphabet) + 1
+            probe_len = 16
+
+            def name_to_int(name:str) -> int:
+                result = 0
+                for i in range(probe_len):
+                    digit = 0
+                    if i < len(name):
+                        digit = bisect.bisect_right(alphabet, name[i])
+                    result = result * base + digit
+                return result
+
+            def int_to_name(number:int) -> str:
+                digits = []
+                for _ in range(probe_len):
+                    number, digit = divmod(number, base)
+                    digits.append(digit)
+                chars = []
+                for digit in reversed(digits):
+                    if digit == 0:
+                        break
+                    chars.append(alphabet[digit - 1])
+                return "".join(chars)
+
+            low = name_to_int(names[0][prefix_len:]) - 1
+            high = base ** probe_len
+            selected = dict()
+            hits_left, misses_left = 4 * max_n + 16, 8 * probe_len
+            while len(selected) < max_n and hits_left and misses_left:
+                if high - low < 2:
+                    break
+                number = rng.randrange(low, high)
+                response = self.s3_client.list_objects_v2(
+                    Bucket=self.bucket_name, Prefix=self.root_prefix
+                    , StartAfter=self.root_prefix + int_to_name(number)
+                    , MaxKeys=10)
+                objects = response.get("Contents", [])
+                if objects:
+                    hits_left -= 1
+                else: # the probe is past the last object
+                    high = number
+                    misses_left -= 1
+                for obj in objects:
+                    if obj["Key"].endswith(suffix):
+                        selected[obj["Key"]] = None
+                        break
+            if len(selected) < max_n:
+                return super()._approximate_random_keys(max_n, rng)
+            names = list(selected)
+        return [unsign_safe_str_tuple(
+            self._objectname_to_key(name), self.digest_len) for name in names]
+
+
+    def keys_with_timestamps(self):
+        """Iterate over (key, timestamp) pairs.
+
+        Timestamps are LastModified values from the listing,
+        no head_object requests are made.
+
+        This method is absent in the original dict API.
+        """
+        for obj in self._list_objects():
+            obj_key = self._objectname_to_key(obj["Key"])
+            yield (unsign_safe_str_tuple(obj_key, self.digest_len)
+                , obj["LastModified"].timestamp())
+
+
     def timestamp(self,key:PersiDictKey) -> float:
         """Get last modification time (in seconds, Unix epoch time).
 
@@ -309,7 +1376,9 @@ class S3Dict(PersiDict):
         """
         #TODO: check work with timezones
         key = SafeStrTuple(key)
+        self._wait_for_pending(key)
         obj_name = self._build_full_objectname(key)
+        self._ensure_bucket()
         response = self.s3_client.head_object(Bucket=self.bucket_name, Key=obj_name)
         return response["LastModified"].timestamp()
 
@@ -5,6 +5,8 @@ from collections.abc import Sequence, Mapping, Hashable
 from typing import Any
 from persidict.safe_chars import SAFE_CHARS_SET
 
+_SAFE_CHARS_SUPERSET = SAFE_CHARS_SET.issuperset
+
 
 def _is_sequence_not_mapping(obj:Any) -> bool:
     """Check if obj is a sequence (e.g. list) but not a mapping (e.g. dict)."""
@@ -19,10 +21,26 @@ def _is_sequence_not_mapping(obj:Any) -> bool:
     else:
         return False
 
+def _flatten_into(args:Sequence, str_chain:list[str]) -> None:
+    """Validate a sequence/tree of strings and append them to str_chain."""
+    for a in args:
+        if isinstance(a, SafeStrTuple):
+            str_chain.extend(a.str_chain)
+        elif isinstance(a, str):
+            assert len(a) > 0
+            assert _SAFE_CHARS_SUPERSET(a)
+            str_chain.append(a)
+        elif isinstance(a, (list, tuple)) or _is_sequence_not_mapping(a):
+            _flatten_into(a, str_chain)
+        else:
+            assert False, f"Invalid argument type: {type(a)}"
+
 class SafeStrTuple(Sequence, Hashable):
     """An immutable sequence of non-emtpy URL/filename-safe strings.
     """
 
+    __slots__ = ("str_chain",)
+
     str_chain: tuple[str, ...]
 
     def __init__(self, *args, **kwargs):
@@ -36,21 +54,25 @@ class SafeStrTuple(Sequence, Hashable):
         """
         assert len(kwargs) == 0
         assert len(args) > 0
+        if len(args) == 1 and isinstance(args[0], SafeStrTuple):
+            self.str_chain = args[0].str_chain
+            return
         candidate_str_chain = []
-        for a in args:
-            if isinstance(a, SafeStrTuple):
-                candidate_str_chain.extend(a.str_chain)
-            elif isinstance(a, str):
-                assert len(a) > 0
-                assert len(set(a) - SAFE_CHARS_SET) == 0
-                candidate_str_chain.append(a)
-            elif _is_sequence_not_mapping(a):
-                if len(a) > 0:
-                    candidate_str_chain.extend(SafeStrTuple(*a).str_chain)
-            else:
-                assert False, f"Invalid argument type: {type(a)}"
+        _flatten_into(args, candidate_str_chain)
         self.str_chain = tuple(candidate_str_chain)
 
+    @classmethod
+    def _from_trusted_chain(cls, str_chain:tuple[str, ...]) -> SafeStrTuple:
+        """Create a SafeStrTuple from already validated strings.
+
+        No checks are performed: the caller guarantees that str_chain
+        is a tuple of non-empty URL/filename-safe strings
+        (e.g. it was taken from another SafeStrTuple).
+        """
+        result = cls.__new__(cls)
+        result.str_chain = str_chain
+        return result
+
     def __getitem__(self, key:int)-> str:
         """Return a string at position key."""
         return self.str_chain[key]
@@ -82,12 +104,14 @@ class SafeStrTuple(Sequence, Hashable):
     def __add__(self, other) -> SafeStrTuple:
         """Return self + other."""
         other = SafeStrTuple(other)
-        return SafeStrTuple(*(self.str_chain + other.str_chain))
+        return SafeStrTuple._from_trusted_chain(
+            self.str_chain + other.str_chain)
 
     def __radd__(self, other) -> SafeStrTuple:
         """Return other + self."""
         other = SafeStrTuple(other)
-        return SafeStrTuple(*(other.str_chain + self.str_chain))
+        return SafeStrTuple._from_trusted_chain(
+            other.str_chain + self.str_chain)
 
     def __iter__(self):
         """Return iter(self)."""
@@ -99,4 +123,4 @@ class SafeStrTuple(Sequence, Hashable):
 
     def __reversed__(self) -> SafeStrTuple:
         """Return a reversed SafeStrTuple."""
-        return SafeStrTuple(*reversed(self.str_chain))
\ No newline at end of file
+        return SafeStrTuple._from_trusted_chain(self.str_chain[::-1])
\ No newline at end of file
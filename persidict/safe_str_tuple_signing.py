@@ -7,13 +7,24 @@ sign_safe_str_tuple() and unsign_safe_str_tuple().
 The suffixes are used to ensure correct work of persistent dictionaries
 (which employ SafeStrTuple-s as keys) with case-insensitive filesystems,
 e.g. MacOS HFS.
+
+Computing a suffix requires an md5 hash and a base32 encoding,
+while persistent dictionaries sign / unsign every key on every access.
+Since the same strings (e.g. directory names) tend to appear
+in many keys, per-string results are memoized in bounded LRU caches.
+Use get_signing_cache_info() to inspect hit/miss counters
+and clear_signing_caches() to reset the caches.
 """
 
 import base64
 import hashlib
+from functools import lru_cache
 from persidict.safe_str_tuple import SafeStrTuple
 
+SIGNING_CACHE_MAX_SIZE = 2**16
+
 
+@lru_cache(maxsize=SIGNING_CACHE_MAX_SIZE)
 def _create_signature_suffix(input_str:str, digest_len:int) -> str:
     """ Create a hash signature suffix for a string."""
 
@@ -32,6 +43,7 @@ def _create_signature_suffix(input_str:str, digest_len:int) -> str:
     return suffix
 
 
+@lru_cache(maxsize=SIGNING_CACHE_MAX_SIZE)
 def _add_signature_suffix_if_absent(input_str:str, digest_len:int) -> str:
     """ Add a hash signature suffix to a string if it's not there."""
 
@@ -57,17 +69,21 @@ def _add_all_suffixes_if_absent(
         ) -> SafeStrTuple:
     """Add hash signature suffixes to all strings in a SafeStrTuple."""
 
-    str_seq = SafeStrTuple(str_seq)
+    if not isinstance(str_seq, SafeStrTuple):
+        str_seq = SafeStrTuple(str_seq)
+
+    if digest_len == 0:
+        return str_seq
 
-    new_seq = []
-    for s in str_seq:
-        new_seq.append(_add_signature_suffix_if_absent(s,digest_len))
+    new_seq = tuple(_add_signature_suffix_if_absent(s, digest_len)
+        for s in str_seq.str_chain)
 
-    new_seq = SafeStrTuple(*new_seq)
+    new_seq = SafeStrTuple._from_trusted_chain(new_seq)
 
     return new_seq
 
 
+@lru_cache(maxsize=SIGNING_CACHE_MAX_SIZE)
 def _remove_signature_suffix_if_present(input_str:str, digest_len:int) -> str:
     """ Remove a hash signature suffix from a string if it's detected."""
 
@@ -93,17 +109,16 @@ def _remove_all_signature_suffixes_if_present(
         ) -> SafeStrTuple:
     """Remove hash signature suffixes from all strings in a SafeStrTuple."""
 
-    str_seq = SafeStrTuple(str_seq)
+    if not isinstance(str_seq, SafeStrTuple):
+        str_seq = SafeStrTuple(str_seq)
 
     if digest_len == 0:
         return str_seq
 
-    new_seq = []
-    for s in str_seq:
-        new_string = _remove_signature_suffix_if_present(s, digest_len)
-        new_seq.append(new_string)
+    new_seq = tuple(_remove_signature_suffix_if_present(s, digest_len)
+        for s in str_seq.str_chain)
 
-    new_seq = SafeStrTuple(*new_seq)
+    new_seq = SafeStrTuple._from_trusted_chain(new_seq)
 
     return new_seq
 
@@ -113,8 +128,6 @@ def sign_safe_str_tuple(str_seq:SafeStrTuple
                         ) -> SafeStrTuple:
     """Add hash signature suffixes to all strings in a SafeStrTuple."""
 
-    str_seq = SafeStrTuple(str_seq)
-
     str_seq = _add_all_suffixes_if_absent(str_seq, digest_len)
 
     return str_seq
@@ -125,8 +138,30 @@ def unsign_safe_str_tuple(str_seq:SafeStrTuple
                           ) -> SafeStrTuple:
     """Remove hash signature suffixes from all strings in a SafeStrTuple."""
 
-    str_seq = SafeStrTuple(str_seq)
-
     str_seq = _remove_all_signature_suffixes_if_present(str_seq, digest_len)
 
-    return str_seq
\ No newline at end of file
+    return str_seq
+
+
+_SIGNING_CACHES = dict(
+    create_signature_suffix = _create_signature_suffix
+    , add_signature_suffix = _add_signature_suffix_if_absent
+    , remove_signature_suffix = _remove_signature_suffix_if_present)
+
+
+def get_signing_cache_info() -> dict[str, dict[str, int]]:
+    """Return hit/miss counters of the memoization caches used for signing.
+
+    The result maps a cache name to a dictionary with keys
+    "hits", "misses", "maxsize" and "currsize".
+    """
+    result = dict()
+    for name, func in _SIGNING_CACHES.items():
+        result[name] = func.cache_info()._asdict()
+    return result
+
+
+def clear_signing_caches() -> None:
+    """Empty the memoization caches and reset their counters."""
+    for func in _SIGNING_CACHES.values():
+        func.cache_clear()
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""Writable streams that publish stored values when they are closed.
+
+PersiDict.open_write() returns one of these streams: bytes written into
+the stream become the stored representation of a value (they must be
+in the format of the dictionary's file_type). The value is published
+atomically when the stream is closed; nothing is published if
+the stream is discarded, or if the with-block that uses it
+exits with an exception.
+
+AtomicFileWriter writes into a temporary file and renames it on close
+(used by FileDirDict). S3MultipartWriter buffers one part at a time
+and uploads parts with a multipart upload (used by S3Dict);
+small values are uploaded with a single put_object.
+NotifyingWriter wraps one of these streams and runs a callback
+after the value is published (used by CachedPersiDict).
+"""
+from __future__ import annotations
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable
+
+S3_MIN_PART_SIZE = 5 * 2**20
+
+
+class AtomicFileWriter(io.BufferedWriter):
+    """A file stream that is renamed to its final name on close."""
+
+    def __init__(self, tmp_file_name:str, publish:Callable[[str], None]):
+        super().__init__(io.FileIO(tmp_file_name, "w"))
+        self._tmp_file_name = tmp_file_name
+        self._publish = publish
+        self._discarded = False
+
+    def discard(self) -> None:
+        """Close the stream without publishing the value."""
+        self._discarded = True
+        self.close()
+
+    def close(self) -> None:
+        """Flush and close the file, then publish it (unless discarded)."""
+        if self.closed:
+            return
+        try:
+            super().close()
+            if not self._discarded:
+                self._publish(self._tmp_file_name)
+        except BaseException:
+            self._discarded = True
+            raise
+        finally:
+            if self._discarded:
+                try:
+                    os.remove(self._tmp_file_name)
+                except OSError:
+                    pass
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+    def __del__(self) -> None: # never publish an abandoned stream
+        if not self.closed:
+            self.discard()
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """A stream that uploads its content to an S3 object on close.
+
+    Data is cut into parts of part_size bytes (at least 5 MB, the minimum
+    S3 allows); up to max_concurrency parts are uploaded at a time,
+    so at most (max_concurrency + 1) * part_size bytes are held in memory.
+    If the total size stays below part_size, the object is uploaded
+    with put_object. on_complete(response) is called after the object
+    is stored; a failed or discarded upload is aborted.
+    """
+
+    def __init__(self, s3_client:Any, bucket_name:str, obj_name:str
+                 , part_size:int, max_concurrency:int = 1
+                 , on_complete:Callable[[dict], None] = lambda response: None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.obj_name = obj_name
+        self.part_size = max(int(part_size), S3_MIN_PART_SIZE)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._on_complete = on_complete
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts:list[dict] = []
+        self._in_flight = set()
+        self._executor = None
+        self._discarded = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        """Append data to the object, upload complete parts."""
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+        data = memoryview(data).cast("B")
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(part)
+        return len(data)
+
+    def _submit_part(self, part:bytes) -> None:
+        """Upload a part on the thread pool, wait if too many are in flight."""
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.obj_name)["UploadId"]
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency)
+        part_number = len(self._parts) + len(self._in_flight) + 1
+        self._in_flight.add(self._executor.submit(
+            self._upload_part, part_number, part))
+        if len(self._in_flight) >= self.max_concurrency:
+            done, self._in_flight = wait(
+                self._in_flight, return_when=FIRST_COMPLETED)
+            self._parts += [future.result() for future in done]
+
+    def _upload_part(self, part_number:int, part:bytes) -> dict:
+        response = self.s3_client.upload_part(Bucket=self.bucket_name
+            , Key=self.obj_name, UploadId=self._upload_id
+            , PartNumber=part_number, Body=part)
+        return dict(PartNumber=part_number, ETag=response["ETag"])
+
+    def _finish(self) -> dict:
+        """Upload remaining data and complete the object."""
+        if self._upload_id is None:
+            return self.s3_client.put_object(Bucket=self.bucket_name
+                , Key=self.obj_name, Body=bytes(self._buffer))
+        if len(self._buffer) or not (self._parts or self._in_flight):
+            self._submit_part(bytes(self._buffer))
+        self._buffer = bytearray()
+        done = wait(self._in_flight).done
+        self._in_flight = set()
+        self._parts += [future.result() for future in done]
+        self._parts.sort(key=lambda part: part["PartNumber"])
+        return self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=self.obj_name
+            , UploadId=self._upload_id
+            , MultipartUpload=dict(Parts=self._parts))
+
+    def _abort(self) -> None:
+        """Drop buffered data and abort the multipart upload (if any)."""
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            for future in self._in_flight:
+                future.cancel()
+            wait(self._in_flight)
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket_name
+                    , Key=self.obj_name, UploadId=self._upload_id)
+            except Exception:
+                pass
+
+    def discard(self) -> None:
+        """Close the stream without storing the object."""
+        self._discarded = True
+        self.close()
+
+    def close(self) -> None:
+        """Store the object (unless discarded) and close the stream."""
+        if self.closed:
+            return
+        try:
+            if self._discarded:
+                self._abort()
+            else:
+                try:
+                    response = self._finish()
+                except BaseException:
+                    self._abort()
+                    raise
+                self._on_complete(response)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+    def __del__(self) -> None: # never store an abandoned stream
+        if not self.closed:
+            self.discard()
+
+
+class NotifyingWriter(io.RawIOBase):
+    """A wrapper of a writable stream that calls on_publish() after close.
+
+    on_publish() is called when the wrapped stream is closed, even if
+    publishing fails; it is not called if the stream is discarded.
+    """
+
+    def __init__(self, stream:Any, on_publish:Callable[[], None]):
+        super().__init__()
+        self._stream = stream
+        self._on_publish = on_publish
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        """Write data into the wrapped stream."""
+        if self.closed:
+            raise ValueError("I/O operation on closed stream")
+        return self._stream.write(data)
+
+    def discard(self) -> None:
+        """Close the stream without publishing the value."""
+        if self.closed:
+            return
+        try:
+            self._stream.discard()
+        finally:
+            super().close()
+
+    def close(self) -> None:
+        """Publish the value of the wrapped stream, then call on_publish()."""
+        if self.closed:
+            return
+        try:
+            self._stream.close()
+        finally:
+            super().close()
+            self._on_publish()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+
+    def __del__(self) -> None: # never publish an abandoned stream
+        if not self.closed:
+            self.discard()
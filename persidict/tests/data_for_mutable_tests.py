@@ -1,3 +1,4 @@
+import importlib.util
 import inspect
 import random
 
@@ -8,6 +9,12 @@ from persidict import FileDirDict, S3Dict, SafeStrTuple
 import pandas as pd
 
 
+def requires(module_name:str):
+    """Mark a test case that needs an optional package (a setup.py extra)."""
+    return pytest.mark.skipif(importlib.util.find_spec(module_name) is None
+        , reason=f"requires {module_name}")
+
+
 mutable_tests = [
 
 (FileDirDict, dict(file_type="pkl", digest_len=11))
@@ -30,6 +37,27 @@ mutable_tests = [
 ,(S3Dict, dict(file_type="pkl", bucket_name="her_bucket"))
 ,(S3Dict, dict(file_type="json", bucket_name="their_bucket"))
 
+,(FileDirDict, dict(file_type="pickle"))
+,pytest.param(FileDirDict, dict(file_type="pickle_zst")
+    , marks=requires("zstandard"))
+,(FileDirDict, dict(file_type="cjson"))
+,(S3Dict, dict(file_type="pickle_lz4", bucket_name="lz4_bucket"))
+
+,(S3Dict, dict(file_type="pkl", bucket_name="mem_bucket"
+    , in_memory_transfers=True))
+,(S3Dict, dict(file_type="json", bucket_name="mem_bucket"
+    , in_memory_transfers=True, spool_threshold=100))
+
+,(S3Dict, dict(file_type="pkl", bucket_name="etag_bucket"
+    , validate_local_cache=True))
+
+,(S3Dict, dict(file_type="json", bucket_name="wb_bucket"
+    , write_behind=True))
+
+,(FileDirDict, dict(file_type="pkl", use_manifest=True))
+,(S3Dict, dict(file_type="json", bucket_name="manifest_bucket"
+    , use_manifest=True))
+
 ,(S3Dict, dict(file_type="pkl", bucket_name="a_bucket", root_prefix = "_"))
 ,(S3Dict, dict(file_type="json", bucket_name="the_bucket", root_prefix = "OYO"))
 
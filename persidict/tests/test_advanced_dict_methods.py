@@ -53,3 +53,23 @@ def test_more_dict_methods(tmpdir, DictToTest, kwargs):
         assert v in dict_to_test
 
     dict_to_test.clear()
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_get_missing_keys(tmpdir, DictToTest, kwargs):
+    """Test if missing keys are reported as KeyError / default values."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test.clear()
+    dict_to_test["a"] = 1
+
+    assert dict_to_test.get("a") == 1
+    assert dict_to_test.get("b") is None
+    assert dict_to_test.get(("b", "c"), 2) == 2
+    try:
+        dict_to_test["b"]
+    except KeyError:
+        pass
+    else:
+        assert False, "Failed to raise KeyError for a missing key"
+
+    dict_to_test.clear()
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from persidict import FileDirDict, BulkOperationError
+from persidict.async_persi_dict import (AsyncPersiDict
+    , ExecutorAsyncPersiDict, AsyncS3Dict)
+
+
+async def _exercise(d):
+    await d.set("a", 1)
+    await d.set(("b", "c"), "bc")
+    await asyncio.gather(*(d.set(("many", str(i)), i) for i in range(50)))
+
+    assert await d.get("a") == 1
+    assert await d.get(("b", "c")) == "bc"
+    assert await d.get("missing") is None
+    assert await d.get("missing", 42) == 42
+    with pytest.raises(KeyError):
+        await d.get_item("missing")
+    assert await d.contains("a")
+    assert not await d.contains("missing")
+    assert await d.len() == 52
+
+    values = await d.gather_many([("many", str(i)) for i in range(50)])
+    assert values == list(range(50))
+    with pytest.raises(BulkOperationError) as e:
+        await d.gather_many(["a", "missing"])
+    assert list(e.value.errors) == [("missing",)]
+
+    items = {k: v async for k, v in d.items()}
+    assert len(items) == 52
+    assert items[("a",)] == 1
+    assert sorted([v async for v in d.values() if isinstance(v, int)]
+        ) == [0, 1] + list(range(1, 50))
+
+    await d.delete("a")
+    assert not await d.contains("a")
+    with pytest.raises(KeyError):
+        await d.delete("a")
+
+
+def test_executor_async_filedirdict(tmpdir):
+    async def main():
+        sync_dict = FileDirDict(base_dir=tmpdir, file_type="pkl")
+        async with ExecutorAsyncPersiDict(sync_dict, max_concurrency=4) as d:
+            await _exercise(d)
+        assert len(sync_dict) == 51
+
+    asyncio.run(main())
+
+
+def test_invalid_max_concurrency(tmpdir):
+    with pytest.raises(ValueError):
+        ExecutorAsyncPersiDict(FileDirDict(base_dir=tmpdir), max_concurrency=0)
+
+
+def test_abstract_base_class():
+    with pytest.raises(TypeError):
+        AsyncPersiDict()
+
+
+def test_async_s3dict_objectnames():
+    d = AsyncS3Dict(bucket_name="names-bucket"
+        , root_prefix="root", file_type="json")
+    obj_name = d._build_full_objectname(("a", "b"))
+    assert obj_name == "root/a/b.json"
+    assert d._objectname_to_key(obj_name).str_chain == ("a", "b")
+
+
+@pytest.fixture
+def moto_server(monkeypatch):
+    pytest.importorskip("aiobotocore")
+    moto_server = pytest.importorskip("moto.server")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    server = moto_server.ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.mark.parametrize("file_type", ["pkl", "json"])
+def test_async_s3dict(moto_server, file_type):
+    async def main():
+        async with AsyncS3Dict(bucket_name="async-bucket"
+                , root_prefix="root", file_type=file_type
+                , max_concurrency=8, endpoint_url=moto_server) as d:
+            await _exercise(d)
+
+    asyncio.run(main())
+
+
+def test_async_s3dict_immutable_items(moto_server):
+    async def main():
+        async with AsyncS3Dict(bucket_name="immutable-bucket"
+                , immutable_items=True, endpoint_url=moto_server) as d:
+            await d.set("key", "value")
+            with pytest.raises(KeyError):
+                await d.set("key", "other value")
+            with pytest.raises(KeyError):
+                await d.delete("key")
+            assert await d.get("key") == "value"
+
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import errno
 import inspect
 import random
 
@@ -39,3 +40,28 @@ def test_basics(tmpdir, DictToTest, kwargs):
         assert k not in dict_to_test
 
     dict_to_test.clear()
+
+def test_corrupted_file_is_not_a_missing_key(tmpdir):
+    """Test if a corrupted value raises an error instead of KeyError."""
+    d = FileDirDict(base_dir=tmpdir)
+    d["a"] = 1
+    with open(d._build_full_path(SafeStrTuple("a")), "wb") as f:
+        f.write(b"not a pickle")
+    with pytest.raises(Exception) as e:
+        d["a"]
+    assert not isinstance(e.value, KeyError)
+
+
+def test_corrupted_file_after_transient_errors(tmpdir):
+    """Test if the last read attempt also maps KeyError to ValueError."""
+    d = FileDirDict(base_dir=tmpdir)
+    d["a"] = 1
+    errors = [OSError(errno.EAGAIN, "busy")] * 3 + [KeyError("corrupted")]
+
+    def read_with_errors(file_name):
+        raise errors.pop(0)
+
+    d._read_from_file_impl = read_with_errors
+    with pytest.raises(ValueError):
+        d["a"]
+    assert errors == []
@@ -0,0 +1,65 @@
+import pytest
+from moto import mock_aws
+
+from persidict import BulkOperationError, SafeStrTuple
+
+from persidict.tests.data_for_mutable_tests import mutable_tests
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_bulk_operations(tmpdir, DictToTest, kwargs):
+    """Test get_many / set_many / delete_many / contains_many."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test.clear()
+    model_dict = {SafeStrTuple("k", str(i)): i for i in range(20)}
+
+    dict_to_test.set_many(model_dict)
+    assert len(dict_to_test) == len(model_dict)
+    dict_to_test.set_many([(("single",), 0)], max_workers=1)
+
+    all_keys = list(model_dict)
+    assert dict_to_test.get_many(all_keys) == model_dict
+    assert dict_to_test.get_many(all_keys, as_list=True) == list(
+        model_dict.values())
+    assert dict_to_test.contains_many(all_keys + ["missing"], as_list=True
+        ) == [True] * len(all_keys) + [False]
+
+    with pytest.raises(BulkOperationError) as e:
+        dict_to_test.get_many(all_keys[:3] + ["missing"])
+    assert list(e.value.errors) == [SafeStrTuple("missing")]
+    assert isinstance(e.value.errors[SafeStrTuple("missing")], KeyError)
+    assert len(e.value.results) == 3
+
+    dict_to_test.delete_many(all_keys[:10])
+    assert len(dict_to_test) == 11
+    assert dict_to_test.contains_many(all_keys[:10]) == {
+        k: False for k in all_keys[:10]}
+
+    dict_to_test.clear()
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_get_many_duplicate_keys(tmpdir, DictToTest, kwargs):
+    """Test that repeated keys are fetched once and returned for each."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test["k"] = list(range(100_000))
+    results = dict_to_test.get_many(["k"] * 16, as_list=True, max_workers=16)
+    assert len(results) == 16
+    assert all(r == list(range(100_000)) for r in results)
+    assert dict_to_test.get_many(["k", ("k",)]) == {
+        SafeStrTuple("k"): list(range(100_000))}
+
+
+@mock_aws
+def test_s3_concurrent_reads_of_one_key(tmpdir):
+    """Test that parallel S3Dict reads of one key don't share a file."""
+    from concurrent.futures import ThreadPoolExecutor
+    from persidict import S3Dict
+    d = S3Dict(base_dir=tmpdir, bucket_name="race_bucket")
+    d["k"] = list(range(100_000))
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: d["k"], range(32)))
+    assert all(r == list(range(100_000)) for r in results)
+    assert d.local_cache_info()["files"] == 0
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict, CachedPersiDict
+
+
+@mock_aws
+def test_cache_hits_and_write_through(tmpdir):
+    backing = S3Dict(base_dir=tmpdir, bucket_name="cached_bucket")
+    d = CachedPersiDict(backing, max_items=100)
+    d["a"] = 1
+    d[("b", "c")] = "bc"
+    calls = []
+    backing.s3_client.meta.events.register("before-call.s3.*"
+        , lambda **kwargs: calls.append(kwargs), unique_id="count_calls")
+    try:
+        for _ in range(10):
+            assert d["a"] == 1
+            assert d["b", "c"] == "bc"
+            assert "a" in d
+    finally:
+        backing.s3_client.meta.events.unregister(
+            "before-call.s3.*", unique_id="count_calls")
+    assert calls == []
+    info = d.cache_info()
+    assert info["hits"] == 30 and info["misses"] == 0
+    assert info["hit_ratio"] == 1.0
+
+    backing["a"] = 2  # out-of-band change is not visible without ttl
+    assert d["a"] == 1
+    d["a"] = 3
+    assert d["a"] == 3 and backing["a"] == 3
+
+    del d["a"]
+    assert "a" not in d
+    with pytest.raises(KeyError):
+        d["a"]
+    assert len(d) == 1
+    assert dict(d.items()) == {("b", "c"): "bc"}
+
+
+def test_lru_eviction(tmpdir):
+    backing = FileDirDict(base_dir=tmpdir)
+    for i in range(10):
+        backing[str(i)] = i
+    d = CachedPersiDict(backing, max_items=3)
+    for i in range(10):
+        assert d[str(i)] == i
+    info = d.cache_info()
+    assert info["currsize"] == 3 and info["evictions"] == 7
+    assert d["9"] == 9 and d.cache_info()["hits"] == 1
+    assert d["0"] == 0 and d.cache_info()["misses"] == 11
+
+    d = CachedPersiDict(backing, max_bytes=3000)
+    backing["big"] = np.zeros(300)
+    d["small"] = np.zeros(100)
+    assert d.cache_info()["currbytes"] == 800
+    d["big"]
+    assert d.cache_info()["currbytes"] == 2400  # "small" was evicted
+    d["huge"] = np.zeros(1000)  # too large to be cached
+    assert d.cache_info()["currsize"] == 1
+    assert d["huge"].shape == (1000,)
+
+
+def test_ttl_and_immutable_items(tmpdir):
+    backing = FileDirDict(base_dir=tmpdir.mkdir("mutable"))
+    d = CachedPersiDict(backing, ttl=0.05)
+    d["k"] = "v1"
+    backing["k"] = "v2"
+    assert d["k"] == "v1"
+    time.sleep(0.1)
+    assert d["k"] == "v2"
+
+    immutable = FileDirDict(base_dir=tmpdir.mkdir("immutable")
+        , immutable_items=True)
+    d = CachedPersiDict(immutable, ttl=0.01)
+    assert d.immutable_items
+    d["k"] = "v"
+    time.sleep(0.05)
+    assert d["k"] == "v"
+    assert d.cache_info() ["hits"] == 1
+    with pytest.raises(KeyError):
+        d["k"] = "other"
+
+
+def test_subdicts_share_cache(tmpdir):
+    d = CachedPersiDict(FileDirDict(base_dir=tmpdir))
+    d["x", "a"] = 1
+    d["x", "b"] = 2
+    d["y", "a"] = 3
+    subdict = d.get_subdict("x")
+    assert isinstance(subdict, CachedPersiDict)
+    assert subdict["a"] == 1
+    assert d.cache_info()["hits"] == 1
+
+    subdict["a"] = 10
+    assert d["x", "a"] == 10
+    d.delete_prefix("x")
+    assert len(subdict) == 0
+    assert ("x", "b") not in d
+    assert d["y", "a"] == 3
+    assert set(d.subdicts()) == {"y"}
+
+    d.clear()
+    assert len(d) == 0 and d.cache_info()["currsize"] == 0
+
+
+@mock_aws
+def test_streams_invalidate_cache(tmpdir):
+    for backing in [FileDirDict(base_dir=tmpdir.mkdir("local"), file_type="json")
+            , S3Dict(base_dir=tmpdir.mkdir("s3"), file_type="json")]:
+        d = CachedPersiDict(backing)
+        d["a"] = "old"
+        with d.open_read("a") as f:
+            assert f.read() == b'"old"'
+
+        f = d.open_write("a")
+        f.write(b'"discarded"')
+        f.discard()
+        assert d["a"] == "old"
+
+        with d.open_write("a") as f:
+            f.write(b'"new"')
+            assert d["a"] == "old"  # not published yet
+        assert d["a"] == "new"
+        assert backing["a"] == "new"
+
+
+class SlowReadsDict(FileDirDict):
+    """A FileDirDict that pauses after reading a value (for race tests)."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.read_done.set()
+        self.proceed.wait()
+        return value
+
+
+def test_concurrent_writes_during_read_miss(tmpdir):
+    """test that a read racing with a set/delete does not cache stale values."""
+    backing = SlowReadsDict(base_dir=tmpdir)
+    d = CachedPersiDict(backing)
+    for modify in [lambda: d.__setitem__("k", "new"), lambda: d.__delitem__("k")]:
+        backing.read_done, backing.proceed = threading.Event(), threading.Event()
+        backing.proceed.set()
+        d["k"] = "old"
+        d.clear_cache()
+        backing.proceed.clear()
+        reader = threading.Thread(target=lambda: d["k"])
+        reader.start()
+        backing.read_done.wait()
+        modify()
+        backing.proceed.set()
+        reader.join()
+        assert d.get("k") == backing.get("k")
+    assert "k" not in d
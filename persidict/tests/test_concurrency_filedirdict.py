@@ -31,3 +31,49 @@ def test_concurrency(tmpdir):
     assert isinstance(d["a"], float)
 
 
+def timed_operations(dir_name:str, n_operations:int, results_queue):
+    d = FileDirDict(dir_name)
+    value = [random.random() for _ in range(5_000)]
+    read_latencies = []
+    n_errors = 0
+    for i in range(n_operations):
+        if random.random() < 0.5:
+            d["b"] = value
+        else:
+            start = time.perf_counter()
+            try:
+                if len(d["b"]) != len(value):
+                    n_errors += 1
+            except:
+                n_errors += 1
+            read_latencies.append(time.perf_counter() - start)
+    results_queue.put((read_latencies, n_errors))
+
+def test_concurrency_latency_tail(tmpdir):
+    """Test if read latencies stay bounded under parallel writers."""
+    dir_name = str(tmpdir)
+    d = FileDirDict(dir_name)
+    d["b"] = [random.random() for _ in range(5_000)]
+    results_queue = multiprocessing.Queue()
+    n_processes = 8
+    processes = []
+    for i in range(n_processes):
+        p = multiprocessing.Process(target=timed_operations
+            , args=(dir_name, 100, results_queue,))
+        p.start()
+        processes.append(p)
+    all_latencies = []
+    total_errors = 0
+    for i in range(n_processes):
+        latencies, n_errors = results_queue.get()
+        all_latencies.extend(latencies)
+        total_errors += n_errors
+    for p in processes:
+        p.join()
+    all_latencies.sort()
+    n = len(all_latencies)
+    assert n > 0
+    # A generous bound: it only catches reads stuck in long retry loops
+    assert all_latencies[int(n*0.99)] < 2.0
+    assert total_errors == 0
+    assert len(d) == 1
@@ -0,0 +1,55 @@
+import pytest
+from moto import mock_aws
+
+from persidict import S3Dict
+import persidict.s3_dict
+
+from persidict.tests.data_for_mutable_tests import mutable_tests
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_delete_prefix(tmpdir, DictToTest, kwargs):
+    """Test if delete_prefix() removes only keys with a given prefix."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test.clear()
+    for i in range(5):
+        dict_to_test[("a", str(i))] = i
+        dict_to_test[("a", "b", str(i))] = i
+        dict_to_test[("c", str(i))] = i
+    dict_to_test["a"] = "leaf"
+
+    dict_to_test.delete_prefix(("a", "b"))
+    assert len(dict_to_test) == 11
+    dict_to_test.delete_prefix("a")
+    assert len(dict_to_test) == 6
+    assert dict_to_test["a"] == "leaf"
+    dict_to_test.delete_prefix("missing")
+    assert len(dict_to_test) == 6
+
+    dict_to_test.clear()
+    assert len(dict_to_test) == 0
+
+
+@mock_aws
+def test_clear_in_batches(tmpdir, monkeypatch):
+    """Test if S3Dict.clear() deletes objects in several batches."""
+    monkeypatch.setattr(persidict.s3_dict, "S3DICT_DELETE_BATCH_SIZE", 3)
+    d = S3Dict(base_dir=tmpdir, bucket_name="batch_bucket")
+    d.set_many({("x", str(i)): i for i in range(20)})
+    assert len(d) == 20
+    batch_sizes = []
+    def count_batch(params, **kwargs):
+        batch_sizes.append(params["body"].count(b"<Key>"))
+    events = d.s3_client.meta.events
+    events.register("before-call.s3.DeleteObjects", count_batch
+        , unique_id="count_delete_batches")
+    try:
+        d.clear()
+    finally:
+        events.unregister("before-call.s3.DeleteObjects"
+            , unique_id="count_delete_batches")
+    assert len(d) == 0
+    assert len(batch_sizes) == 7
+    assert all(0 < n <= 3 for n in batch_sizes)
+    assert sum(batch_sizes) == 20
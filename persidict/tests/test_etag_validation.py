@@ -0,0 +1,101 @@
+import boto3
+from moto import mock_aws
+
+from persidict import S3Dict
+
+
+def _count_calls(d, operation, calls):
+    d.s3_client.meta.events.register(f"before-call.s3.{operation}"
+        , lambda **kwargs: calls.append(kwargs), unique_id="count_" + operation)
+
+
+def _stop_counting(d, operation):
+    d.s3_client.meta.events.unregister(
+        f"before-call.s3.{operation}", unique_id="count_" + operation)
+
+
+@mock_aws
+def test_etag_validated_reads(tmpdir):
+    """test that unchanged values are not downloaded again."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="etag_bucket"
+        , validate_local_cache=True)
+    d["a"] = "x" * 1000
+    responses = []
+    d.s3_client.meta.events.register("after-call.s3.GetObject"
+        , lambda http_response, **kwargs: responses.append(
+            http_response.status_code), unique_id="count_get")
+    try:
+        for _ in range(3):
+            assert d["a"] == "x" * 1000
+    finally:
+        d.s3_client.meta.events.unregister(
+            "after-call.s3.GetObject", unique_id="count_get")
+    assert responses == [304, 304, 304]
+
+
+@mock_aws
+def test_etag_detects_external_changes(tmpdir):
+    """test that changes made by another dictionary are always visible."""
+    d1 = S3Dict(base_dir=tmpdir.mkdir("one"), bucket_name="etag_bucket"
+        , validate_local_cache=True)
+    d2 = S3Dict(base_dir=tmpdir.mkdir("two"), bucket_name="etag_bucket"
+        , validate_local_cache=True)
+    d1["a"] = 1
+    assert d2["a"] == 1
+    d1["a"] = 2
+    assert d2["a"] == 2
+    assert d1["a"] == 2
+    d2[("b", "c")] = [1, 2, 3]
+    assert d1[("b", "c")] == [1, 2, 3]
+    del d2["a"]
+    assert "a" not in d1
+    try:
+        d1["a"]
+        assert False, "KeyError expected"
+    except KeyError:
+        pass
+
+
+@mock_aws
+def test_etag_read_your_writes(tmpdir):
+    """test that a value written locally is read back without a download."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="etag_bucket"
+        , validate_local_cache=True, file_type="pkl")
+    calls = []
+    for i in range(5):
+        d[f"k{i}"] = list(range(i))
+    _count_calls(d, "GetObject", calls)
+    try:
+        for i in range(5):
+            assert d[f"k{i}"] == list(range(i))
+    finally:
+        _stop_counting(d, "GetObject")
+    assert len(calls) == 5
+    assert all(c["params"]["headers"].get("If-None-Match") for c in calls)
+
+
+@mock_aws
+def test_etag_stale_sidecar_is_ignored(tmpdir):
+    """test that a local file modified behind the dictionary is replaced."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="etag_bucket"
+        , validate_local_cache=True, file_type="json")
+    d["a"] = "correct value"
+    file_name = d.local_cache._build_full_path(("a",))
+    with open(file_name, "w") as f:
+        f.write('"corrupted local copy, longer"')
+    assert d["a"] == "correct value"
+    assert d.local_cache._read_from_file(file_name) == "correct value"
+
+
+@mock_aws
+def test_etag_with_out_of_band_upload(tmpdir):
+    """test that objects uploaded without persidict are revalidated."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="etag_bucket"
+        , validate_local_cache=True, file_type="json")
+    d["a"] = "old"
+    obj_name = d._build_full_objectname(("a",))
+    boto3.client("s3").put_object(
+        Bucket="etag_bucket", Key=obj_name, Body=b'"new"')
+    assert d["a"] == "new"
+    assert d.get_params()["validate_local_cache"] is True
+    assert d.get_subdict("x").validate_local_cache
@@ -0,0 +1,115 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict, CachedPersiDict
+from persidict.tests.data_for_mutable_tests import requires
+
+
+def make_dicts(tmpdir, **kwargs):
+    return [FileDirDict(base_dir=tmpdir.mkdir("local"), **kwargs)
+        , S3Dict(base_dir=tmpdir.mkdir("s3"), bucket_name="range_bucket"
+            , **kwargs)]
+
+
+@mock_aws
+def test_get_range_text(tmpdir):
+    """test get_range() for plain text values."""
+    for d in make_dicts(tmpdir, file_type="txt", base_class_for_values=str):
+        d["t"] = "hello world"
+        assert d.get_range("t", 0, 5) == b"hello"
+        assert d.get_range("t", 6, 100) == b"world"
+        assert d.get_range("t", 100, 5) == b""
+        assert d.get_range("t", 3, 0) == b""
+        with pytest.raises(KeyError):
+            d.get_range("missing", 0, 5)
+        with pytest.raises(KeyError):
+            d.get_range("missing", 0, 0)
+        with pytest.raises(ValueError):
+            d.get_range("t", -1, 5)
+
+
+@mock_aws
+def test_get_range_of_cached_dict(tmpdir):
+    """test that CachedPersiDict.get_range() reads the backing dictionary."""
+    for backing in make_dicts(tmpdir, file_type="txt", base_class_for_values=str):
+        d = CachedPersiDict(backing)
+        d["t"] = "hello world"
+        assert d.get_range("t", 6, 5) == b"world"
+        backing["t"] = "HELLO WORLD"
+        assert d.get_range("t", 6, 5) == b"WORLD"
+        with pytest.raises(KeyError):
+            d.get_range("missing", 0, 5)
+
+
+@mock_aws
+def test_get_range_npy(tmpdir):
+    """test that get_range() returns slices of stored .npy files."""
+    for d in make_dicts(tmpdir, file_type="npy"):
+        d["a"] = np.arange(10_000, dtype=np.int64)
+        with d.open_read("a") as f:
+            data = f.read()
+        for start, length in [(0, 128), (128, 8), (1000, 4000), (80_000, 200)]:
+            assert d.get_range("a", start, length) == (
+                data[start:start + length])
+
+
+@mock_aws
+def test_get_range_uses_range_requests(tmpdir):
+    """test that S3Dict.get_range() transfers only the requested bytes."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket", file_type="pickle")
+    d["v"] = b"x" * 100_000
+    sizes = []
+    d.s3_client.meta.events.register("after-call.s3.GetObject"
+        , lambda parsed, **kwargs: sizes.append(parsed["ContentLength"])
+        , unique_id="count_bytes")
+    try:
+        assert d.get_range("v", 1000, 10) == b"x" * 10
+    finally:
+        d.s3_client.meta.events.unregister(
+            "after-call.s3.GetObject", unique_id="count_bytes")
+    assert sizes == [10]
+
+
+@pytest.mark.parametrize("file_type", ["pkl", "pickle_lz4"
+    , pytest.param("pickle_zst", marks=requires("zstandard"))])
+@mock_aws
+def test_get_range_compressed(tmpdir, file_type):
+    """test that get_range() fails clearly for compressed file types."""
+    for d in make_dicts(tmpdir, file_type=file_type):
+        d["v"] = b"data"
+        with pytest.raises(ValueError, match="compressed"):
+            d.get_range("v", 0, 2)
+
+
+@mock_aws
+def test_get_range_of_replaced_pending_value(tmpdir):
+    """test that get_range() follows a staged file replaced by a newer one."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket", file_type="txt"
+        , base_class_for_values=str, write_behind=True)
+    release = threading.Event()
+
+    def block(**kwargs):
+        release.wait(10)
+
+    d.s3_client.meta.events.register(
+        "before-call.s3.PutObject", block, unique_id="block_put")
+    try:
+        d["t"] = "hello world"
+        pending_file = d._write_queue.pending_file
+        replaced = [os.path.join(str(tmpdir), "replaced_staged_file")]
+
+        def replaced_once(name):
+            return replaced.pop() if replaced else pending_file(name)
+
+        d._write_queue.pending_file = replaced_once
+        assert d.get_range("t", 6, 5) == b"world"
+        assert not replaced
+    finally:
+        release.set()
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.PutObject", unique_id="block_put")
+        d.flush()
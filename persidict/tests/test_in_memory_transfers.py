@@ -0,0 +1,28 @@
+import os
+
+from moto import mock_aws
+
+from persidict import S3Dict
+
+
+@mock_aws
+def test_in_memory_transfers_use_no_local_files(tmpdir):
+    """Test if in-memory transfers do not touch the local directory."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="mem_bucket"
+        , in_memory_transfers=True, spool_threshold=1000)
+    small_value = "x" * 10
+    large_value = "y" * 100_000
+    d[("a", "small")] = small_value
+    d[("a", "large")] = large_value
+    assert d[("a", "small")] == small_value
+    assert d[("a", "large")] == large_value
+    assert d.get(("a", "missing")) is None
+    assert len(d) == 2
+    for _, _, files in os.walk(tmpdir):
+        assert len(files) == 0
+
+    d_files = S3Dict(base_dir=tmpdir, bucket_name="mem_bucket")
+    assert d_files[("a", "large")] == large_value
+    d_files[("a", "small")] = large_value
+    assert d[("a", "small")] == large_value
+    d.clear()
@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict
+from persidict.key_manifest import KeyManifest
+
+
+def test_key_manifest_basics(tmpdir):
+    manifest = KeyManifest(os.path.join(tmpdir, "manifest.sqlite"))
+    for name in ["a", "b/c", "b/d", "bb/e", "c"]:
+        manifest.add(name)
+    manifest.add("a")
+    assert manifest.count() == 5
+    assert manifest.count("b/") == 2
+    assert list(manifest.names("b/")) == ["b/c", "b/d"]
+    assert "b/c" in manifest and "b" not in manifest
+
+    manifest.discard("a")
+    manifest.discard("a")
+    manifest.discard_prefix("b/")
+    assert list(manifest.names()) == ["bb/e", "c"]
+    assert manifest.count() == 2
+
+    manifest.replace_prefix("x/", ["x/" + str(i) for i in range(2500)])
+    assert manifest.count() == 2502
+    assert len(list(manifest.names("x/"))) == 2500
+
+    reopened = KeyManifest(manifest.file_name)
+    assert reopened.count() == 2502
+
+
+def test_key_manifest_threads(tmpdir):
+    manifest = KeyManifest(os.path.join(tmpdir, "manifest.sqlite"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(manifest.add, [str(i) for i in range(400)]))
+    assert manifest.count() == 400
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", [
+    (FileDirDict, dict(file_type="pkl"))
+    ,(S3Dict, dict(file_type="pkl", bucket_name="manifest_bucket"))
+    ,(S3Dict, dict(file_type="json", bucket_name="manifest_bucket"
+        , in_memory_transfers=True, root_prefix="root"))])
+@mock_aws
+def test_manifest_answers_len_contains_keys(tmpdir, DictToTest, kwargs):
+    d = DictToTest(base_dir=tmpdir, use_manifest=True, **kwargs)
+    plain_d = DictToTest(base_dir=tmpdir, **kwargs)
+    for i in range(10):
+        d[("group_" + str(i % 2), "key_" + str(i))] = i
+    d["top"] = -1
+    assert d.get_params()["use_manifest"]
+
+    assert len(d) == 11
+    assert ("group_0", "key_0") in d
+    assert ("group_0", "key_1") not in d
+    assert set(d.keys()) == set(plain_d.keys())
+    assert dict(d.items()) == dict(plain_d.items())
+
+    subdict = d.get_subdict("group_1")
+    assert len(subdict) == 5
+    assert "key_3" in subdict and "key_2" not in subdict
+    assert {k[0] for k in subdict.keys()} == {"key_1", "key_3", "key_5", "key_7", "key_9"}
+    del subdict["key_1"]
+    assert len(d) == 10
+
+    # changes made without the manifest are not visible until rebuild
+    plain_d["added_out_of_band"] = 1
+    assert "added_out_of_band" not in d
+    assert len(d) == 10
+    d.rebuild_manifest()
+    assert "added_out_of_band" in d
+    assert len(d) == 11
+
+    d.delete_prefix("group_0")
+    assert len(d) == 6
+    assert len(plain_d) == 6
+    d.clear()
+    assert len(d) == 0
+    assert len(plain_d) == 0
+
+    with pytest.raises(ValueError):
+        plain_d.rebuild_manifest()
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", [
+    (FileDirDict, dict(file_type="pkl"))
+    ,(S3Dict, dict(file_type="pkl", bucket_name="manifest_bucket"))])
+@mock_aws
+def test_new_manifest_of_populated_store(tmpdir, DictToTest, kwargs):
+    plain_d = DictToTest(base_dir=tmpdir, **kwargs)
+    for i in range(6):
+        plain_d[("group_" + str(i % 2), "key_" + str(i))] = i
+
+    d = DictToTest(base_dir=tmpdir, use_manifest=True, **kwargs)
+    subdict = d.get_subdict("group_1")
+    assert len(d) == 6
+    assert ("group_0", "key_2") in d
+    assert set(d.keys()) == set(plain_d.keys())
+    assert len(subdict) == 3
+    assert "key_5" in subdict
+    assert d._get_manifest().is_built
+
+    # an existing (already built) manifest is not rebuilt on reopening
+    plain_d["added_out_of_band"] = 1
+    reopened = DictToTest(base_dir=tmpdir, use_manifest=True, **kwargs)
+    assert len(reopened) == 6
+    assert "added_out_of_band" not in reopened
+
+
+def test_key_manifest_is_built(tmpdir):
+    manifest = KeyManifest(os.path.join(tmpdir, "manifest.sqlite"))
+    assert not manifest.is_built
+    manifest.replace_prefix("x/", ["x/a"])
+    assert not manifest.is_built
+    manifest.replace_prefix("", ["a", "b"])
+    assert manifest.is_built
+    assert manifest.count() == 2
+    manifest.replace_prefix("", [])
+    assert KeyManifest(manifest.file_name).is_built
+
+
+@mock_aws
+def test_s3_manifests_of_shared_base_dir(tmpdir):
+    dicts = [S3Dict(base_dir=tmpdir, bucket_name=bucket_name
+            , root_prefix=root_prefix, use_manifest=True)
+        for bucket_name in ["bucket-a", "bucket-b"]
+        for root_prefix in ["one", "two"]]
+    for n, d in enumerate(dicts):
+        for i in range(n + 1):
+            d["group_" + str(i % 2), "k" + str(i)] = i
+    for n, d in enumerate(dicts):
+        assert len(d) == n + 1
+        assert ("group_1", "k" + str(n + 1)) not in d
+        assert {k[1] for k in d.keys()} == {"k" + str(i) for i in range(n + 1)}
+    assert len({d._get_manifest().file_name for d in dicts}) == 4
+
+    dicts[1].clear()
+    assert [len(d) for d in dicts] == [1, 0, 3, 4]
+    dicts[3].delete_prefix("group_0")
+    assert [len(d) for d in dicts] == [1, 0, 3, 2]
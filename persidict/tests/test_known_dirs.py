@@ -0,0 +1,26 @@
+from persidict import FileDirDict
+
+
+def test_known_dirs_cache(tmpdir):
+    """Test if directories are created once and re-created after clear()."""
+    d = FileDirDict(base_dir=tmpdir)
+    for i in range(100):
+        d[("a", "b", "c", "d", f"key_{i}")] = i
+    assert len(d._known_dirs) == 2
+    assert len(d) == 100
+
+    d.clear()
+    assert len(d._known_dirs) == 1
+    d[("a", "b", "c", "d", "key_0")] = 0
+    assert d[("a", "b", "c", "d", "key_0")] == 0
+
+
+def test_known_dirs_removed_by_another_instance(tmpdir):
+    """Test if a stale cache entry does not break writes."""
+    d_1 = FileDirDict(base_dir=tmpdir)
+    d_2 = FileDirDict(base_dir=tmpdir)
+    d_1[("x", "y", "z")] = 1
+    d_2.clear()
+    assert len(d_1) == 0
+    d_1[("x", "y", "z")] = 2
+    assert d_2[("x", "y", "z")] == 2
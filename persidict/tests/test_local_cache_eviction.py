@@ -0,0 +1,88 @@
+import os
+import time
+
+import numpy as np
+from moto import mock_aws
+
+from persidict import S3Dict
+from persidict.local_cache_eviction import (
+    LocalCacheEvictor, LOCAL_CACHE_LOCK_NAME, _unlock_file)
+
+
+def _fill(dir_path, n, size):
+    paths = []
+    for i in range(n):
+        path = os.path.join(dir_path, f"f{i}.pkl")
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (1000 + i, 1000 + i))
+        paths.append(path)
+    return paths
+
+
+def test_evictor_removes_least_recently_used(tmpdir):
+    paths = _fill(str(tmpdir), 10, 100)
+    evictor = LocalCacheEvictor(str(tmpdir), max_bytes=500, suffix=".pkl")
+    evictor.touch(paths[0])
+    assert evictor.evict() == 600
+    remaining = {p for p in paths if os.path.exists(p)}
+    assert remaining == {paths[0], paths[7], paths[8], paths[9]}
+    info = evictor.info()
+    assert info["currbytes"] == 400 and info["files"] == 4
+    assert info["evictions"] == 6 and info["evicted_bytes"] == 600
+    assert evictor.evict() == 0
+
+
+def test_evictor_respects_lock_of_other_process(tmpdir):
+    _fill(str(tmpdir), 10, 100)
+    lock_path = os.path.join(str(tmpdir), LOCAL_CACHE_LOCK_NAME)
+    other = LocalCacheEvictor(str(tmpdir), max_bytes=500, suffix=".pkl")
+    lock_fd = other._acquire_directory_lock()
+    assert lock_fd is not None
+    evictor = LocalCacheEvictor(str(tmpdir), max_bytes=500, suffix=".pkl")
+    try:
+        assert evictor.evict() == 0
+    finally:
+        _unlock_file(lock_fd)
+    assert evictor.evict() == 600
+    assert os.path.exists(lock_path)  # lock files are never removed
+    assert evictor.evict() == 0
+
+
+def test_lock_file_without_lock_is_not_stale(tmpdir):
+    _fill(str(tmpdir), 10, 100)
+    lock_path = os.path.join(str(tmpdir), LOCAL_CACHE_LOCK_NAME)
+    open(lock_path, "w").close()  # e.g. left by a process that died
+    evictor = LocalCacheEvictor(str(tmpdir), max_bytes=500, suffix=".pkl")
+    assert evictor.evict() == 600
+
+
+@mock_aws
+def test_immutable_s3dict_local_cache_is_bounded(tmpdir):
+    d = S3Dict(base_dir=tmpdir, bucket_name="bounded", file_type="npy"
+        , immutable_items=True, local_cache_max_bytes=20_000)
+    for i in range(20):
+        d["prefix", str(i)] = np.full(1000, i, dtype=np.int8)
+        d._evictor.wait()
+    d._evictor.evict()
+    info = d.local_cache_info()
+    assert info["currbytes"] <= 20_000
+    assert info["evictions"] > 0
+    assert d.get_params()["local_cache_max_bytes"] == 20_000
+
+    for i in range(20):  # evicted values are downloaded again
+        assert d["prefix", str(i)][0] == i
+    subdict = d.get_subdict("prefix")
+    assert subdict._evictor is d._evictor
+    assert subdict["3"][0] == 3
+    d._evictor.wait()
+    d._evictor.evict()
+    assert d.local_cache_info()["currbytes"] <= 20_000
+
+
+@mock_aws
+def test_local_cache_info_without_limit(tmpdir):
+    d = S3Dict(base_dir=tmpdir, bucket_name="unbounded", immutable_items=True)
+    d["a"] = 1
+    info = d.local_cache_info()
+    assert info["files"] == 1 and info["maxbytes"] is None
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", [
+    (FileDirDict, dict(file_type="npy"))
+    ,(S3Dict, dict(file_type="npy", bucket_name="npy_bucket"))
+    ,(S3Dict, dict(file_type="npy", bucket_name="npy_bucket"
+        , immutable_items=True))
+    ])
+@mock_aws
+def test_npy_memmap(tmpdir, DictToTest, kwargs):
+    """Test if npy values are returned as read-only memory-mapped arrays."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    array = np.arange(10_000, dtype=np.float64).reshape(100, 100)
+    dict_to_test["a"] = array
+
+    result = dict_to_test["a"]
+    assert isinstance(result, np.memmap)
+    assert not result.flags.writeable
+    assert np.array_equal(result, array)
+    assert np.array_equal(result[10:20, 5], array[10:20, 5])
+
+    if not dict_to_test.immutable_items:
+        dict_to_test["a"] = array * 2
+        assert np.array_equal(dict_to_test["a"], array * 2)
+        assert np.array_equal(result, array)
+
+    with pytest.raises(TypeError):
+        dict_to_test["b"] = [1, 2, 3]
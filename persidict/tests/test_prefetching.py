@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+from moto import mock_aws
+
+from persidict.prefetching import prefetch_values
+from persidict.tests.data_for_mutable_tests import mutable_tests
+
+
+class FetchTracker:
+    def __init__(self, missing=()):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fetched = []
+        self.missing = set(missing)
+
+    def __call__(self, key):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+            self.fetched.append(key)
+        if key in self.missing:
+            raise KeyError(key)
+        return key * 10
+
+
+def test_prefetch_preserves_order():
+    fetch = FetchTracker()
+    result = list(prefetch_values(((i, 1) for i in range(50)), fetch, max_items=8))
+    assert result == [(i, i * 10) for i in range(50)]
+    assert 1 < fetch.max_in_flight <= 8
+
+
+def test_prefetch_respects_byte_cap():
+    fetch = FetchTracker()
+    result = list(prefetch_values(((i, 100) for i in range(20))
+        , fetch, max_items=8, max_bytes=200))
+    assert result == [(i, i * 10) for i in range(20)]
+    assert fetch.max_in_flight <= 2
+
+
+def test_prefetch_skips_missing_keys_and_propagates_errors():
+    fetch = FetchTracker(missing={3, 5})
+    result = list(prefetch_values(((i, None) for i in range(8)), fetch, max_items=4))
+    assert [k for k, _ in result] == [0, 1, 2, 4, 6, 7]
+
+    def failing_fetch(key):
+        if key == 2:
+            raise ValueError("corrupted")
+        return key
+
+    with pytest.raises(ValueError):
+        list(prefetch_values(((i, None) for i in range(8)), failing_fetch, max_items=4))
+
+
+def test_prefetch_disabled():
+    fetch = FetchTracker(missing={1})
+    result = list(prefetch_values(((i, None) for i in range(5)), fetch, max_items=1))
+    assert [k for k, _ in result] == [0, 2, 3, 4]
+    assert fetch.max_in_flight == 1
+
+
+def test_prefetch_stops_when_generator_is_closed():
+    fetch = FetchTracker()
+    threads_before = threading.active_count()
+    generator = prefetch_values(((i, 1) for i in range(1000)), fetch, max_items=4)
+    assert next(generator) == (0, 0)
+    generator.close()
+    time.sleep(0.1)
+    assert len(fetch.fetched) <= 1 + 4
+    assert threading.active_count() <= threads_before
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_items_with_prefetching(tmpdir, DictToTest, kwargs):
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test.clear()
+    model_dict = {("k", str(i)): i for i in range(30)}
+    dict_to_test.update(model_dict)
+    dict_to_test.prefetch_max_items = 5
+    dict_to_test.prefetch_max_bytes = 2**10
+    assert dict(dict_to_test.items()) == model_dict
+    assert sorted(dict_to_test.values()) == list(range(30))
+
+    iterator = iter(dict_to_test.items())
+    next(iterator)
+    iterator.close()
@@ -28,3 +28,49 @@ def test_random_keys(tmpdir, DictToTest, kwargs):
             single_random_key = dict_to_test.random_keys(max_n=q)[0]
             all_keys |= {single_random_key}
         assert len(all_keys) >= 7
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_random_keys_seed_and_approximate(tmpdir, DictToTest, kwargs):
+    dict_to_test = DictToTest(base_dir = tmpdir, **kwargs)
+    for i in range(30):
+        dict_to_test[("group_" + str(i % 3), "key_" + str(i))] = i
+    all_keys = set(dict_to_test.keys())
+
+    sample = dict_to_test.random_keys(max_n=5, seed=42)
+    assert sample == dict_to_test.random_keys(max_n=5, seed=42)
+    assert len(set(sample)) == 5 and set(sample) <= all_keys
+
+    for approximate in [False, True]:
+        random.seed(42)
+        sample = dict_to_test.random_keys(max_n=5, approximate=approximate)
+        random.seed(42)
+        assert sample == dict_to_test.random_keys(
+            max_n=5, approximate=approximate)
+
+    for max_n in [1, 10, 30, 40]:
+        sample = dict_to_test.random_keys(max_n=max_n, approximate=True)
+        assert len(set(sample)) == len(sample) == min(max_n, 30)
+        assert set(sample) <= all_keys
+
+
+def test_reservoir_sample_is_uniform():
+    from persidict.persi_dict import _reservoir_sample
+    rng = random.Random(1)
+    counts = [0] * 20
+    for _ in range(4000):
+        for item in _reservoir_sample(range(20), 5, rng):
+            counts[item] += 1
+    assert all(800 < c < 1200 for c in counts)
+    assert sorted(_reservoir_sample(range(3), 5, rng)) == [0, 1, 2]
+
+
+@mock_aws
+def test_approximate_random_keys_with_probes(tmpdir):
+    dict_to_test = S3Dict(base_dir = tmpdir, bucket_name = "probes"
+        , in_memory_transfers = True)
+    dict_to_test.set_many({"k" + str(i): i for i in range(1100)})
+    sample = dict_to_test.random_keys(max_n=20, seed=7, approximate=True)
+    assert len(set(sample)) == 20
+    assert all(k in dict_to_test for k in sample)
@@ -0,0 +1,100 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from persidict import S3Dict
+from persidict.s3_dict import get_s3_client
+
+
+@mock_aws
+def test_clients_are_shared(tmpdir):
+    d1 = S3Dict(bucket_name="bucket1", base_dir=tmpdir)
+    d2 = S3Dict(bucket_name="bucket2", base_dir=tmpdir)
+    d3 = S3Dict(bucket_name="bucket1", base_dir=tmpdir, max_pool_connections=50)
+    assert d1.s3_client is d2.s3_client
+    assert d1.s3_client is not d3.s3_client
+    assert d3.s3_client is get_s3_client(None, 50)
+    assert d3.s3_client.meta.config.max_pool_connections == 50
+    assert d3.get_params()["max_pool_connections"] == 50
+
+    d3["a", "b"] = 1
+    subdict = d3.get_subdict("a")
+    assert subdict.s3_client is d3.s3_client
+    assert subdict.max_pool_connections == 50
+    assert subdict["b"] == 1
+
+
+@mock_aws
+def test_bucket_is_checked_lazily_once(tmpdir):
+    calls = []
+    d = S3Dict(bucket_name="lazy_bucket", base_dir=tmpdir)
+    d.s3_client.meta.events.register("before-call.s3.HeadBucket"
+        , lambda **kwargs: calls.append("head_bucket")
+        , unique_id="count_head_bucket")
+    d.s3_client.meta.events.register("before-call.s3.CreateBucket"
+        , lambda **kwargs: calls.append("create_bucket")
+        , unique_id="count_create_bucket")
+    try:
+        assert "lazy_bucket" not in [b["Name"] for b in
+            boto3.client("s3").list_buckets()["Buckets"]]
+        for i in range(5):
+            d["prefix_" + str(i), "key"] = i
+        for subdict in d.subdicts().values():
+            assert len(subdict) == 1
+        assert len(d) == 5
+        assert calls == ["head_bucket", "create_bucket"]
+    finally:
+        d.s3_client.meta.events.unregister("before-call.s3.HeadBucket"
+            , unique_id="count_head_bucket")
+        d.s3_client.meta.events.unregister("before-call.s3.CreateBucket"
+            , unique_id="count_create_bucket")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork()")
+@mock_aws
+def test_forked_process_gets_new_clients(tmpdir):
+    d = S3Dict(bucket_name="fork_bucket", base_dir=tmpdir)
+    parent_client = d.s3_client
+    pid = os.fork()
+    if pid == 0: # child
+        child_ok = (d.s3_client is not parent_client
+            and d.s3_client is get_s3_client()
+            and get_s3_client() is get_s3_client())
+        os._exit(0 if child_ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert d.s3_client is parent_client
+
+
+@mock_aws
+def test_clients_follow_environment(tmpdir, monkeypatch):
+    d = S3Dict(bucket_name="env_bucket", base_dir=tmpdir)
+    client = d.s3_client
+    assert d.s3_client is client
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "another_key_id")
+    assert d.s3_client is not client
+    assert d.s3_client is get_s3_client()
+    monkeypatch.setenv("AWS_ENDPOINT_URL", "http://localhost:1")
+    assert d.s3_client.meta.endpoint_url == "http://localhost:1"
+    monkeypatch.undo()
+    assert d.s3_client is client
+
+
+@mock_aws
+def test_object_names_need_no_requests(tmpdir):
+    calls = []
+    d = S3Dict(bucket_name="names_bucket", base_dir=tmpdir, write_behind=True)
+    d.s3_client.meta.events.register("before-call.s3.*"
+        , lambda **kwargs: calls.append(kwargs), unique_id="count_calls")
+    try:
+        assert d._build_full_objectname(("a", "b")) == "a/b.pkl"
+        assert d._objectname_to_key("a/b.pkl").str_chain == ("a", "b")
+        assert calls == []
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.*", unique_id="count_calls")
+    d["a", "b"] = 1
+    d.flush()
+    assert d["a", "b"] == 1
@@ -0,0 +1,119 @@
+import os
+
+import boto3
+from moto import mock_aws
+
+from persidict import S3Dict
+
+
+def _record_calls(d, operation, calls, unique_id):
+    d.s3_client.meta.events.register(f"before-call.s3.{operation}"
+        , lambda params, **kwargs: calls.append(params), unique_id=unique_id)
+
+
+@mock_aws
+def test_ranged_gets_in_memory(tmpdir):
+    """test that large in-memory reads use parallel byte-range GETs."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket"
+        , in_memory_transfers=True, multipart_threshold=2_000
+        , multipart_chunksize=1_000, max_transfer_concurrency=4
+        , spool_threshold=3_000)
+    value = os.urandom(10_500)
+    d["big"] = value
+    d["small"] = b"abc"
+    calls = []
+    _record_calls(d, "GetObject", calls, "count_ranges")
+    try:
+        assert d["big"] == value
+        n_big_calls = len(calls)
+        assert d["small"] == b"abc"
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.GetObject", unique_id="count_ranges")
+    assert n_big_calls > 10
+    ranges = [c["headers"]["Range"] for c in calls[:n_big_calls]]
+    assert ranges[0] == "bytes=0-999"
+    assert len(set(ranges)) == n_big_calls
+    assert all(c["headers"].get("If-Match") for c in calls[1:n_big_calls])
+    assert len(calls) == n_big_calls + 1
+
+
+@mock_aws
+def test_ranged_gets_restart_after_change(tmpdir):
+    """test that an object replaced during a ranged download is reread."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket"
+        , in_memory_transfers=True, multipart_threshold=2_000
+        , multipart_chunksize=1_000, max_transfer_concurrency=1)
+    old_value, new_value = os.urandom(5_000), os.urandom(6_000)
+    d["k"] = old_value
+    obj_name = d._build_full_objectname(("k",))
+    replaced = []
+
+    def replace_object(params, **kwargs):
+        if "If-Match" in params["headers"] and not replaced:
+            replaced.append(True)
+            boto3.client("s3").put_object(Bucket="range_bucket"
+                , Key=obj_name, Body=d.local_cache._codec.dumps(new_value))
+
+    d.s3_client.meta.events.register("before-call.s3.GetObject"
+        , replace_object, unique_id="replace_object")
+    try:
+        assert d["k"] == new_value
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.GetObject", unique_id="replace_object")
+    assert replaced
+
+
+@mock_aws
+def test_ranged_get_of_empty_object(tmpdir):
+    """test that empty objects are read with ranged GETs enabled."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket", file_type="txt"
+        , base_class_for_values=str
+        , in_memory_transfers=True, multipart_threshold=2_000
+        , multipart_chunksize=1_000)
+    d["empty"] = ""
+    assert d["empty"] == ""
+
+
+@mock_aws
+def test_transfer_config_for_file_transfers(tmpdir):
+    """test that file uploads follow multipart_threshold and chunksize."""
+    chunk = 5 * 2**20
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket"
+        , multipart_threshold=chunk, multipart_chunksize=chunk
+        , max_transfer_concurrency=2)
+    parts = []
+    _record_calls(d, "UploadPart", parts, "count_parts")
+    try:
+        value = os.urandom(2 * chunk + 100)
+        d["big"] = value
+        d["small"] = b"small"
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.UploadPart", unique_id="count_parts")
+    assert len(parts) == 3
+    assert d["big"] == value
+    assert d["small"] == b"small"
+    params = d.get_subdict("sub").get_params()
+    assert params["multipart_threshold"] == chunk
+    assert params["multipart_chunksize"] == chunk
+    assert params["max_transfer_concurrency"] == 2
+
+
+@mock_aws
+def test_ranged_gets_with_default_config(tmpdir):
+    """test that default settings split large in-memory reads into ranges."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="range_bucket"
+        , in_memory_transfers=True, file_type="pickle")
+    value = os.urandom(24 * 2**20)
+    d["big"] = value
+    calls = []
+    _record_calls(d, "GetObject", calls, "count_default_ranges")
+    try:
+        assert d["big"] == value
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.GetObject", unique_id="count_default_ranges")
+    assert len(calls) == 4 # 24 MB of data plus the pickle header, 8 MB parts
+    assert calls[0]["headers"]["Range"] == f"bytes=0-{8 * 2**20 - 1}"
@@ -1,6 +1,7 @@
 from persidict.safe_chars import SAFE_CHARS_SET, get_safe_chars
 from persidict.safe_str_tuple import SafeStrTuple
 from persidict.safe_str_tuple_signing import sign_safe_str_tuple, unsign_safe_str_tuple
+from persidict.safe_str_tuple_signing import get_signing_cache_info, clear_signing_caches
 
 def test_add():
     """Test if SafeStrTuple concatenates correctly."""
@@ -88,6 +89,23 @@ def test_signing_unsigning():
         assert signed_s == sign_safe_str_tuple(signed_s, n)
         assert s == unsign_safe_str_tuple(s, n)
 
+def test_signing_cache():
+    """Test if repeated signing is served from the memoization caches."""
+    clear_signing_caches()
+    s = SafeStrTuple("a", "b", "c")
+    signed_s = sign_safe_str_tuple(s, 8)
+    info = get_signing_cache_info()["add_signature_suffix"]
+    assert info["hits"] == 0
+    assert info["misses"] == 3
+    for _ in range(5):
+        assert sign_safe_str_tuple(s, 8) == signed_s
+        assert unsign_safe_str_tuple(signed_s, 8) == s
+    info = get_signing_cache_info()["add_signature_suffix"]
+    assert info["hits"] == 15
+    assert info["misses"] == 3
+    clear_signing_caches()
+    assert get_signing_cache_info()["add_signature_suffix"]["currsize"] == 0
+
 def test_unsafe_chars():
     """Test if SafeStrTuple rejects unsafe characters."""
     bad_chars = ['\n', '\t', '\r', '\b', '\x0b']
@@ -183,3 +201,17 @@ def test_eq_overrideability():
     assert (good_tuple_2 == good_tuple) == True
     assert (good_tuple != good_tuple_2) == False
     assert (good_tuple_2 != good_tuple) == False
+
+def test_slots():
+    """Test if SafeStrTuple instances do not carry a per-instance dict."""
+    s = SafeStrTuple("a", "b")
+    assert not hasattr(s, "__dict__")
+
+def test_trusted_chain():
+    """Test if the internal no-validation constructor builds equal tuples."""
+    l = ['a', 'b', 'c']
+    s = SafeStrTuple._from_trusted_chain(tuple(l))
+    assert s == SafeStrTuple(*l)
+    assert hash(s) == hash(SafeStrTuple(*l))
+    assert type(s + s) == SafeStrTuple
+    assert type(reversed(s)) == SafeStrTuple
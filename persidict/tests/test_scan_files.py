@@ -0,0 +1,22 @@
+import os
+
+from persidict import FileDirDict, SafeStrTuple
+from persidict.safe_str_tuple_signing import sign_safe_str_tuple
+
+
+def test_scan_files(tmpdir):
+    """Test if os.scandir-based enumeration yields keys and file stats."""
+    d = FileDirDict(base_dir=tmpdir, digest_len=4)
+    all_keys = [("a",), ("a", "b"), ("a", "b", "c", "d", "e"), ("x", "y")]
+    for k in all_keys:
+        d[k] = k
+
+    scanned = dict(d._scan_files())
+    assert len(scanned) == len(d) == len(all_keys)
+    for k in all_keys:
+        signed_k = sign_safe_str_tuple(SafeStrTuple(k), d.digest_len)
+        entry = scanned[signed_k.str_chain]
+        assert entry.stat().st_size == os.path.getsize(entry.path)
+        assert entry.stat().st_mtime == d.timestamp(k)
+
+    assert set(d.keys()) == {SafeStrTuple(k) for k in all_keys}
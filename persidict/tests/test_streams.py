@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict
+from persidict.streams import S3_MIN_PART_SIZE
+from persidict.tests.data_for_mutable_tests import mutable_tests
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_stream_round_trip(tmpdir, DictToTest, kwargs):
+    """test that open_read() / open_write() work with stored bytes."""
+    d = DictToTest(base_dir=tmpdir, **kwargs)
+    d.clear()
+    d["a"] = {"x": [1, 2, 3]}
+    with d.open_read("a") as f:
+        data = f.read()
+    with d.open_write(("b", "c")) as f:
+        f.write(data[:10])
+        f.write(data[10:])
+    assert d[("b", "c")] == {"x": [1, 2, 3]}
+    assert ("b", "c") in d
+    assert len(d) == 2
+    with pytest.raises(KeyError):
+        d.open_read("missing")
+
+
+@mock_aws
+def test_stream_discarded_on_error(tmpdir):
+    """test that a failed with-block does not store a value."""
+    for d in [FileDirDict(base_dir=tmpdir.mkdir("local"), file_type="json")
+            , S3Dict(base_dir=tmpdir.mkdir("s3"), file_type="json")]:
+        d["a"] = "old"
+        with pytest.raises(RuntimeError):
+            with d.open_write("a") as f:
+                f.write(b'"new"')
+                raise RuntimeError("interrupted")
+        assert d["a"] == "old"
+        f = d.open_write("b")
+        f.write(b'"abandoned"')
+        f.discard()
+        assert "b" not in d
+        assert len(d) == 1
+
+
+@mock_aws
+def test_multipart_stream(tmpdir):
+    """test that large streams are uploaded in parts."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="stream_bucket"
+        , file_type="bin", base_class_for_values=str
+        , multipart_chunksize=S3_MIN_PART_SIZE, max_transfer_concurrency=2)
+    data = os.urandom(2 * S3_MIN_PART_SIZE + 1000)
+    parts = []
+    d.s3_client.meta.events.register("before-call.s3.UploadPart"
+        , lambda **kwargs: parts.append(1), unique_id="count_parts")
+    try:
+        with d.open_write("big") as f:
+            for i in range(0, len(data), 100_000):
+                f.write(data[i:i + 100_000])
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.UploadPart", unique_id="count_parts")
+    assert len(parts) == 3
+    with d.open_read("big") as f:
+        assert f.read(1000) == data[:1000]
+        assert f.read() == data[1000:]
+
+
+@mock_aws
+def test_immutable_streams(tmpdir):
+    """test that open_write() does not overwrite immutable items."""
+    for d in [FileDirDict(base_dir=tmpdir.mkdir("local")
+                , immutable_items=True, file_type="json")
+            , S3Dict(base_dir=tmpdir.mkdir("s3")
+                , immutable_items=True, file_type="json")]:
+        with d.open_write("a") as f:
+            f.write(b"1")
+        assert d["a"] == 1
+        with pytest.raises(KeyError):
+            d.open_write("a")
+        with d.open_read("a") as f:
+            assert f.read() == b"1"
@@ -43,3 +43,26 @@ def test_subdicts(tmpdir, DictToTest, kwargs):
     fdd.clear()
     assert len(fdd.get_subdict("a")) == 0
     assert len(fdd.get_subdict("b")) == 0
+
+
+@pytest.mark.parametrize("DictToTest, kwargs", mutable_tests)
+@mock_aws
+def test_list_prefixes(tmpdir, DictToTest, kwargs):
+    """Test if list_prefixes() agrees with prefixes of all keys."""
+    dict_to_test = DictToTest(base_dir=tmpdir, **kwargs)
+    dict_to_test.clear()
+
+    all_keys = [("a", "a_1"), ("a", "a_2", "x"), ("b", "b_1", "y", "z")
+        , ("c",), ("d", "d_1")]
+    for k in all_keys:
+        dict_to_test[k] = 1
+    dict_to_test.get_subdict(("e", "f"))
+
+    for depth in range(1, 5):
+        model_prefixes = {SafeStrTuple(k[:depth]) for k in all_keys}
+        prefixes = dict_to_test.list_prefixes(depth)
+        assert len(prefixes) == len(model_prefixes)
+        assert set(prefixes) == model_prefixes
+
+    assert set(dict_to_test.subdicts()) == {"a", "b", "c", "d"}
+    dict_to_test.clear()
@@ -29,4 +29,45 @@ def test_timestamp(tmpdir):
         assert newest == ['g', 'e', 'd']
         assert [d[i] for i in newest] == ['ggggg', 'eeeee', 'ddddd']
 
-        assert d.newest_keys(100) == list(reversed(d.oldest_keys(100)))
\ No newline at end of file
+        assert d.newest_keys(100) == list(reversed(d.oldest_keys(100)))
+
+@mock_aws
+def test_keys_with_timestamps(tmpdir):
+    """test that listing timestamps agree with timestamp()."""
+    for d in [
+        FileDirDict(base_dir= tmpdir.mkdir("LOCAL"))
+        ,S3Dict(base_dir = tmpdir.mkdir("AWS"), bucket_name ="mybucket")
+        ]:
+        for v in "abcde":
+            d[("prefix", v)] = 5*v
+
+        timestamps = dict(d.keys_with_timestamps())
+        assert len(timestamps) == 5
+        for k, t in timestamps.items():
+            assert d.timestamp(k) == t
+
+        triples = list(d.items_with_timestamps())
+        assert {k: (v, t) for k, v, t in triples} == {
+            k: (d[k], t) for k, t in timestamps.items()}
+
+        assert d.oldest_keys(0) == []
+        assert set(d.oldest_keys()) == set(timestamps)
+        assert len(d.newest_keys(2)) == 2
+
+
+@mock_aws
+def test_oldest_keys_use_listing_timestamps(tmpdir):
+    """test that S3Dict.oldest_keys() makes no head_object requests."""
+    d = S3Dict(base_dir = tmpdir, bucket_name ="mybucket")
+    for v in "abcde":
+        d[v] = v
+    calls = []
+    d.s3_client.meta.events.register("before-call.s3.HeadObject"
+        , lambda **kwargs: calls.append(kwargs), unique_id="count_head")
+    try:
+        assert len(d.oldest_keys(3)) == 3
+        assert len(d.newest_keys()) == 5
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.HeadObject", unique_id="count_head")
+    assert calls == []
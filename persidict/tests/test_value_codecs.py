@@ -0,0 +1,109 @@
+import pytest
+from moto import mock_aws
+
+from persidict import FileDirDict, S3Dict, SafeStrTuple, ValueCodec
+from persidict import register_codec, get_codec
+from persidict import get_registered_file_types
+from persidict.value_codecs import PickleCodec, _CODECS
+from persidict.tests.data_for_mutable_tests import requires
+
+
+@pytest.mark.parametrize("file_type", ["pkl", "json", "cjson", "pickle"
+    , "pickle_lz4"
+    , pytest.param("pickle_zst", marks=requires("zstandard"))
+    , pytest.param("msgpack", marks=requires("msgpack"))])
+def test_builtin_codecs_roundtrip(file_type):
+    """Test if all built-in codecs restore basic values."""
+    value = {"a": [1, 2, 3], "b": "text", "c": 3.14, "d": None}
+    codec = get_codec(file_type)
+    assert isinstance(codec, ValueCodec)
+    assert codec.loads(codec.dumps(value)) == value
+
+
+@pytest.mark.parametrize("compression", ["lz4"
+    , pytest.param("zstd", marks=requires("zstandard"))])
+def test_compression_levels(compression):
+    """Test if compression levels are configurable."""
+    value = [i % 10 for i in range(10_000)]
+    for level in [1, 9]:
+        codec = PickleCodec(compression=compression, level=level)
+        data = codec.dumps(value)
+        assert len(data) < len(PickleCodec().dumps(value))
+        assert codec.loads(data) == value
+
+
+class ReversedTextCodec(ValueCodec):
+    def dumps(self, value:str) -> bytes:
+        return value[::-1].encode()
+
+    def loads(self, data:bytes) -> str:
+        return data.decode()[::-1]
+
+
+@pytest.fixture
+def unregister_rtxt():
+    """Remove the custom codec from the global registry after a test."""
+    yield
+    _CODECS.pop("rtxt", None)
+
+
+def test_register_custom_codec(tmpdir, unregister_rtxt):
+    """Test if third-party codecs can be registered and used."""
+    register_codec("rtxt", ReversedTextCodec(), overwrite=True)
+    assert "rtxt" in get_registered_file_types()
+    with pytest.raises(ValueError):
+        register_codec("rtxt", ReversedTextCodec())
+    with pytest.raises(ValueError):
+        register_codec("r/txt", ReversedTextCodec())
+    with pytest.raises(TypeError):
+        register_codec("txt2", "not a codec")
+
+    d = FileDirDict(base_dir=tmpdir, file_type="rtxt")
+    d["a"] = "hello"
+    assert d["a"] == "hello"
+    with open(d._build_full_path(SafeStrTuple("a")), "rb") as f:
+        assert f.read() == b"olleh"
+
+
+def test_unknown_file_type(tmpdir):
+    """Test if non-string values require a registered codec."""
+    with pytest.raises(ValueError):
+        FileDirDict(base_dir=tmpdir, file_type="unknown_type")
+    d = FileDirDict(base_dir=tmpdir, file_type="txt"
+        , base_class_for_values=str)
+    d["a"] = "hello"
+    assert d["a"] == "hello"
+
+
+def test_byte_addressable_codecs():
+    """test which built-in codecs store uncompressed data."""
+    addressable = {t for t in get_registered_file_types()
+        if get_codec(t).byte_addressable}
+    assert addressable == {"json", "cjson", "pickle", "msgpack", "npy"}
+    assert not ValueCodec.byte_addressable
+
+
+@pytest.mark.parametrize("file_type, text", [("pickle", "hello")
+    , ("cjson", "123")
+    , pytest.param("msgpack", "hello", marks=requires("msgpack"))])
+@mock_aws
+def test_old_text_stores_are_rejected(tmpdir, file_type, text):
+    """Test if text files of file types that became codecs fail clearly."""
+    d = FileDirDict(base_dir=tmpdir, file_type=file_type
+        , base_class_for_values=str)
+    with open(d._build_full_path(SafeStrTuple("old")), "w") as f:
+        f.write(text)  # as stored by versions without a codec registry
+    with pytest.raises(ValueError, match="older version"):
+        d["old"]
+    d["new"] = "hello"
+    assert d["new"] == "hello"
+
+    s3_d = S3Dict(base_dir=tmpdir.mkdir("s3"), bucket_name="old_bucket"
+        , file_type=file_type, base_class_for_values=str
+        , in_memory_transfers=True)
+    s3_d["new"] = "hello"
+    s3_d.s3_client.put_object(Bucket="old_bucket"
+        , Key="old." + file_type, Body=text.encode())
+    with pytest.raises(ValueError, match="older version"):
+        s3_d["old"]
+    assert s3_d["new"] == "hello"
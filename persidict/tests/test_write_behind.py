@@ -0,0 +1,155 @@
+import os
+import threading
+
+import pytest
+from moto import mock_aws
+
+from persidict import S3Dict, SafeStrTuple, BulkOperationError
+
+
+@mock_aws
+def test_write_behind_reads_and_flush(tmpdir):
+    """test that pending values are readable and stored after flush()."""
+    d = S3Dict(base_dir=tmpdir.mkdir("writer"), bucket_name="wb_bucket"
+        , write_behind=True, file_type="json")
+    for i in range(50):
+        d[("k", str(i))] = i
+    for i in range(50):
+        assert d[("k", str(i))] == i
+        assert ("k", str(i)) in d
+    d.flush()
+    reader = S3Dict(base_dir=tmpdir.mkdir("reader"), bucket_name="wb_bucket"
+        , file_type="json")
+    assert len(reader) == 50
+    assert {k: v for k, v in reader.items()} == {
+        ("k", str(i)): i for i in range(50)}
+    assert d.get_params()["write_behind"] is True
+
+
+@mock_aws
+def test_write_behind_context_manager(tmpdir):
+    """test that leaving the context makes all writes durable."""
+    with S3Dict(base_dir=tmpdir.mkdir("writer"), bucket_name="wb_bucket"
+            , write_behind=True) as d:
+        sub = d.get_subdict("sub")
+        for i in range(10):
+            d[str(i)] = [i] * i
+            sub[str(i)] = -i
+    reader = S3Dict(base_dir=tmpdir.mkdir("reader"), bucket_name="wb_bucket")
+    assert len(reader) == 20
+    assert reader["7"] == [7] * 7
+    assert reader[("sub", "3")] == -3
+
+
+@mock_aws
+def test_write_behind_keeps_latest_value(tmpdir):
+    """test that repeated writes of one key end with the last value."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="wb_bucket", write_behind=True)
+    for i in range(100):
+        d["x"] = i
+        assert d["x"] == i
+    d.flush()
+    assert d["x"] == 99
+    d["y"] = 1
+    del d["y"]
+    assert "y" not in d
+    d.flush()
+
+
+@mock_aws
+def test_write_behind_upload_errors(tmpdir):
+    """test that upload errors are raised by flush()."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="wb_bucket", write_behind=True)
+    d["good"] = 1
+    d.flush()
+
+    def fail(**kwargs):
+        raise RuntimeError("upload failed")
+
+    d.s3_client.meta.events.register(
+        "before-call.s3.PutObject", fail, unique_id="fail_put")
+    try:
+        d["bad"] = 2
+        with pytest.raises(BulkOperationError) as e:
+            d.flush()
+    finally:
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.PutObject", unique_id="fail_put")
+    assert list(e.value.errors) == [("bad",)]
+    assert isinstance(e.value.errors[("bad",)], RuntimeError)
+    assert "bad" not in d
+    d.flush() # errors are reported once
+
+
+@mock_aws
+def test_write_behind_bounded_queue(tmpdir):
+    """test that writers wait when too many uploads are pending."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="wb_bucket"
+        , write_behind=True, write_behind_max_pending=2)
+    d["warmup"] = 0
+    d.flush()
+    release = threading.Event()
+
+    def block(**kwargs):
+        release.wait(10)
+
+    d.s3_client.meta.events.register(
+        "before-call.s3.PutObject", block, unique_id="block_put")
+    try:
+        d["a"] = 1
+        d["b"] = 2
+        d["a"] = 3 # replaces a pending value, does not need a new slot
+        writer = threading.Thread(target=d.__setitem__, args=("c", 4))
+        writer.start()
+        writer.join(0.5)
+        assert writer.is_alive()
+        assert len(d._write_queue) == 2
+        release.set()
+        writer.join(10)
+        assert not writer.is_alive()
+        d.flush()
+    finally:
+        release.set()
+        d.s3_client.meta.events.unregister(
+            "before-call.s3.PutObject", unique_id="block_put")
+    assert {k[0]: v for k, v in d.items()} == dict(warmup=0, a=3, b=2, c=4)
+
+
+@mock_aws
+def test_write_behind_read_during_finishing_upload(tmpdir):
+    """test that reads wait (not spin) while an upload moves its file."""
+    d = S3Dict(base_dir=tmpdir, bucket_name="wb_bucket", write_behind=True
+        , immutable_items=True)
+    moved, release = threading.Event(), threading.Event()
+
+    def block(key):
+        # runs after the staging file was moved into the local cache
+        moved.set()
+        release.wait(10)
+
+    lookups = []
+    pending_file = d._write_queue.pending_file
+
+    def counting_pending_file(name):
+        lookups.append(name)
+        return pending_file(name)
+
+    d._add_to_manifest = block
+    d._write_queue.pending_file = counting_pending_file
+    try:
+        d["a"] = 1
+        assert moved.wait(10)
+        staged_file = pending_file(d._build_full_objectname(SafeStrTuple("a")))
+        assert not os.path.exists(staged_file)
+        results = []
+        reader = threading.Thread(target=lambda: results.append(d["a"]))
+        reader.start()
+        reader.join(0.5)
+        assert reader.is_alive()
+        assert len(lookups) < 10
+        release.set()
+        reader.join(10)
+        assert results == [1]
+    finally:
+        release.set()
+        d.flush()
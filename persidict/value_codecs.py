@@ -0,0 +1,322 @@
+"""Codecs that convert values to and from their persistent representation.
+
+A codec defines how a value is stored inside a file (for FileDirDict)
+or inside an S3 object (for S3Dict). Persistent dictionaries resolve
+their file_type parameter against a registry of codecs: file_type
+is used both as a file extension and as the name of a codec.
+
+Built-in codecs:
+
+"pkl": joblib pickle compressed with lz4 (the default),
+"json": human-readable jsonpickle with indentation,
+"cjson": compact jsonpickle (no indentation and no extra spaces),
+"pickle": raw pickle (protocol 5), without compression,
+"pickle_lz4": pickle compressed with lz4 frame format,
+"pickle_zst": pickle compressed with zstandard (requires zstandard package),
+"msgpack": MessagePack (requires msgpack package),
+works only with basic types (numbers, strings, bytes, lists, dicts),
+"npy": uncompressed numpy .npy files, works only with numpy arrays;
+reading returns a read-only np.memmap, so large arrays are not
+loaded into RAM and can be sliced without copying.
+
+Third parties can add their own codecs with register_codec().
+For all other file types values must be strings,
+which are stored as plain UTF-8 text (see TextCodec).
+
+Compatibility note: before the registry existed, only "pkl" and "json"
+had codecs, all other file types meant plain text. Stores of str values
+created with a file_type that is now a built-in codec (e.g. "pickle"
+or "msgpack") can't be read with it: dictionaries reject their files
+with ValueError. Such stores should be migrated (e.g. read as raw
+bytes and rewritten), or opened after re-registering the file_type
+with register_codec(file_type, TextCodec(), overwrite=True).
+"""
+from __future__ import annotations
+
+import io
+import pickle
+from typing import Any, BinaryIO, Optional
+
+import joblib
+import numpy as np
+import jsonpickle
+import jsonpickle.ext.numpy as jsonpickle_numpy
+import jsonpickle.ext.pandas as jsonpickle_pandas
+
+from .safe_chars import replace_unsafe_chars
+
+jsonpickle_numpy.register_handlers()
+jsonpickle_pandas.register_handlers()
+
+
+class ValueCodec:
+    """Base class for codecs: converts values to bytes and back.
+
+    Subclasses must implement either dumps()/loads()
+    or dump()/load() (or both, for efficiency).
+
+    maps_files is True for codecs that return values backed by
+    the file they were read from (e.g. memory-mapped arrays),
+    such files must not be deleted after reading.
+
+    byte_addressable is True for codecs that store data uncompressed,
+    so that a byte range of a stored value is meaningful on its own
+    (see PersiDict.get_range()).
+    """
+
+    maps_files:bool = False
+    byte_addressable:bool = False
+
+    def dumps(self, value:Any) -> bytes:
+        """Convert a value into bytes."""
+        buffer = io.BytesIO()
+        self.dump(value, buffer)
+        return buffer.getvalue()
+
+    def loads(self, data:bytes) -> Any:
+        """Convert bytes back into a value."""
+        return self.load(io.BytesIO(data))
+
+    def dump(self, value:Any, f:BinaryIO) -> None:
+        """Write a value into a binary file-like object."""
+        f.write(self.dumps(value))
+
+    def load(self, f:BinaryIO) -> Any:
+        """Read a value from a binary file-like object."""
+        return self.loads(f.read())
+
+    def load_from_file(self, file_name:str) -> Any:
+        """Read a value from a file with a given name."""
+        with open(file_name, 'rb') as f:
+            return self.load(f)
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return f"{type(self).__name__}()"
+
+
+class JoblibCodec(ValueCodec):
+    """Pickles values with joblib, which is efficient for numpy arrays."""
+
+    def __init__(self, compress:Any = "lz4"):
+        self.compress = compress
+        self.byte_addressable = not compress
+
+    def dump(self, value:Any, f:BinaryIO) -> None:
+        """Write a value into a binary file-like object."""
+        joblib.dump(value, f, compress=self.compress)
+
+    def load(self, f:BinaryIO) -> Any:
+        """Read a value from a binary file-like object."""
+        return joblib.load(f)
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return f"{type(self).__name__}(compress={self.compress!r})"
+
+
+class JsonPickleCodec(ValueCodec):
+    """Stores values as (human-readable) json documents using jsonpickle."""
+
+    byte_addressable = True
+
+    def __init__(self, indent:Optional[int] = 4, compact:bool = False):
+        self.indent = indent
+        self.compact = compact
+
+    def dumps(self, value:Any) -> bytes:
+        """Convert a value into bytes."""
+        if self.compact:
+            result = jsonpickle.dumps(value, separators=(",", ":"))
+        else:
+            result = jsonpickle.dumps(value, indent=self.indent)
+        return result.encode()
+
+    def loads(self, data:bytes) -> Any:
+        """Convert bytes back into a value."""
+        return jsonpickle.loads(data.decode())
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return (f"{type(self).__name__}(indent={self.indent}"
+            + f", compact={self.compact})")
+
+
+class PickleCodec(ValueCodec):
+    """Stores values as pickles, with optional lz4 or zstandard compression.
+
+    compression can be None, "lz4" (lz4 frame format) or "zstd".
+    level is a compression level; None means the library default.
+    """
+
+    def __init__(self
+                 , protocol:int = 5
+                 , compression:Optional[str] = None
+                 , level:Optional[int] = None):
+        assert compression in {None, "lz4", "zstd"}
+        self.protocol = protocol
+        self.compression = compression
+        self.level = level
+        self.byte_addressable = compression is None
+
+    def dumps(self, value:Any) -> bytes:
+        """Convert a value into bytes."""
+        data = pickle.dumps(value, protocol=self.protocol)
+        if self.compression == "lz4":
+            import lz4.frame
+            if self.level is None:
+                data = lz4.frame.compress(data)
+            else:
+                data = lz4.frame.compress(data, compression_level=self.level)
+        elif self.compression == "zstd":
+            zstandard = _import_optional("zstandard", self)
+            data = zstandard.ZstdCompressor(
+                level=3 if self.level is None else self.level).compress(data)
+        return data
+
+    def loads(self, data:bytes) -> Any:
+        """Convert bytes back into a value."""
+        if self.compression == "lz4":
+            import lz4.frame
+            data = lz4.frame.decompress(data)
+        elif self.compression == "zstd":
+            zstandard = _import_optional("zstandard", self)
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return pickle.loads(data)
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return (f"{type(self).__name__}(protocol={self.protocol}"
+            + f", compression={self.compression!r}, level={self.level})")
+
+
+class MsgpackCodec(ValueCodec):
+    """Stores values in MessagePack format (basic Python types only)."""
+
+    byte_addressable = True
+
+    def dumps(self, value:Any) -> bytes:
+        """Convert a value into bytes."""
+        msgpack = _import_optional("msgpack", self)
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data:bytes) -> Any:
+        """Convert bytes back into a value."""
+        msgpack = _import_optional("msgpack", self)
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class NpyCodec(ValueCodec):
+    """Stores numpy arrays as uncompressed .npy files.
+
+    mmap_mode is passed to np.load() when a value is read from a file:
+    "r" returns a read-only np.memmap, "c" a copy-on-write np.memmap,
+    None loads the whole array into memory. Values read from
+    in-memory buffers (e.g. S3 responses) are always loaded into memory.
+    Arrays of Python objects are not supported.
+    """
+
+    byte_addressable = True
+
+    def __init__(self, mmap_mode:Optional[str] = "r"):
+        assert mmap_mode in {None, "r", "c"}
+        self.mmap_mode = mmap_mode
+        self.maps_files = mmap_mode is not None
+
+    def dump(self, value:Any, f:BinaryIO) -> None:
+        """Write an array into a binary file-like object."""
+        if not isinstance(value, np.ndarray):
+            raise TypeError(f"{self!r} can only store numpy arrays"
+                + f", but got {type(value)} instead.")
+        np.save(f, value, allow_pickle=False)
+
+    def load(self, f:BinaryIO) -> Any:
+        """Read an array from a binary file-like object."""
+        return np.load(f, allow_pickle=False)
+
+    def load_from_file(self, file_name:str) -> Any:
+        """Read an array from a file, memory-mapping it if configured."""
+        return np.load(file_name, mmap_mode=self.mmap_mode, allow_pickle=False)
+
+    def __repr__(self) -> str:
+        """Return repr(self)."""
+        return f"{type(self).__name__}(mmap_mode={self.mmap_mode!r})"
+
+
+class TextCodec(ValueCodec):
+    """Stores string values as plain UTF-8 text."""
+
+    byte_addressable = True
+
+    def dumps(self, value:str) -> bytes:
+        """Convert a string into bytes."""
+        return value.encode()
+
+    def loads(self, data:bytes) -> str:
+        """Convert bytes back into a string."""
+        return data.decode()
+
+
+def _import_optional(module_name:str, codec:ValueCodec):
+    """Import an optional dependency of a codec."""
+    try:
+        return __import__(module_name)
+    except ImportError as e:
+        raise ImportError(f"{codec!r} requires package {module_name}"
+            + f", install it with 'pip install {module_name}'.") from e
+
+
+_CODECS: dict[str, ValueCodec] = dict()
+
+
+def register_codec(file_type:str
+                   , codec:ValueCodec
+                   , overwrite:bool = False) -> None:
+    """Make a codec available to persistent dictionaries under file_type.
+
+    file_type is used as a file extension, so it must contain only
+    URL/filename-safe characters. Replacing an already registered codec
+    requires overwrite=True.
+    """
+    if not isinstance(file_type, str) or not len(file_type):
+        raise ValueError("file_type must be a non-empty string.")
+    if file_type != replace_unsafe_chars(file_type, ""):
+        raise ValueError(f"file_type {file_type} contains unsafe characters.")
+    if not isinstance(codec, ValueCodec):
+        raise TypeError(f"codec must be an instance of ValueCodec"
+            + f", but it is {type(codec)} instead.")
+    if file_type in _CODECS and not overwrite:
+        raise ValueError(f"A codec for file_type {file_type}"
+            + " is already registered.")
+    _CODECS[file_type] = codec
+
+
+def get_codec(file_type:str) -> Optional[ValueCodec]:
+    """Return a codec registered for file_type, or None."""
+    return _CODECS.get(file_type)
+
+
+def check_byte_range(codec:ValueCodec, file_type:str
+                     , start:int, length:int) -> None:
+    """Validate arguments of PersiDict.get_range()."""
+    if not codec.byte_addressable:
+        raise ValueError(f"get_range() is not supported for file_type"
+            + f" {file_type!r}: {codec!r} stores compressed data,"
+            + f" byte ranges of stored values are meaningless.")
+    if start < 0 or length < 0:
+        raise ValueError("start and length must be non-negative")
+
+
+def get_registered_file_types() -> list[str]:
+    """Return a sorted list of file types with registered codecs."""
+    return sorted(_CODECS)
+
+
+register_codec("pkl", JoblibCodec(compress="lz4"))
+register_codec("json", JsonPickleCodec(indent=4))
+register_codec("cjson", JsonPickleCodec(compact=True))
+register_codec("pickle", PickleCodec(protocol=5))
+register_codec("pickle_lz4", PickleCodec(protocol=5, compression="lz4"))
+register_codec("pickle_zst", PickleCodec(protocol=5, compression="zstd"))
+register_codec("msgpack", MsgpackCodec())
+register_codec("npy", NpyCodec(mmap_mode="r"))
@@ -0,0 +1,155 @@
+"""Write-behind buffering of uploads for persistent dictionaries.
+
+WriteBehindQueue lets a dictionary return from __setitem__ as soon as
+a value is serialized into a local staging file; the file is uploaded
+later by a pool of background threads.
+
+Pending writes are addressed by names (e.g. full S3 object names).
+For every name at most one upload runs at a time: if a value is
+overwritten while its previous version is still waiting or uploading,
+the newer staging file replaces the older one, and the latest version
+is always the last one uploaded.
+
+The number of pending names is bounded: when the queue is full,
+writers wait until some uploads finish. Upload errors are collected
+and raised by flush() as BulkOperationError.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .persi_dict import BulkOperationError
+
+WRITE_BEHIND_DEFAULT_MAX_PENDING = 256
+
+
+def _remove_file(file_name:Optional[str]) -> None:
+    """Remove a file, ignore errors (e.g. if it was already moved)."""
+    if file_name is None:
+        return
+    try:
+        os.remove(file_name)
+    except OSError:
+        pass
+
+
+class _PendingWrite:
+    """The latest staged version of a value that waits to be uploaded."""
+
+    __slots__ = ("key", "file_name", "upload", "uploading")
+
+    def __init__(self, key:Any, file_name:str
+                 , upload:Callable[[str], None]):
+        self.key = key
+        self.file_name = file_name
+        self.upload = upload
+        self.uploading:Optional[str] = None
+
+
+class WriteBehindQueue:
+    """Uploads staged files on background threads, in bounded batches.
+
+    upload(file_name) callables passed to submit() must store
+    the content of a staging file and then move or remove the file.
+    """
+
+    max_pending:int
+    max_workers:int
+
+    def __init__(self
+                 , max_pending:int = WRITE_BEHIND_DEFAULT_MAX_PENDING
+                 , max_workers:int = 10):
+        if max_pending < 1:
+            raise ValueError("max_pending must be a positive integer")
+        self.max_pending = int(max_pending)
+        self.max_workers = max(1, int(max_workers))
+        self._condition = threading.Condition()
+        self._pending:dict[str, _PendingWrite] = {}
+        self._errors:dict[str, tuple[Any, BaseException]] = {}
+        self._executor:Optional[ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        """Return the number of names with pending uploads."""
+        with self._condition:
+            return len(self._pending)
+
+    def submit(self, name:str, key:Any, file_name:str
+               , upload:Callable[[str], None]) -> None:
+        """Schedule upload(file_name), wait if the queue is full."""
+        with self._condition:
+            entry = self._pending.get(name)
+            while entry is None and len(self._pending) >= self.max_pending:
+                self._condition.wait()
+                entry = self._pending.get(name)
+            if entry is not None: # an upload of this name is in progress
+                replaced = entry.file_name
+                entry.key, entry.file_name, entry.upload = (
+                    key, file_name, upload)
+                if replaced != entry.uploading:
+                    _remove_file(replaced)
+                return
+            self._pending[name] = _PendingWrite(key, file_name, upload)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers
+                    , thread_name_prefix="persidict-write-behind")
+            self._executor.submit(self._run, name)
+
+    def _run(self, name:str) -> None:
+        """Upload the latest staged version of a name, until none is left."""
+        while True:
+            with self._condition:
+                entry = self._pending[name]
+                key, file_name, upload = entry.key, entry.file_name, entry.upload
+                entry.uploading = file_name
+            error = None
+            try:
+                upload(file_name)
+            except BaseException as e:
+                error = e
+            with self._condition:
+                entry.uploading = None
+                if error is None:
+                    self._errors.pop(name, None)
+                else:
+                    self._errors[name] = (key, error)
+                superseded = entry.file_name != file_name
+                if not superseded:
+                    del self._pending[name]
+                    self._condition.notify_all()
+            if error is not None or superseded:
+                _remove_file(file_name)
+            if not superseded:
+                return
+
+    def pending_file(self, name:str) -> Optional[str]:
+        """Return the staging file with a pending value for name, or None."""
+        with self._condition:
+            entry = self._pending.get(name)
+            return None if entry is None else entry.file_name
+
+    def wait(self, name:Optional[str] = None) -> None:
+        """Wait for pending uploads (of one name, or all) to finish.
+
+        Unlike flush(), wait() does not raise upload errors.
+        """
+        with self._condition:
+            if name is None:
+                self._condition.wait_for(lambda: not self._pending)
+            else:
+                self._condition.wait_for(lambda: name not in self._pending)
+
+    def flush(self) -> None:
+        """Wait for all pending uploads, raise errors collected so far."""
+        self.wait()
+        with self._condition:
+            errors = self._errors
+            self._errors = {}
+        if errors:
+            raise BulkOperationError(
+                f"{len(errors)} buffered write(s) failed to upload"
+                , results = {}
+                , errors = {key: e for key, e in errors.values()})
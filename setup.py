@@ -38,5 +38,10 @@ setuptools.setup(
         , 'pytest'
         , 'parameterizable'
     ]
+    ,extras_require={
+        'zstd': ['zstandard']
+        , 'msgpack': ['msgpack']
+        , 'async': ['aiobotocore']
+    }
 
 )
\ No newline at end of file